@@ -0,0 +1,295 @@
+"""
+analyze.py: analysis of a results directory
+
+Reads every experiment of a results directory, both the tables collected by
+results.FlowCollector (<experiment>.tsv) and the raw ping and IPERF text of
+the older test scripts (<experiment>, all the flows appended to one file),
+into one columnar table of NumPy arrays with a row per flow. Experiments
+are grouped into configurations by their name with the run number removed,
+e.g. jf_stp_16_udp_results_5.0M_1 .. _10 are the runs of
+jf_stp_16_udp_results_5.0M, and every configuration is summarized at once:
+
+results/<out>_summary.tsv: percentiles, mean and Jain's fairness index of
+						   the throughput, RTT, jitter and loss
+results/<out>_cdf.tsv: CDF of every metric of every configuration
+results/<out>_deltas.tsv: paired difference between every mode and the
+						  baseline mode (stp) of the same configuration,
+						  e.g. ft_sdn_k4_tcp_results_same_pod_100M against
+						  ft_stp_k4_tcp_results_same_pod_100M, run by run
+
+FlowTable: columnar per-flow results
+
+Usage:
+	python analyze.py results
+	python analyze.py results --baseline stp --out analysis
+"""
+
+import os
+import re
+import sys
+import logging
+import argparse
+
+import numpy as np
+
+import results
+
+logger = logging.getLogger( __name__ )
+
+METRICS = ("mbps", "rtt_ms", "jitter_ms", "lost_percent")
+TESTS = ("ping", "tcp", "udp")
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+SUMMARY_COLUMNS = (("config", "mode", "test", "metric", "runs", "flows", "mean") +
+				   tuple("p%d" % p for p in PERCENTILES) + ("max", "jain"))
+CDF_COLUMNS = ("config", "metric", "value", "cdf")
+DELTA_COLUMNS = ("config", "baseline", "mode", "metric", "runs", "baseline_mean", "mean", "delta", "delta_pct", "delta_std")
+
+#Final report of an iperf3 client (-f m or -f k), e.g.
+#[  5]   0.00-40.00  sec  4.50 GBytes   967 Mbits/sec    0             sender
+#[  5]   0.00-40.00  sec  4.77 MBytes  1.00 Mbits/sec  0.010 ms  0/3453 (0%)  receiver
+IPERF_REPORT = re.compile(r'^\[\s*\d+\]\s+[\d.]+-[\d.]+\s+sec\s+[\d.]+\s+\w+\s+([\d.]+)\s+([KMG]?)bits/sec'
+						  r'(?:\s+([\d.]+)\s+ms\s+\d+/\d+\s+\(([\d.e+-]+)%\))?.*?\breceiver\s*$', re.M)
+UNIT_MBPS = {"": 1e-6, "K": 1e-3, "M": 1.0, "G": 1e3}
+
+RUN_SUFFIX = re.compile(r'_(\d+)$')
+
+def parseIperfText(text):
+	"""
+	Receiver reports of the IPERF clients whose text output was appended to
+	one file
+	:return: list of (mbps, jitter_ms, lost_percent), None for the UDP only fields
+	"""
+	flows = []
+	for match in IPERF_REPORT.finditer(text):
+		rate, unit, jitter, lost = match.groups()
+		flows.append((float(rate) * UNIT_MBPS[unit], float(jitter) if jitter else None, float(lost) if lost else None))
+	return flows
+
+def parsePingText(text):
+	"""
+	Statistics of the pings whose output was appended to one file
+	:return: list of (rtt_ms, lost_percent), rtt_ms None when no reply came back
+	"""
+	flows = []
+	for block in text.split("--- ")[1:]:
+		loss = results.PING_LOSS.search(block)
+		if not loss:
+			continue
+		rtt = results.PING_RTT.search(block)
+		flows.append((float(rtt.group(2)) if rtt else None, float(loss.group(3))))
+	return flows
+
+def splitName(name):
+	"""
+	Configuration, mode, test and run of an experiment name, e.g.
+	jf_sdn_16_udp_results_5.0M_3 -> (jf_sdn_16_udp_results_5.0M, sdn, udp, 3);
+	experiments without a run number are run 1
+	"""
+	match = RUN_SUFFIX.search(name)
+	config, run = (name[:match.start()], int(match.group(1))) if match else (name, 1)
+	tokens = config.split("_")
+	test = [token for token in tokens if token in TESTS]
+	return config, tokens[1] if len(tokens) > 1 else "-", test[0] if test else "-", run
+
+def experiments(directory):
+	"""
+	Experiment result files of a results directory; a collected table is
+	preferred over the raw text of the same experiment
+	:return: dict experiment name -> (path, 'table' or 'text')
+	"""
+	found = {}
+	header = "\t".join(results.TABLE_COLUMNS)
+	for entry in sorted(os.listdir(directory)):
+		path = os.path.join(directory, entry)
+		if not os.path.isfile(path):
+			continue
+		name, extension = os.path.splitext(entry)
+		if extension == ".tsv":
+			with open(path) as f:
+				if f.readline().rstrip("\n") == header:
+					found[name] = (path, "table")
+		elif "_results" in entry and entry not in found:
+			found[entry] = (path, "text")
+	return found
+
+class FlowTable(object):
+	"""
+	Per-flow results of many experiments as columns: integer configuration
+	codes, run numbers and one float array per metric (NaN where a test does
+	not measure a metric), sorted by configuration and run
+	"""
+
+	def __init__(self):
+		self.configs = []
+		self.modes = []
+		self.tests = []
+		self.config = None
+		self.run = None
+		self.columns = {}
+
+	@classmethod
+	def load(cls, directory=results.RESULTS_DIR):
+		table = cls()
+		codes = {}
+		config, run = [], []
+		columns = dict((metric, []) for metric in METRICS)
+
+		for name, (path, kind) in sorted(experiments(directory).items()):
+			configName, mode, test, runNumber = splitName(name)
+			if kind == "table":
+				rows = [tuple(float(row[metric]) if row.get(metric) is not None else None for metric in METRICS)
+						for row in results.parseTable(path)]
+			else:
+				with open(path) as f:
+					text = f.read()
+				if test == "ping":
+					rows = [(None, rtt, None, lost) for rtt, lost in parsePingText(text)]
+				else:
+					rows = [(mbps, None, jitter, lost) for mbps, jitter, lost in parseIperfText(text)]
+			if not rows:
+				logger.debug("No flows in %s" % path)
+				continue
+			if configName not in codes:
+				codes[configName] = len(table.configs)
+				table.configs.append(configName)
+				table.modes.append(mode)
+				table.tests.append(test)
+			config.extend([codes[configName]] * len(rows))
+			run.extend([runNumber] * len(rows))
+			for metric, values in zip(METRICS, zip(*rows)):
+				columns[metric].extend(values)
+
+		#Rows sorted by configuration and run, so that every group is a slice
+		config = np.array(config, dtype=np.int32)
+		run = np.array(run, dtype=np.int32)
+		order = np.lexsort((run, config))
+		table.config = config[order]
+		table.run = run[order]
+		for metric in METRICS:
+			table.columns[metric] = np.array([np.nan if value is None else value for value in columns[metric]], dtype=float)[order]
+		logger.info( ">>> %d flows of %d configurations read from %s" % (len(table.config), len(table.configs), directory) )
+		return table
+
+	def values(self, code, metric, run=None):
+		"""
+		Measured (non NaN) values of a metric of a configuration, optionally of one run
+		"""
+		start, end = np.searchsorted(self.config, (code, code + 1))
+		if run is not None:
+			start, end = start + np.searchsorted(self.run[start:end], (run, run + 1))
+		values = self.columns[metric][start:end]
+		return values[~np.isnan(values)]
+
+	def runs(self, code):
+		start, end = np.searchsorted(self.config, (code, code + 1))
+		return np.unique(self.run[start:end])
+
+def jain(values):
+	"""
+	Jain's fairness index: 1 when all the values are equal, 1/n when one takes all
+	"""
+	values = np.asarray(values, dtype=float)
+	square = np.dot(values, values)
+	return values.sum() ** 2 / (len(values) * square) if square > 0 else np.nan
+
+def cdf(values, points=101):
+	"""
+	CDF of values sampled at points evenly spaced quantiles
+	:return: (values, fractions) arrays
+	"""
+	fractions = np.linspace(0.0, 1.0, points)
+	return np.percentile(values, fractions * 100), fractions
+
+def _format(value):
+	if isinstance(value, (float, np.floating)):
+		return "-" if np.isnan(value) else "%.4f" % value
+	return str(value)
+
+def _write(path, columns, rows):
+	with open(path, "w") as f:
+		f.write("\t".join(columns) + "\n")
+		for row in rows:
+			f.write("\t".join(_format(value) for value in row) + "\n")
+
+def summaryRows(table):
+	"""
+	One summary row per configuration and measured metric
+	"""
+	rows = []
+	for code, name in enumerate(table.configs):
+		for metric in METRICS:
+			values = table.values(code, metric)
+			if not len(values):
+				continue
+			#Fairness is about the share each flow got, not about delay or loss
+			fairness = jain(values) if metric == "mbps" else np.nan
+			rows.append((name, table.modes[code], table.tests[code], metric, len(table.runs(code)), len(values), values.mean()) +
+						tuple(np.percentile(values, PERCENTILES)) + (values.max(), fairness))
+	return rows
+
+def cdfRows(table, points=101):
+	rows = []
+	for code, name in enumerate(table.configs):
+		for metric in METRICS:
+			values = table.values(code, metric)
+			if len(values):
+				rows.extend((name, metric, value, fraction) for value, fraction in zip(*cdf(values, points)))
+	return rows
+
+def deltaRows(table, baseline="stp"):
+	"""
+	Paired differences of the per-run means of every mode against the
+	baseline mode of the same configuration; only the runs present in both
+	are paired
+	"""
+	codes = dict((name, code) for code, name in enumerate(table.configs))
+	rows = []
+	for code, name in enumerate(table.configs):
+		mode = table.modes[code]
+		if mode == baseline:
+			continue
+		tokens = name.split("_")
+		tokens[1] = baseline
+		other = codes.get("_".join(tokens))
+		if other is None:
+			continue
+		runs = np.intersect1d(table.runs(code), table.runs(other))
+		for metric in METRICS:
+			pairs = [(table.values(other, metric, run), table.values(code, metric, run)) for run in runs]
+			pairs = np.array([(base.mean(), values.mean()) for base, values in pairs if len(base) and len(values)])
+			if not len(pairs):
+				continue
+			differences = pairs[:, 1] - pairs[:, 0]
+			baseMean = pairs[:, 0].mean()
+			rows.append((name, baseline, mode, metric, len(pairs), baseMean, pairs[:, 1].mean(), differences.mean(),
+						 100.0 * differences.mean() / baseMean if baseMean else np.nan,
+						 differences.std(ddof=1) if len(differences) > 1 else np.nan))
+	return rows
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Summarize the ping and IPERF results of a results directory')
+	parser.add_argument('directory', type=str, nargs='?', default=results.RESULTS_DIR, help='Results directory')
+	parser.add_argument('--out', type=str, default='analysis', help='Prefix of the tables written to the results directory')
+	parser.add_argument('--baseline', type=str, default='stp', help='Mode the other modes are compared with')
+	parser.add_argument('--points', type=int, default=101, help='Points of every CDF')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO)
+	table = FlowTable.load(args.directory)
+
+	summary = summaryRows(table)
+	_write(os.path.join(args.directory, "%s_summary.tsv" % args.out), SUMMARY_COLUMNS, summary)
+	_write(os.path.join(args.directory, "%s_cdf.tsv" % args.out), CDF_COLUMNS, cdfRows(table, args.points))
+	deltas = deltaRows(table, args.baseline)
+	_write(os.path.join(args.directory, "%s_deltas.tsv" % args.out), DELTA_COLUMNS, deltas)
+
+	print("config\tmetric\tflows\tp50\tp99\tjain")
+	for row in summary:
+		print("%s\t%s\t%d\t%s\t%s\t%s" % (row[0], row[3], row[5], _format(row[10]), _format(row[13]), _format(row[-1])))
+	for row in deltas:
+		print("%s vs %s\t%s\t%d runs\t%s (%s%%)" % (row[0], row[1], row[3], row[4], _format(row[7]), _format(row[8])))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+bench.py: microbenchmarks of the pure-Python parts of the test harness
+
+Nothing here needs root or a running network. Every benchmark times one
+step of the test scripts that grows with the topology, over a range of
+sizes, so that the turnaround time of the large Fat Trees and Jellyfish
+networks can be followed from commit to commit:
+
+layout: switch graph and link layout (layout.py)
+topo: FatTreeTopo and JellyfishTopo construction, when Mininet is importable
+pairs: server/client pair generation (traffic.py)
+parse: collection of the IPERF JSON streams into a results table, and the
+	   reading of the tables and of the raw IPERF text
+paths: path computation: hop counts for the CPU plan, the local controller
+	   ECMP paths, k shortest paths of the proactive mode, and the offline
+	   path analysis (pathstats.py, needs NumPy)
+
+The sizes are Fat Tree pod counts k; a Jellyfish of size k is built from the
+same equipment, k^3/4 hosts on 5k^2/4 switches with k ports.
+
+Results: JSON with the commit, the machine and the minimum and median time
+of every benchmark and size, results/bench_<commit>.json by default.
+
+Usage:
+	python bench.py
+	python bench.py --sizes 4 8 16 32 --repeat 5 --only layout pairs
+	python bench.py --compare results/bench_1234abcd.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from timeit import default_timer
+
+import layout
+import traffic
+import results
+import cpuplan
+import minictl
+
+logger = logging.getLogger( __name__ )
+
+SIZES = (4, 8, 16, 24)
+REPEAT = 3
+SEED = 1
+
+#Flows of the parse benchmarks per unit of size, and their IPERF intervals
+FLOWS_PER_HOST = 1
+INTERVALS = 40
+
+#Pairs of the k shortest path benchmark, and paths per pair
+KSP_PAIRS = 64
+KSP_PATHS = 8
+
+#A benchmark slower than the baseline by this factor is a regression
+REGRESSION = 1.2
+
+GROUPS = ("layout", "topo", "pairs", "parse", "paths")
+
+def commit():
+	"""
+	Commit hash of the working tree, with a '+' when it has local changes;
+	None outside a git checkout
+	"""
+	directory = os.path.dirname(os.path.abspath(__file__))
+	try:
+		head = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=directory, stderr=subprocess.STDOUT).decode().strip()
+		dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directory).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return head + ("+" if dirty else "")
+
+def jellyfishSize(k):
+	"""
+	(hosts, switches, ports) of the Jellyfish built from the equipment of a Fat Tree with k pods
+	"""
+	return k ** 3 // 4, 5 * k ** 2 // 4, k
+
+def timed(function, repeat):
+	"""
+	Wall clock times of repeated calls of function(); every call gets fresh
+	arguments from the benchmark setup, so only the measured step is timed
+	"""
+	times = []
+	for _ in range(0, repeat):
+		start = default_timer()
+		function()
+		times.append(default_timer() - start)
+	return sorted(times)
+
+def _scripts():
+	"""
+	The fattree and jellyfish script modules, None without Mininet; they parse
+	the command line on import, so they are imported with an empty one
+	"""
+	argv = sys.argv
+	try:
+		sys.argv = [argv[0]]
+		import fattree
+		import jellyfish
+	except ImportError:
+		return None
+	finally:
+		sys.argv = argv
+	#The topology classes log every node at debug level
+	logging.getLogger().setLevel(logging.WARNING)
+	return fattree, jellyfish
+
+def _iperfStream(flow, udp):
+	"""
+	IPERF --json-stream output of one flow
+	"""
+	events = [{"event": "start", "data": {}}]
+	for interval in range(0, INTERVALS):
+		total = {"start": interval, "end": interval + 1, "bits_per_second": 9.4e8 + flow, "omitted": False}
+		total.update({"jitter_ms": 0.01, "lost_percent": 0.1} if udp else {"retransmits": 0})
+		events.append({"event": "interval", "data": {"sum": total}})
+	if udp:
+		end = {"sum": {"start": 0, "end": INTERVALS, "bits_per_second": 9.4e8, "jitter_ms": 0.01, "lost_percent": 0.1}}
+	else:
+		end = {"sum_received": {"start": 0, "end": INTERVALS, "bits_per_second": 9.4e8},
+			   "sum_sent": {"retransmits": 3}}
+	events.append({"event": "end", "data": end})
+	return "\n".join(json.dumps(event) for event in events) + "\n"
+
+def _iperfText(flow):
+	return ("[  5]   0.00-%d.00  sec  4.50 GBytes   %d Mbits/sec    0             sender\n"
+			"[  5]   0.00-%d.00  sec  4.49 GBytes   %d Mbits/sec                  receiver\n" % (INTERVALS, 900 + flow % 50, INTERVALS, 900 + flow % 50))
+
+def _collect(directory, streams):
+	collector = results.FlowCollector("bench", directory=directory)
+	for index, stream in enumerate(streams):
+		with open(collector.flowFile(index, "h%d" % (2 * index + 1), "h%d" % (2 * index + 2)), "w") as f:
+			f.write(stream)
+	collector.start()
+	collector.stop()
+	return collector.tablePath
+
+def _controllerTopology(k):
+	fatTree = layout.FatTreeLayout(k)
+	topology = minictl.Topology()
+	ports = {}
+	for a, b in fatTree.switchLinks():
+		ports[a] = ports.get(a, 0) + 1
+		ports[b] = ports.get(b, 0) + 1
+		topology.addLink(a + 1, ports[a], b + 1, ports[b])
+	hosts = []
+	for host, switch in enumerate(fatTree.hostSwitches()):
+		ports[switch] = ports.get(switch, 0) + 1
+		address = minictl.mac("00:00:00:%02x:%02x:%02x" % ((host >> 16) & 0xff, (host >> 8) & 0xff, host & 0xff))
+		topology.addHost(address, switch + 1, ports[switch])
+		hosts.append((switch + 1, address))
+	return topology, hosts
+
+def benchmarks(sizes, groups):
+	"""
+	Benchmarks of the selected groups
+	:return: list of (group, name, size, function)
+	"""
+	cases = []
+	scripts = _scripts() if "topo" in groups else None
+	try:
+		import pathstats
+		import analyze
+	except ImportError:
+		pathstats = analyze = None
+
+	for k in sizes:
+		hosts, switches, ports = jellyfishSize(k)
+		hostCount = layout.FatTreeLayout(k).hostNumber
+
+		#Only the selected groups are set up, so that a narrow run stays cheap at large k
+		if "layout" in groups:
+			cases.append(("layout", "fattree", k, lambda k=k: layout.fatTreeLinks(k)))
+			cases.append(("layout", "jellyfish", k, lambda hosts=hosts, switches=switches, ports=ports:
+						  layout.JellyfishLayout(hosts, switches, ports, SEED)))
+
+		if scripts:
+			fattree, jellyfish = scripts
+			graph = layout.JellyfishLayout(hosts, switches, ports, SEED)
+			cases.append(("topo", "fattree", k, lambda k=k: fattree.FatTreeTopo(k)))
+			cases.append(("topo", "jellyfish", k, lambda graph=graph: jellyfish.JellyfishTopo(graph=graph)))
+
+		if "pairs" in groups:
+			cases.append(("pairs", "fattree", k, lambda k=k: traffic.fatTreePairs(k, SEED)))
+			cases.append(("pairs", "uniform", k, lambda hostCount=hostCount: traffic.uniformPairs(hostCount, hostCount // 2, SEED)))
+			cases.append(("pairs", "random", k, lambda hosts=hosts: traffic.randomPairs(list(range(0, hosts)), SEED)))
+			cases.append(("pairs", "permutation", k, lambda hostCount=hostCount: traffic.TrafficMatrix(hostCount, seed=SEED).permutation()))
+
+		if "parse" in groups:
+			flows = hostCount * FLOWS_PER_HOST
+			streams = [_iperfStream(flow, flow % 2 == 1) for flow in range(0, flows)]
+			cases.append(("parse", "collect", k, lambda streams=streams: _collect(tempfile.mkdtemp(prefix="bench"), streams)))
+			#The table the collect benchmark writes
+			table = _collect(tempfile.mkdtemp(prefix="bench"), streams)
+			cases.append(("parse", "table", k, lambda table=table: results.parseTable(table)))
+			if analyze:
+				text = "".join(_iperfText(flow) for flow in range(0, flows))
+				cases.append(("parse", "iperf_text", k, lambda text=text: analyze.parseIperfText(text)))
+
+		if "paths" in groups:
+			switchCount, links, hostSwitch = layout.fatTreeLinks(k)
+			servers, clients = traffic.fatTreePairs(k, SEED)
+			cases.append(("paths", "mean_hops", k, lambda switchCount=switchCount, links=links, hostSwitch=hostSwitch, servers=servers, clients=clients:
+						  cpuplan.meanHops(switchCount, links, hostSwitch, servers[::-1], clients)))
+			topology, addresses = _controllerTopology(k)
+			rng = random.Random(SEED)
+			flowKeys = [(rng.choice(addresses), rng.choice(addresses), str(flow).encode()) for flow in range(0, hostCount)]
+			cases.append(("paths", "controller_ecmp", k, lambda topology=topology, flowKeys=flowKeys:
+						  [topology.path(source[0], destination[1], key) for source, destination, key in flowKeys]))
+			if pathstats:
+				graph = layout.JellyfishLayout(hosts, switches, ports, SEED)
+				neighbours = pathstats.neighbours(graph.switchNumber, graph.links())
+				rng = random.Random(SEED)
+				kspPairs = [(rng.randrange(graph.switchNumber), rng.randrange(graph.switchNumber)) for _ in range(0, KSP_PAIRS)]
+				cases.append(("paths", "ksp", k, lambda neighbours=neighbours, kspPairs=kspPairs:
+							  [pathstats.kShortestPaths(neighbours, src, dst, KSP_PATHS) for src, dst in kspPairs]))
+				pairSets = {"same_pod": (servers, clients), "different_pod": (servers[::-1], clients)}
+				cases.append(("paths", "pathstats", k, lambda switchCount=switchCount, links=links, hostSwitch=hostSwitch, pairSets=pairSets, k=k:
+							  pathstats.analyze(switchCount, links, hostSwitch, pairSets, side=pathstats.fatTreeSide(k))))
+
+	return cases
+
+def run(sizes=SIZES, repeat=REPEAT, groups=GROUPS):
+	"""
+	Run the benchmarks
+	:return: report dict
+	"""
+	temp = tempfile.tempdir
+	tempfile.tempdir = tempfile.mkdtemp(prefix="bench")
+	rows = []
+	try:
+		for group, name, size, function in benchmarks(sizes, groups):
+			times = timed(function, repeat)
+			rows.append({"group": group, "name": name, "size": size, "runs": repeat,
+						 "min_s": times[0], "median_s": results.percentile(times, 50)})
+			logger.info( ">>> %s.%s k=%d: %.4f s" % (group, name, size, times[0]) )
+	finally:
+		shutil.rmtree(tempfile.tempdir, ignore_errors=True)
+		tempfile.tempdir = temp
+	return {"commit": commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+			"machine": platform.machine(), "cores": cpuplan.machineCores(), "repeat": repeat, "benchmarks": rows}
+
+def compare(baseline, report, threshold=REGRESSION):
+	"""
+	Ratio of the minimum times of report to the ones of baseline
+	:return: list of (group, name, size, baseline s, s, ratio, regression)
+	"""
+	before = dict(((row["group"], row["name"], row["size"]), row["min_s"]) for row in baseline["benchmarks"])
+	rows = []
+	for row in report["benchmarks"]:
+		key = (row["group"], row["name"], row["size"])
+		if key in before and before[key] > 0:
+			ratio = row["min_s"] / before[key]
+			rows.append(key + (before[key], row["min_s"], ratio, ratio > threshold))
+	return rows
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Microbenchmarks of the pure-Python parts of the test harness')
+	parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='Fat Tree pod counts k')
+	parser.add_argument('--repeat', type=int, default=REPEAT, help='Runs of every benchmark')
+	parser.add_argument('--only', type=str, nargs='+', choices=GROUPS, default=list(GROUPS), help='Benchmark groups to run')
+	parser.add_argument('--out', type=str, default=None, help='JSON report (default results/bench_<commit>.json)')
+	parser.add_argument('--compare', type=str, default=None, help='Baseline JSON report to compare with')
+	parser.add_argument('--threshold', type=float, default=REGRESSION, help='Slowdown factor reported as a regression')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO)
+	report = run(args.sizes, args.repeat, args.only)
+	logging.getLogger().setLevel(logging.INFO)
+
+	out = args.out
+	if out is None:
+		if not os.path.isdir(results.RESULTS_DIR):
+			os.makedirs(results.RESULTS_DIR)
+		out = os.path.join(results.RESULTS_DIR, "bench_%s.json" % (report["commit"] or "unknown")[:8])
+	with open(out, "w") as f:
+		json.dump(report, f, indent=2, sort_keys=True)
+	logger.info( ">>> %d benchmarks written to %s" % (len(report["benchmarks"]), out) )
+
+	if not args.compare:
+		for row in report["benchmarks"]:
+			print("%s.%s\t%d\t%.6f\t%.6f" % (row["group"], row["name"], row["size"], row["min_s"], row["median_s"]))
+		return 0
+
+	with open(args.compare) as f:
+		baseline = json.load(f)
+	rows = compare(baseline, report, args.threshold)
+	print("benchmark\tk\tbaseline_s\ts\tratio")
+	for group, name, size, before, now, ratio, regression in rows:
+		print("%s.%s\t%d\t%.6f\t%.6f\t%.2f%s" % (group, name, size, before, now, ratio, "\tREGRESSION" if regression else ""))
+	return 1 if any(row[-1] for row in rows) else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+capacity.py: measured forwarding capacity of the machine
+
+cpuplan plans the CPU of a test from the traffic one core carries across one
+link, a fixed estimate by default. measureGbpsPerCore measures it instead
+on a throwaway network: one unlimited TCP flow between two hosts through a
+single OVS bridge, i.e. across two links, the flow keeping about one core
+busy. The time dilation of the cpuplan 'dilate' policy is chosen from this
+measurement.
+"""
+
+import json
+import logging
+
+from mininet.topo import Topo
+from mininet.node import OVSBridge
+
+import cpuplan
+import results
+import startup
+import iperfservers
+
+logger = logging.getLogger( __name__ )
+
+#Duration of the measured flow, in seconds
+MEASURE_SECONDS = 3
+
+#Links crossed by the measured flow
+LINKS = 2
+
+class PairTopo( Topo ):
+    "Two hosts on one switch"
+
+    def build( self ):
+        switch = self.addSwitch( 'cap1' )
+        for name in ( 'caph1', 'caph2' ):
+            self.addLink( self.addHost( name ), switch )
+
+def measureGbpsPerCore(seconds=MEASURE_SECONDS, port=iperfservers.IPERF_PORT):
+	"""
+	Traffic one core carries across one link on this machine, in Gbit/s;
+	cpuplan.GBPS_PER_CORE when the measurement fails
+	"""
+	net = startup.FastMininet(topo=PairTopo(), switch=OVSBridge, controller=None)
+	net.start()
+	try:
+		client, server = net.get('caph1'), net.get('caph2')
+		iperfservers.startIperfServers([server], port)
+		output = client.cmd('iperf3 -J -t %d -p %d -c %s' % (seconds, port, server.IP()))
+		try:
+			mbps = results.summaryRow(json.loads(output).get("end", {}))["mbps"]
+		except ValueError:
+			mbps = 0
+	finally:
+		iperfservers.stopIperfServers(net)
+		net.stop()
+
+	if not mbps:
+		logger.info( ">>> Forwarding capacity not measured, assuming %g Gbit/s per core and link" % cpuplan.GBPS_PER_CORE )
+		return cpuplan.GBPS_PER_CORE
+	gbps = mbps * LINKS / 1000.0
+	logger.info( ">>> Forwarding capacity: %.0f Mbit/s over %d links, %.1f Gbit/s per core and link" % (mbps, LINKS, gbps) )
+	return gbps
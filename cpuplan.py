@@ -0,0 +1,181 @@
+"""
+cpuplan.py: CPU budget of an emulated topology
+
+Every packet of the emulation is moved by the CPUs of the machine: the
+IPERF processes, and the kernel for every veth and OVS hop of its path.
+When the traffic of a test needs more CPU than the machine has, the
+emulator and not the topology becomes the bottleneck, and the measured
+throughput says nothing about the topology.
+
+CPUPlan estimates the cores a test needs from the number of concurrent
+flows, their rate and the hops of their paths, and refuses a
+configuration that does not fit, scales its link rates down or dilates
+time until it does. It also gives the CPU fraction and the cores of every
+CPULimitedHost, so that no host can starve the others.
+
+Policies:
+scale: lower the link rate until the test fits the CPU budget
+dilate: divide the link rates by an integer factor and multiply the delays
+		and test durations by it, so that the emulation runs slower than
+		nominal but keeps its proportions; the results are converted back
+		to nominal units (results.DILATION)
+refuse: raise ValueError when the test does not fit
+off: no check and no CPU limits, as without a plan
+"""
+
+import os
+import re
+import math
+import logging
+import multiprocessing
+
+logger = logging.getLogger( __name__ )
+
+POLICIES = ('scale', 'dilate', 'refuse', 'off')
+
+#Traffic one core can carry across one link (veth pair and switch hop), in
+#Gbit/s; a conservative figure for a kernel OVS datapath with TSO, adjust to
+#the machine
+GBPS_PER_CORE = 4.0
+
+#Cores left to OVS, the controller and the test scripts
+RESERVED_CORES = 1
+
+#Fraction of the budget the planned load may use
+HEADROOM = 0.8
+
+def machineCores():
+	"""
+	Cores this process may run on
+	"""
+	if hasattr(os, 'sched_getaffinity'):
+		return len(os.sched_getaffinity(0))
+	return multiprocessing.cpu_count()
+
+class CPUPlan(object):
+	"""
+	CPU budget of one test configuration
+	"""
+
+	def __init__(self, hostCount, flows, linkMbps, hops, cores=None, reserved=RESERVED_CORES, policy='scale',
+				 gbpsPerCore=GBPS_PER_CORE):
+		"""
+		:param hostCount: number of emulated hosts
+		:param flows: number of concurrent flows
+		:param linkMbps: rate of the links (and of every flow at most), in Mbit/s
+		:param hops: mean number of links crossed by a flow
+		:param cores: cores of the machine, all the available ones by default
+		:param reserved: cores kept out of the host cgroups
+		:param policy: one of POLICIES
+		:param gbpsPerCore: traffic one core carries across one link, e.g.
+							measured by capacity.measureGbpsPerCore
+		"""
+		if policy not in POLICIES:
+			raise ValueError("Unknown CPU policy %s" % policy)
+		self.hostCount = hostCount
+		self.flows = flows
+		self.hops = hops
+		self.gbpsPerCore = gbpsPerCore
+		self.cores = cores or machineCores()
+		self.available = max(1, self.cores - reserved)
+		self.firstCore = self.cores - self.available
+		self.policy = policy
+		self.requestedMbps = linkMbps
+		self.linkMbps = linkMbps
+		self.scale = 1.0
+		self.dilation = 1
+
+		if policy != 'off' and self.demand() > self.budget():
+			message = ("%d flows at %d Mbit/s over %.1f hops need %.1f cores, only %.1f of %d cores are usable" %
+					   (flows, linkMbps, hops, self.demand(), self.budget(), self.cores))
+			if policy == 'refuse':
+				raise ValueError("Cannot emulate faithfully: " + message)
+			if policy == 'dilate':
+				self.dilation = int(math.ceil(self.demand() / self.budget()))
+				self.scale = 1.0 / self.dilation
+				self.linkMbps = linkMbps * self.scale
+				logger.info( ">>> %s: time dilated %d times, links at %g Mbit/s" % (message, self.dilation, self.linkMbps) )
+			else:
+				self.scale = self.budget() / self.demand()
+				self.linkMbps = max(1, int(linkMbps * self.scale))
+				logger.info( ">>> %s: link rate scaled down to %d Mbit/s" % (message, self.linkMbps) )
+
+	def demand(self, linkMbps=None):
+		"""
+		Cores needed by the flows at the given (or planned) link rate
+		"""
+		rate = self.linkMbps if linkMbps is None else linkMbps
+		return self.flows * rate * self.hops / (1000.0 * self.gbpsPerCore)
+
+	def budget(self):
+		return self.available * HEADROOM
+
+	def dilate(self, seconds):
+		"""
+		Emulated duration of a nominal duration
+		"""
+		return seconds * self.dilation
+
+	def delay(self, delay):
+		"""
+		Emulated link delay of a nominal Mininet delay, e.g. '0.1ms'
+		"""
+		value, unit = re.match(r'^([\d.]+)\s*(\w*)$', delay).groups()
+		return '%g%s' % (float(value) * self.dilation, unit)
+
+	def hostFraction(self):
+		"""
+		CPU fraction of the whole machine for every host (CPULimitedHost cpu=)
+		"""
+		return min(1.0, float(self.available) / max(self.hostCount, 1)) / self.cores
+
+	def hostCores(self, index):
+		"""
+		Core a host is pinned to: hosts are spread round-robin over the
+		non-reserved cores
+		"""
+		return self.firstCore + index % self.available
+
+	def summary(self):
+		return ("CPU plan: %d cores (%d for hosts), %d hosts at %.4f of the machine each, "
+				"%d flows at %g Mbit/s need %.1f cores%s" %
+				(self.cores, self.available, self.hostCount, self.hostFraction(), self.flows, self.linkMbps, self.demand(),
+				 ", time dilated %d times" % self.dilation if self.dilation > 1 else ""))
+
+def meanHops(switchCount, links, hostSwitch, servers, clients):
+	"""
+	Mean number of links crossed by the (client, server) flows on shortest
+	paths, host links included
+	:param servers: server host indices
+	:param clients: client host indices
+	"""
+	neighbours = [[] for _ in range(0, switchCount)]
+	for a, b in links:
+		neighbours[a].append(b)
+		neighbours[b].append(a)
+
+	distances = {}
+	total = 0
+	for server, client in zip(servers, clients):
+		source = hostSwitch[server]
+		if source not in distances:
+			distance = {source: 0}
+			frontier = [source]
+			while frontier:
+				nextFrontier = []
+				for node in frontier:
+					for neighbour in neighbours[node]:
+						if neighbour not in distance:
+							distance[neighbour] = distance[node] + 1
+							nextFrontier.append(neighbour)
+				frontier = nextFrontier
+			distances[source] = distance
+		total += distances[source].get(hostSwitch[client], switchCount) + 2
+	return float(total) / max(len(clients), 1)
+
+def pinHosts(hosts, plan):
+	"""
+	Pin the hosts of a started network to their planned cores
+	"""
+	for index, host in enumerate(hosts):
+		host.setCPUs(cores=plan.hostCores(index))
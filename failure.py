@@ -0,0 +1,258 @@
+"""
+failure.py: link and switch failures during the load tests
+
+FailureTest takes down one link or one switch in the middle of a TCP or UDP
+test and measures how long the aggregate throughput of the test takes to
+recover, STP reconverging or the controller installing new paths. The
+element taken down is the busiest one of a topology layer at the time of
+the failure (e.g. a core-agg link of the Fat Tree, a switch-switch link of
+Jellyfish), so that the failure hits the flows of the test; a switch
+failure takes down every link of a switch that is not attached to a host
+of the test.
+
+The throughput is sampled every 100 ms from the counters of the switch
+interfaces facing the hosts of the test: received from the hosts is the
+offered load, sent to the hosts is the delivered one, and the packet
+difference between both is the loss.
+
+Results:
+results/<name>_failure.tsv: timeline of the offered and delivered rate and
+							of the loss, the time relative to the failure
+results/<name>_recovery.tsv: the failed element, the throughput before the
+							 failure and its minimum after it, the recovery
+							 time and the traffic lost until the recovery
+
+Rates and times of a time dilated emulation are reported in nominal units.
+The mode (stp, sdn, ...) is the second token of the experiment name, as
+in analyze.splitName, so the recovery of the modes can be compared.
+
+FailureTest: failure injection and throughput sampling of one test
+"""
+
+import os
+import time
+import logging
+import threading
+
+import results
+import linkstats
+import readiness
+
+logger = logging.getLogger( __name__ )
+
+TARGETS = ('link', 'switch')
+
+#Throughput sampling interval, in seconds
+INTERVAL = 0.1
+
+#Throughput before the failure, averaged over this many seconds, is the baseline
+BASELINE = 2.0
+
+#The throughput recovered when it stays above this fraction of the baseline
+#for RECOVERED_SAMPLES samples in a row
+RECOVERY_FRACTION = 0.9
+RECOVERED_SAMPLES = 5
+
+#Time the network gets to become reachable again after the failed element
+#is brought back up, in seconds (STP needs a listening and learning period)
+RESTORE_TIMEOUT = 60
+
+TIMELINE_COLUMNS = ("time_s", "offered_mbps", "delivered_mbps", "loss_percent")
+RECOVERY_COLUMNS = ("name", "mode", "target", "element", "failed_at_s", "baseline_mbps", "min_mbps", "recovery_s",
+					"deficit_mbit", "max_loss_percent")
+
+def recovery(samples, baseline=BASELINE, fraction=RECOVERY_FRACTION, consecutive=RECOVERED_SAMPLES):
+	"""
+	Recovery of the delivered throughput after a failure
+	:param samples: list of (time relative to the failure, delivered mbps) in time order
+	:return: (baseline mbps, minimum mbps after the failure, recovery time in
+			 seconds or None, Mbit delivered less than the baseline until the
+			 recovery or the end)
+	"""
+	before = [mbps for stamp, mbps in samples if -baseline <= stamp < 0]
+	after = [(stamp, mbps) for stamp, mbps in samples if stamp >= 0]
+	if not before or not after:
+		return None, None, None, None
+	reference = sum(before) / len(before)
+	recovered = None
+	streak = 0
+	for index, (stamp, mbps) in enumerate(after):
+		if mbps >= fraction * reference:
+			streak += 1
+			if streak == consecutive:
+				recovered = index - consecutive + 1
+				break
+		else:
+			streak = 0
+	end = recovered if recovered is not None else len(after)
+	deficit = 0.0
+	previous = 0.0
+	for stamp, mbps in after[:end]:
+		deficit += max(0.0, reference - mbps) * (stamp - previous)
+		previous = stamp
+	return (reference, min(mbps for stamp, mbps in after), after[recovered][0] if recovered is not None else None, deficit)
+
+def _hostFacing(net, hosts):
+	"""
+	Switch side interfaces of the links of a set of hosts
+	"""
+	switches = set(switch.name for switch in net.switches)
+	names = set(host.name for host in hosts)
+	interfaces = []
+	for link in net.links:
+		for intf, other in ((link.intf1, link.intf2), (link.intf2, link.intf1)):
+			if intf.node.name in switches and other.node.name in names:
+				interfaces.append(intf.name)
+	return interfaces
+
+class FailureTest(object):
+	"""
+	Takes down the busiest link or switch of a layer at a given time of a load
+	test and samples the throughput; a target of None disables the failure,
+	so that the tests can always wrap their load in it
+	"""
+
+	def __init__(self, net, linkLayer, name, target, layer, pairs, at, interval=INTERVAL):
+		"""
+		:param net: started mininet network
+		:param linkLayer: function (node1 name, node2 name) -> layer name, e.g.
+						  FatTreeTopo.linkLayer
+		:param name: experiment name of the results
+		:param target: one of TARGETS or None
+		:param layer: layer of the links taken down, or whose switches are
+		:param pairs: list of (client host, server host) of the test
+		:param at: time of the failure, in seconds after the start
+		"""
+		self.net = net
+		self.name = name
+		self.target = target
+		self.at = at
+		self.interval = interval
+		self.pairs = pairs
+		self.hosts = set(host for pair in pairs for host in pair)
+		self.interfaces = _hostFacing(net, self.hosts)
+		self.candidates = [link for link in net.links if linkLayer(link.intf1.node.name, link.intf2.node.name) == layer]
+		self.stopped = threading.Event()
+		self.thread = None
+		self.failed = []
+		self.element = None
+		self.failedAt = None
+		self.samples = []
+
+	def start(self):
+		if not self.target:
+			return self
+		self.thread = threading.Thread(target=self._run, name="failure-%s" % self.name)
+		self.thread.daemon = True
+		self.thread.start()
+		return self
+
+	def stop(self):
+		"""
+		Bring the failed element back up, write the timeline and the recovery
+		:return: recovery row, None without a failure
+		"""
+		if not self.thread:
+			return None
+		self.stopped.set()
+		self.thread.join()
+		self.thread = None
+		for intf in self.failed:
+			intf.ifconfig('up')
+		if self.failed:
+			readiness.waitForReachability(self.pairs, time.time() + RESTORE_TIMEOUT)
+		self.failed = []
+		if self.failedAt is None:
+			logger.info( ">>> %s: nothing to fail in the test" % self.name )
+			return None
+
+		timeline = [(results.nominalTime(stamp - self.failedAt), offered, delivered, loss) for stamp, offered, delivered, loss in self.samples]
+		with open(os.path.join(results.RESULTS_DIR, "%s_failure.tsv" % self.name), "w") as f:
+			f.write("\t".join(TIMELINE_COLUMNS) + "\n")
+			for row in timeline:
+				f.write("\t".join(results.field(value) for value in row) + "\n")
+
+		baseline, lowest, recovered, deficit = recovery([(stamp, delivered) for stamp, offered, delivered, loss in timeline])
+		losses = [loss for stamp, offered, delivered, loss in timeline if stamp >= 0 and loss is not None]
+		tokens = self.name.split("_")
+		row = (self.name, tokens[1] if len(tokens) > 1 else "-", self.target, self.element, results.nominalTime(self.at), baseline, lowest, recovered,
+			   deficit, max(losses) if losses else None)
+		with open(os.path.join(results.RESULTS_DIR, "%s_recovery.tsv" % self.name), "w") as f:
+			f.write("\t".join(RECOVERY_COLUMNS) + "\n")
+			f.write("\t".join(results.field(value) for value in row) + "\n")
+		logger.info( ">>> %s: %s %s failed, throughput %s -> %s Mbit/s, recovered after %s s" %
+					 (self.name, self.target, self.element, results.field(baseline, "%.1f"), results.field(lowest, "%.1f"),
+					  results.field(recovered, "%.2f")) )
+		return row
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def _busiest(self, start, counters):
+		"""
+		Links to take down: the busiest candidate link, or every link of the
+		busiest switch of the candidate links
+		:return: (element name, list of links)
+		"""
+		def load(intf):
+			if intf.name not in counters or intf.name not in start:
+				return 0
+			now, before = counters[intf.name], start[intf.name]
+			return (now[0] - before[0]) + (now[2] - before[2])
+
+		if self.target == 'link':
+			links = sorted(self.candidates, key=lambda link: load(link.intf1) + load(link.intf2), reverse=True)
+			if not links:
+				return None, []
+			link = links[0]
+			return "%s-%s" % (link.intf1.node.name, link.intf2.node.name), [link]
+
+		switches = set(switch.name for switch in self.net.switches)
+		attached = dict((name, []) for name in switches)
+		for link in self.net.links:
+			for intf in (link.intf1, link.intf2):
+				if intf.node.name in attached:
+					attached[intf.node.name].append(link)
+		names = set(intf.node.name for link in self.candidates for intf in (link.intf1, link.intf2) if intf.node.name in switches)
+		#A switch with a host of the test would cut the host off for good
+		names = [name for name in names if not any(intf.node in self.hosts for link in attached[name] for intf in (link.intf1, link.intf2))]
+		if not names:
+			return None, []
+		rates = dict((name, sum(load(intf) for link in attached[name] for intf in (link.intf1, link.intf2) if intf.node.name == name))
+					 for name in names)
+		name = max(sorted(names), key=rates.get)
+		return name, attached[name]
+
+	def _run(self):
+		started = time.time()
+		first = linkstats.interfaceCounters()
+		last = (started, first)
+		while not self.stopped.wait(max(0, started + (len(self.samples) + 1) * self.interval - time.time())):
+			now, counters = time.time(), linkstats.interfaceCounters()
+			before, lastCounters = last
+			last = (now, counters)
+			seconds = results.nominalTime(now - before)
+			rx = [0, 0]
+			tx = [0, 0]
+			for name in self.interfaces:
+				if name in counters and name in lastCounters:
+					delta = [a - b for a, b in zip(counters[name], lastCounters[name])]
+					rx = [rx[0] + delta[0], rx[1] + delta[1]]
+					tx = [tx[0] + delta[2], tx[1] + delta[3]]
+			loss = 100.0 * max(0, rx[1] - tx[1]) / rx[1] if rx[1] else None
+			self.samples.append((now, rx[0] * 8 / (seconds * 1e6), tx[0] * 8 / (seconds * 1e6), loss))
+
+			if self.failedAt is None and now - started >= self.at and self.element is None:
+				self.element, links = self._busiest(first, counters)
+				if not links:
+					self.element = "-"
+					continue
+				for link in links:
+					for intf in (link.intf1, link.intf2):
+						intf.ifconfig('down')
+						self.failed.append(intf)
+				self.failedAt = time.time()
+				logger.info( ">>> %s: %s %s down" % (self.name, self.target, self.element) )
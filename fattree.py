@@ -3,7 +3,7 @@ fattree.py: script to run Fat-Tree topology test
 
 The tests performed are packet delay (ping), throughput (IPERF-TCP), jitter and packet loss (IPERF-UDP)
 
-OVSBridgeSTP: STP-Enabled OVS switch class
+OVSBridgeSTP: STP-Enabled OVS switch class (startup.py)
 FatTreeTopo: Fat Tree topology class for mininet
 
 @author Victor Mehmeri (vime@fotonik.dtu.dk)
@@ -15,13 +15,33 @@ from mininet.cli import CLI
 from mininet.log import setLogLevel, info
 from mininet.link import Link, Intf, TCLink
 from mininet.topo import Topo
-from mininet.util import dumpNodeConnections, pmonitor
+from mininet.util import dumpNodeConnections, pmonitor, custom
 import time
 import sys
 import random
 import logging
 import os 
 import argparse
+import readiness
+import results
+import traffic
+import layout
+import iperfservers
+import scheduler
+import monitor
+import startup
+import cpuplan
+import capacity
+import health
+import linkstats
+import fct
+import probe
+import minictl
+import failure
+import knee
+from startup import OVSBridgeSTP
+import matrix
+import twolevel
  
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger( __name__ )
@@ -33,202 +53,241 @@ parser.add_argument('-d', type=int, nargs='?',
 				   help='Duration of IPERF test')
 parser.add_argument('--controller', action='store_true',
 				   help='use SDN controller')
+parser.add_argument('--twolevel', action='store_true',
+				   help='load two-level ECMP routing tables into the switches, without controller or STP')
+parser.add_argument('--local-controller', type=str, nargs='?', const='ecmp', choices=minictl.MODES,
+				   help='use the bundled OpenFlow controller (default ecmp) and benchmark its flow setup')
 parser.add_argument('--ip', type=str, nargs='?',
 				   help='Controller IP address')
 parser.add_argument('--port', type=int, nargs='?',
 				   help='Controller Port')
+parser.add_argument('--wait', type=int, nargs='?',
+				   help='Maximum time to wait for the network to become ready (seconds)')
+parser.add_argument('--seed', type=int, nargs='?',
+				   help='Random seed of the server/client pairs')
+parser.add_argument('--ramp', type=str, nargs='?', choices=scheduler.RAMPS,
+				   help='How the IPERF flows start: simultaneous, staggered or poisson')
+parser.add_argument('--ramp-interval', type=float, nargs='?',
+				   help='Stagger interval or mean Poisson gap between flow starts (seconds)')
+parser.add_argument('--cpu-policy', type=str, nargs='?', choices=cpuplan.POLICIES,
+				   help='What to do when the test needs more CPU than the machine has: scale the link rate down, dilate time (link rates divided, '
+						'delays and durations multiplied by a factor chosen from the measured capacity), refuse, or off')
+parser.add_argument('--cores', type=int, nargs='?',
+				   help='Number of CPU cores to plan for (default: all the available ones)')
+parser.add_argument('--fct', type=str, nargs='?', choices=sorted(fct.WORKLOADS),
+				   help='Run an open-loop short flow workload with this flow size distribution and report flow completion times')
+parser.add_argument('--load', type=float, nargs='?',
+				   help='Offered load of every host in the short flow workload, as a fraction of its link rate (default 0.3)')
+parser.add_argument('--probe-rate', type=float, nargs='?',
+				   help='Latency probes per second of every pair, idle and alongside the load tests (default %d, 0 disables them)' % probe.PROBE_RATE)
+parser.add_argument('--fail', type=str, nargs='?', choices=failure.TARGETS,
+				   help='Take down the busiest core-agg link, or a whole switch, in the middle of every TCP and UDP test and measure the recovery')
+parser.add_argument('--fail-at', type=float, nargs='?',
+				   help='Time of the failure, in seconds after the start of the test (default: half the test duration)')
+parser.add_argument('--oversubscription', type=float, nargs='?',
+				   help='Ratio of the host link rate to the edge uplink rate (default 1, no oversubscription)')
+parser.add_argument('--knee', type=str, nargs='+', choices=traffic.PATTERNS,
+				   help='Search the saturation knee of these traffic patterns by bisection on the UDP rate instead of the fixed test sequence')
+parser.add_argument('--knee-loss', type=float, nargs='?',
+				   help='Loss in percent at which the knee search considers the network saturated (default %g)' % knee.LOSS_THRESHOLD)
+parser.add_argument('--knee-latency', type=float, nargs='?',
+				   help='p99 RTT in microseconds at which the knee search considers the network saturated (default: loss only)')
+parser.add_argument('--matrix', type=str, nargs='?',
+				   help='JSON experiment matrix to run on one network instead of the fixed test sequence')
 
 args = parser.parse_args()
 
-global IPERF_TEST_DURATION, kNUMBER, CONTROLLER, CONTROLLER_IP, CONTROLLER_PORT, FILE_PREFIX
+global IPERF_TEST_DURATION, kNUMBER, CONTROLLER, LOCAL_CONTROLLER, CONTROLLER_IP, CONTROLLER_PORT, FILE_PREFIX, READY_TIMEOUT, RAMP, RAMP_INTERVAL, SEED, MATRIX, FCT, FCT_LOAD, PROBE_RATE, FAIL, FAIL_AT, OVERSUBSCRIPTION, KNEE, KNEE_LOSS, KNEE_LATENCY, TWOLEVEL, LINK_BW, CPU_POLICY, CORES
 	
 #Set defaults
 CONTROLLER = 0
+LOCAL_CONTROLLER = None
+TWOLEVEL = 0
 CONTROLLER_IP = "127.0.0.1"
 CONTROLLER_PORT = 6633 
 FILE_PREFIX = "ft"
 IPERF_TEST_DURATION = 40
 kNUMBER = 4
-
-class OVSBridgeSTP( OVSKernelSwitch ):
-    """Open vSwitch Ethernet bridge with Spanning Tree Protocol
-       rooted at the first bridge that is created"""
-    prio = 1000
-    def start( self, *args, **kwargs ):
-        OVSKernelSwitch.start( self, *args, **kwargs )
-        OVSBridgeSTP.prio += 1
-        self.cmd( 'ovs-vsctl set-fail-mode', self, 'standalone' )
-        self.cmd( 'ovs-vsctl set-controller', self )
-        self.cmd( 'ovs-vsctl set Bridge', self,
-                  'stp_enable=true',
-                  'other_config:stp-priority=%d' % OVSBridgeSTP.prio )
+READY_TIMEOUT = 60
+RAMP = 'simultaneous'
+RAMP_INTERVAL = 1.0
+#Extra time an IPERF flow gets beyond its duration (omitted intervals,
+#connection setup) before it is stopped
+FLOW_GRACE = 60
+SEED = None
+MATRIX = None
+FCT = None
+FCT_LOAD = 0.3
+PROBE_RATE = probe.PROBE_RATE
+FAIL = None
+FAIL_AT = None
+OVERSUBSCRIPTION = 1.0
+KNEE = None
+KNEE_LOSS = knee.LOSS_THRESHOLD
+KNEE_LATENCY = None
+LINK_BW = 1000
+CPU_POLICY = 'scale'
+CORES = None
 
 switches = { 'ovs-stp': OVSBridgeSTP }
 
  
 class FatTreeTopo(Topo):
-    coreSwitchList = []
-    aggSwitchList = []
-    edgeSwitchList = []
-    hostList = []
-    
-    
-    def __init__(self, kNUMBER=4):
-		"""
-		Instantiate Fat Tree topology with kNUMBER pods
-		"""
-		self.kNUMBER = kNUMBER
-		self.coreLayerSwitchNumber = ( kNUMBER/2 ) ** 2
-		self.aggLayerSwitchNumber = ( kNUMBER/2 ) * kNUMBER
-		self.edgeLayerSwitchNumber = ( kNUMBER/2 ) * kNUMBER
-		self.hostNumber = self.edgeLayerSwitchNumber * kNUMBER/2 
-
-		#Init Topo
-		Topo.__init__(self)
-
-		logger.debug("Creating Core Layer Switches")
-		self.createCoreLayerSwitch(self.coreLayerSwitchNumber)
-		logger.debug("Creating Agg Layer Switches ")
-		self.createAggLayerSwitch(self.aggLayerSwitchNumber)
-		logger.debug("Creating Edge Layer Switches ")
-		self.createEdgeLayerSwitch(self.edgeLayerSwitchNumber)
-		logger.debug("Adding Hosts")
-		self.createHost(self.hostNumber)
-		logger.debug("Creating links")
-		self.createLinks()
-    
-    
- 
+    """Fat Tree topology with kNUMBER pods
+
+       Nodes are kept in per-layer lists indexed like layout.FatTreeLayout,
+       names and links are computed from the (pod, position) indices"""
+
+    def __init__(self, kNUMBER=4, bw=1000, delay='0.1ms', podAddresses=False, oversubscription=1.0):
+        """
+        Instantiate Fat Tree topology with kNUMBER pods
+        :param podAddresses: address the hosts 10.pod.edge.id (two-level routing)
+                             instead of Mininet's sequential addresses
+        :param oversubscription: ratio of the host links to the edge uplinks;
+                                 the edge-agg links get bw / oversubscription
+        """
+        self.kNUMBER = kNUMBER
+        self.podAddresses = podAddresses
+        self.bw = bw
+        self.oversubscription = oversubscription
+        self.delay = delay
+        self.layout = layout.FatTreeLayout(kNUMBER)
+        self.coreLayerSwitchNumber = self.layout.coreNumber
+        self.aggLayerSwitchNumber = self.layout.aggNumber
+        self.edgeLayerSwitchNumber = self.layout.edgeNumber
+        self.hostNumber = self.layout.hostNumber
+
+        self.coreSwitchList = []
+        self.aggSwitchList = []
+        self.edgeSwitchList = []
+        self.hostList = []
+
+        #Init Topo
+        Topo.__init__(self)
+
+        logger.debug("Creating Core Layer Switches")
+        self.createCoreLayerSwitch(self.coreLayerSwitchNumber)
+        logger.debug("Creating Agg Layer Switches ")
+        self.createAggLayerSwitch(self.aggLayerSwitchNumber)
+        logger.debug("Creating Edge Layer Switches ")
+        self.createEdgeLayerSwitch(self.edgeLayerSwitchNumber)
+        logger.debug("Adding Hosts")
+        self.createHost(self.hostNumber)
+        logger.debug("Creating links")
+        self.createLinks()
+
     def createCoreLayerSwitch(self, NUMBER):
         logger.debug("Create Core Layer")
-        for x in range(1, NUMBER+1):
-            PREFIX = "100"
-            if x >= int(10):
-                PREFIX = "10"
-            self.coreSwitchList.append(self.addSwitch(PREFIX + str(x)))
- 
+        self.coreSwitchList = [self.addSwitch(self.layout.name(layout.CORE, x)) for x in range(0, NUMBER)]
+
     def createAggLayerSwitch(self, NUMBER):
         logger.debug( "Create Agg Layer")
-        for x in range(1, NUMBER+1):
-            PREFIX = "200"
-            if x >= int(10):
-                PREFIX = "20"
-            self.aggSwitchList.append(self.addSwitch(PREFIX + str(x)))
- 
+        self.aggSwitchList = [self.addSwitch(self.layout.name(layout.AGG, x)) for x in range(0, NUMBER)]
+
     def createEdgeLayerSwitch(self, NUMBER):
         logger.debug("Create Edge Layer")
-        for x in range(1, NUMBER+1):
-            PREFIX = "300"
-            if x >= int(10):
-                PREFIX = "30"
-            self.edgeSwitchList.append(self.addSwitch(PREFIX + str(x)))
-    
+        self.edgeSwitchList = [self.addSwitch(self.layout.name(layout.EDGE, x)) for x in range(0, NUMBER)]
+
     def createHost(self, NUMBER):
         logger.debug("Create Host")
-        for x in range(1, NUMBER+1):
-            PREFIX = "400"
-            if x >= int(10):
-                PREFIX = "40"
-            self.hostList.append(self.addHost(PREFIX + str(x))) 
- 
+        if self.podAddresses:
+            self.hostList = [self.addHost(self.layout.name(layout.HOST, x), ip='%s/8' % self.layout.hostAddress(x)) for x in range(0, NUMBER)]
+        else:
+            self.hostList = [self.addHost(self.layout.name(layout.HOST, x)) for x in range(0, NUMBER)]
+
     def createLinks(self):
+        ft = self.layout
+
         logger.debug("Linking Core to Aggregate layer")
-            
-        pod = 0
-        podOffset = 0
-        
-        for agg in self.aggSwitchList:
-			for x in range(0, kNUMBER/2):
-				self.addLink(agg, self.coreSwitchList[podOffset*kNUMBER/2 + x], bw=1000, delay='0.1ms')
-			podOffset += 1
-			if  podOffset >= kNUMBER/2:
-				podOffset = 0
-            
+        for agg, core in ft.coreLinks():
+            self.addLink(self.aggSwitchList[agg], self.coreSwitchList[core],
+                         ft.aggUpPort(core), ft.corePort(agg), bw=self.bw, delay=self.delay)
+
         logger.debug("Linking Aggregate to Edge layer")
-        for pod in range(0, kNUMBER):
-			for x in range(0, kNUMBER/2):
-				for y in range(0,kNUMBER/2):
-					self.addLink(self.aggSwitchList[pod*kNUMBER/2 + x], self.edgeSwitchList[pod*kNUMBER/2 + y], bw=1000, delay='0.1ms')
- 
+        for agg, edge in ft.podLinks():
+            self.addLink(self.aggSwitchList[agg], self.edgeSwitchList[edge],
+                         ft.aggDownPort(edge), ft.edgeUpPort(agg), bw=self.bw / float(self.oversubscription), delay=self.delay)
+
         logger.debug("Linking Edge switches to Hosts")
-        for x in range(0, self.edgeLayerSwitchNumber):
-			for port in range(0, kNUMBER/2):
-				self.addLink(self.edgeSwitchList[x], self.hostList[x*kNUMBER/2+port], bw=1000)
-    
-    def hosts(self):
+        for edge, host in ft.hostLinks():
+            self.addLink(self.edgeSwitchList[edge], self.hostList[host],
+                         ft.edgeDownPort(host), 0, bw=self.bw)
+
+    def hostPod(self, host):
+        """Pod of the host with index host"""
+        return self.layout.hostPod(host)
+
+    def hostEdgeSwitch(self, host):
+        """Name of the edge switch of the host with index host"""
+        return self.edgeSwitchList[self.layout.hostEdge(host)]
+
+    def linkLayer(self, node1, node2):
+        """Layer of the link between two nodes: core-agg, agg-edge or edge-host"""
+        layers = sorted(self.layout.layer(name) for name in (node1, node2))
+        return '%s-%s' % tuple(layout.LAYER_NAMES[layer] for layer in layers)
+
+    def hosts(self, sort=True):
         return self.hostList
 
 def generateUniformClientServerPairs(net, topo, numberOfPairs):
-	clients = []
-	servers = []
-	
-	hostSet = range(0, len(topo.hosts()))
-	
-	while (len(clients) < numberOfPairs):
-		randomServer = random.choice(hostSet)
-		randomClient = random.choice(hostSet)
-		
-		while (randomClient == randomServer):
-			randomClient = random.choice(hostSet)
-		
-		clients.append(randomClient) 
-		servers.append(randomServer)
-		hostSet.remove(randomClient)
-		hostSet.remove(randomServer)
-	
-	logger.debug( "Clients: " + " ".join(str(e) for e in clients) )
-	logger.debug( "Servers: " + " ".join(str(e) for e in servers) )
-	
-	return (servers, clients)
+	return traffic.uniformPairs(len(topo.hosts()), numberOfPairs, SEED)
 
 def generateServerClientPairs(net, topo, kNUMBER):
-	clients = []
-	servers = []
-	
-	#Assign servers and clients pairs
-	for pod in range(1, kNUMBER + 1):
-		firstOfThePod = ( pod - 1 ) * (kNUMBER ** 2)/4
-		lastOfThePod = pod * (kNUMBER ** 2)/4
-		podSubset = range(firstOfThePod, lastOfThePod)
-		dict = {}
-		
-		while len(podSubset) > 1:
-			randomServer = random.choice(podSubset)
-			randomClient = random.choice(podSubset)
-			
-			while (randomClient == randomServer):
-				randomClient = random.choice(podSubset)
-			
-			dict[randomClient] = randomServer
-			
-			podSubset.remove(randomServer)
-			podSubset.remove(randomClient)
-		
-		clientsFromPod = [(i) for i in dict.keys()] 
-		serversFromPod = [(i) for i in dict.values()]
-		
-		logger.debug( "Clients from pod %d: " % (pod) + " ".join(str(e) for e in clientsFromPod) )
-		logger.debug( "Servers from pod %d: " % (pod) + " ".join(str(e) for e in serversFromPod) )
-		
-		clients.extend(clientsFromPod)
-		servers.extend(serversFromPod)
-	
-	logger.debug( "Clients: " + " ".join(str(e) for e in clients) )
-	logger.debug( "Servers: " + " ".join(str(e) for e in servers) )
-	
-	return servers,clients
-
-def monitorOutput(popens, duration):
-	endTime = time.time() + duration
-	for host, line in pmonitor( popens ):
-		if host:
-			logger.debug( "<%s>: %s" % ( host, line.strip() ) )
-		if time.time() >= endTime:
-			logger.debug("*** One or more connections timed out ***")
-			for p in popens.values():
-				p.send_signal( SIGINT )
-			break
-			
+	return traffic.fatTreePairs(kNUMBER, SEED)
+
+def planCPU(servers, clients):
+	"""
+	CPU plan of the tests; the same pod and different pod passes run one after the other
+	"""
+	switchCount, links, hostSwitch = layout.fatTreeLinks(kNUMBER)
+	hops = max(cpuplan.meanHops(switchCount, links, hostSwitch, servers, clients),
+			   cpuplan.meanHops(switchCount, links, hostSwitch, servers[::-1], clients))
+	flows = len(hostSwitch) if MATRIX or FCT or KNEE else len(clients)
+	gbpsPerCore = capacity.measureGbpsPerCore() if CPU_POLICY == 'dilate' else cpuplan.GBPS_PER_CORE
+	return cpuplan.CPUPlan(len(hostSwitch), flows, LINK_BW, hops, CORES, policy=CPU_POLICY, gbpsPerCore=gbpsPerCore)
+
+def hostPairs(net, topo, servers, clients):
+	"""
+	(client, server) host pairs used by the same pod and different pod tests
+	"""
+	pairs = []
+	for index in range(0, len(clients)):
+		clientHost = net.get(topo.hostList[clients[index]])
+		pairs.append((clientHost, net.get(topo.hostList[servers[index]])))
+		pairs.append((clientHost, net.get(topo.hostList[servers[len(clients) - 1 - index]])))
+	return pairs
+
+def patternFlows(net, topo, pattern):
+	"""
+	(client, server, relation) host flows of a traffic pattern for the experiment matrix
+	"""
+	podSize = topo.hostNumber // topo.kNUMBER
+	servers, clients = traffic.TrafficMatrix(topo.hostNumber, podSize, SEED).generate(pattern)
+	return [(net.get(topo.hostList[client]), net.get(topo.hostList[server]),
+			 'same_pod' if topo.hostPod(client) == topo.hostPod(server) else 'different_pod')
+			for server, client in zip(servers, clients)]
+
+def latencyProbes(name, pairs, relation):
+	"""
+	Latency probes of the (client, server) host pairs of a load test, running alongside it
+	"""
+	return probe.LatencyProbes('%s_latency' % name, [(client, server, relation) for client, server in pairs], PROBE_RATE, IPERF_TEST_DURATION)
+
+def failureTest(net, topo, name, pairs):
+	"""
+	Failure of the busiest core-agg link, or of a core or aggregate switch, while a load test runs
+	"""
+	return failure.FailureTest(net, topo.linkLayer, name, FAIL, 'core-agg', pairs, FAIL_AT if FAIL_AT is not None else IPERF_TEST_DURATION / 2.0)
+
+def runLatencyTest(net, topo, servers, clients):
+	"""
+	Probe the latency distribution of the same pod and different pod pairs on the idle network
+	"""
+	logger.info( ">>> Starting latency probes on the idle network" )
+	for relation, pairServers in (('same_pod', servers), ('different_pod', servers[::-1])):
+		pairs = [(net.get(topo.hostList[client]), net.get(topo.hostList[server])) for server, client in zip(pairServers, clients)]
+		latencyProbes('%s_idle_%s' % (FILE_PREFIX, relation), pairs, relation).start().stop()
+
 def runPingTest(net, topo, servers, clients):
 	"""
 	Rung concurrent ping tests for delay measurement
@@ -244,19 +303,21 @@ def runPingTest(net, topo, servers, clients):
 	logger.info(">>> Starting PING test for servers and clients in the same pod")
 
 	popens = {}
+	collector = results.FlowCollector('%s_ping_results_same_pod' % FILE_PREFIX).start()
 	
 	#Start PING 
 	for index in range(0, len(clients)):
 		clientHost = net.get(topo.hostList[clients[index]])
 		serverHost = net.get(topo.hostList[servers[index]])
 		logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-		popens[index] = clientHost.popen('ping -q -n -c 6 %s >> results/%s_ping_results_same_pod ' %(serverHost.IP(), FILE_PREFIX), shell=True)
+		outFile = collector.flowFile(index, clientHost, serverHost, 'same_pod', kind='ping')
+		popens[index] = clientHost.popen('ping -q -n -c 6 %s > %s' %(serverHost.IP(), outFile), shell=True)
 				
 	logger.debug(">>> Waiting for PING test to finish...")
 	
-	for host, line in pmonitor( popens ):
-		if host:
-			logger.debug( "<%s>: %s" % ( host, line.strip() ) )
+	monitor.monitorFlows(popens)
+
+	collector.stop()
 			
 	"""
 	====================== CLIENTS AND SERVERS IN DIFFERENT PODS ==========================
@@ -266,17 +327,20 @@ def runPingTest(net, topo, servers, clients):
 	logger.info(">>> Starting PING test for servers and clients in different pods")
 	
 	popens = {}
+	collector = results.FlowCollector('%s_ping_results_different_pod' % FILE_PREFIX).start()
 	
 	#Start PING
 	for index in range(0, len(clients)):
 		clientHost = net.get(topo.hostList[clients[index]])
 		serverHost = net.get(topo.hostList[servers[len(clients) - 1 - index]])
 		logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-		popens[index] = clientHost.popen('ping -q -n -c 6 %s >> results/%s_ping_results_different_pod ' %(serverHost.IP(), FILE_PREFIX), shell=True)
+		outFile = collector.flowFile(index, clientHost, serverHost, 'different_pod', kind='ping')
+		popens[index] = clientHost.popen('ping -q -n -c 6 %s > %s' %(serverHost.IP(), outFile), shell=True)
 			
 	logger.debug("Waiting for PING test to finish...")
 	
-	monitorOutput(popens, 300)
+	monitor.monitorFlows(popens, 300)
+	collector.stop()
     	
 def startIPERFServers(net, topo, servers):
 	"""
@@ -285,11 +349,7 @@ def startIPERFServers(net, topo, servers):
     
 	#Start IPERF servers
 	logger.info( ">>> Starting IPERF servers..." )
-	for serverHostIndex in servers:
-		net.get(topo.hostList[serverHostIndex]).popen('iptables -A INPUT -p tcp --dport 5001 -j ACCEPT', shell=True)
-		net.get(topo.hostList[serverHostIndex]).popen('iptables -A INPUT -p tcp --dport 5201 -j ACCEPT', shell=True)
-		net.get(topo.hostList[serverHostIndex]).popen('iperf3 -sD', shell=True)
-		time.sleep(1)
+	iperfservers.startIperfServers([net.get(topo.hostList[serverHostIndex]) for serverHostIndex in servers])
     	
 def runTCPTest(net, topo, servers, clients):
 	"""
@@ -299,7 +359,7 @@ def runTCPTest(net, topo, servers, clients):
 	:return:
 	"""
 	
-	#Limiting TCP's bandwidth will simulate different oversubscription values
+	#Every TCP flow is paced at each of the limits; --oversubscription sets the edge uplink capacity
 	bwLimit = [100, 1000]
 	
 	"""
@@ -309,18 +369,26 @@ def runTCPTest(net, topo, servers, clients):
 	#Start IPERF TCP clients
 	for bwLim in bwLimit:
 		logger.info( ">>> Starting IPERF TCP Clients in the SAME POD..." )
-		popens = {}
+		flows = scheduler.FlowScheduler(RAMP, RAMP_INTERVAL)
+		collector = results.FlowCollector('%s_tcp_results_same_pod_%dM' % (FILE_PREFIX, bwLim)).start()
+		pairs = []
 	
 		for index in range(0, len(clients)):
 			clientHost = net.get(topo.hostList[clients[index]])
 			serverHost = net.get(topo.hostList[servers[index]])
 			logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-			#popens[index] = clientHost.popen('iperf3 -O 10 -f m -b %dM -i 10 -t %d -Z -c %s >> results/%s_tcp_results_same_pod_%dM 2>&1' %(bwLim, IPERF_TEST_DURATION, serverHost.IP(), FILE_PREFIX, bwLim), shell=True)
-			popens[index] = clientHost.popen('iperf3 -O 10 -f m -i 10 -t %d -Z -c %s >> results/%s_tcp_results_same_pod_%dM 2>&1' %(IPERF_TEST_DURATION, serverHost.IP(), FILE_PREFIX, bwLim), shell=True)
+			pairs.append((clientHost, serverHost))
+			outFile = collector.flowFile(index, clientHost, serverHost, 'same_pod')
+			flows.add(index, clientHost, 'iperf3 %s -O 10 -b %gM -i 10 -t %d -Z -c %s > %s 2>&1' %(results.iperfJsonFlags(), results.emulatedMbps(bwLim), IPERF_TEST_DURATION, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
+
+		with latencyProbes(collector.name, pairs, 'same_pod'), failureTest(net, topo, collector.name, pairs):
+			popens = flows.launch()
 					
-		logger.debug(">>> Waiting for TCP test to finish...")
+			logger.debug(">>> Waiting for TCP test to finish...")
 	
-		monitorOutput(popens, 1200)
+			monitor.monitorFlows(popens, flows.deadlines(IPERF_TEST_DURATION + FLOW_GRACE))
+		flows.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+		collector.stop()
 			
 	
 			
@@ -332,21 +400,27 @@ def runTCPTest(net, topo, servers, clients):
 	for bwLim in bwLimit:
 		logger.info( ">>> Starting IPERF TCP Clients in DIFFERENT PODs..." )
 		
-		popens = {}
+		flows = scheduler.FlowScheduler(RAMP, RAMP_INTERVAL)
+		collector = results.FlowCollector('%s_tcp_results_different_pod_%dM' % (FILE_PREFIX, bwLim)).start()
+		pairs = []
 		#Start IPERF TCP clients
 		
 		for index in range(0, len(clients)):
-			duration = IPERF_TEST_DURATION + len(clients) - index
 			clientHost = net.get(topo.hostList[clients[index]])
 			serverHost = net.get(topo.hostList[servers[len(clients) - 1 - index]])
 			logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-			#popens[index] = clientHost.popen('iperf3 -O 10 -f m -b %dM -i 10 -t %d -Z -c %s >> results/%s_tcp_results_different_pod_%dM 2>&1' %(bwLim, duration, serverHost.IP(), FILE_PREFIX, bwLim), shell=True)
-			popens[index] = clientHost.popen('iperf3 -O 10 -f m -i 10 -t %d -Z -c %s >> results/%s_tcp_results_different_pod_%dM 2>&1' %(duration, serverHost.IP(), FILE_PREFIX, bwLim), shell=True)
-			time.sleep(1)
+			pairs.append((clientHost, serverHost))
+			outFile = collector.flowFile(index, clientHost, serverHost, 'different_pod')
+			flows.add(index, clientHost, 'iperf3 %s -O 10 -b %gM -i 10 -t %d -Z -c %s > %s 2>&1' %(results.iperfJsonFlags(), results.emulatedMbps(bwLim), IPERF_TEST_DURATION, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
+
+		with latencyProbes(collector.name, pairs, 'different_pod'), failureTest(net, topo, collector.name, pairs):
+			popens = flows.launch()
 				
-		logger.debug("Waiting for TCP test to finish...")
+			logger.debug("Waiting for TCP test to finish...")
 		
-		monitorOutput(popens, 1200)
+			monitor.monitorFlows(popens, flows.deadlines(IPERF_TEST_DURATION + FLOW_GRACE))
+		flows.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+		collector.stop()
 
 def runUDPTest(net, topo, servers, clients):
 	"""
@@ -366,17 +440,26 @@ def runUDPTest(net, topo, servers, clients):
 	
 	for bwLim in bwLimit:
 		logger.info( ">>> Starting IPERF UDP Clients in the SAME POD..." )
-		popens = {}
+		flows = scheduler.FlowScheduler(RAMP, RAMP_INTERVAL)
+		collector = results.FlowCollector('%s_udp_results_same_pod_%dM' % (FILE_PREFIX, bwLim)).start()
+		pairs = []
 		
 		for index in range(0, len(clients)):
 			clientHost = net.get(topo.hostList[clients[index]])
 			serverHost = net.get(topo.hostList[servers[index]])
 			logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-			popens[index] = clientHost.popen('iperf3 -O 10 -f k -u -b %dM -i 10 -t %d -Z -c %s >> results/%s_udp_results_same_pod_%dM 2>&1' %(bwLim, IPERF_TEST_DURATION, serverHost.IP(), FILE_PREFIX, bwLim), shell=True)
+			pairs.append((clientHost, serverHost))
+			outFile = collector.flowFile(index, clientHost, serverHost, 'same_pod')
+			flows.add(index, clientHost, 'iperf3 %s -O 10 -u -b %gM -i 10 -t %d -Z -c %s > %s 2>&1' %(results.iperfJsonFlags(), results.emulatedMbps(bwLim), IPERF_TEST_DURATION, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
+
+		with latencyProbes(collector.name, pairs, 'same_pod'), failureTest(net, topo, collector.name, pairs):
+			popens = flows.launch()
 					
-		logger.debug(">>> Waiting for UDP test to finish...")
+			logger.debug(">>> Waiting for UDP test to finish...")
 		
-		monitorOutput(popens, 1200)
+			monitor.monitorFlows(popens, flows.deadlines(IPERF_TEST_DURATION + FLOW_GRACE))
+		flows.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+		collector.stop()
 		
 			
 	"""
@@ -386,19 +469,26 @@ def runUDPTest(net, topo, servers, clients):
 	# k must be even!
 	for bwLim in bwLimit:
 		logger.info( ">>> Starting IPERF UDP Clients in DIFFERENT PODs..." )
-		popens = {}
+		flows = scheduler.FlowScheduler(RAMP, RAMP_INTERVAL)
+		collector = results.FlowCollector('%s_udp_results_different_pod_%dM' % (FILE_PREFIX, bwLim)).start()
+		pairs = []
 		
 		for index in range(0, len(clients)):
-			duration = IPERF_TEST_DURATION + len(clients) - index
 			clientHost = net.get(topo.hostList[clients[index]])
 			serverHost = net.get(topo.hostList[servers[len(clients) - 1 - index]])
 			logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-			popens[index] = clientHost.popen('iperf3 -O 10 -f m -b %dM -i 10 -t %d -Z -c %s >> results/%s_udp_results_different_pod_%dM 2>&1' %(bwLim, duration, serverHost.IP(), FILE_PREFIX, bwLim), shell=True)
-			time.sleep(1)
+			pairs.append((clientHost, serverHost))
+			outFile = collector.flowFile(index, clientHost, serverHost, 'different_pod')
+			flows.add(index, clientHost, 'iperf3 %s -O 10 -u -b %gM -i 10 -t %d -Z -c %s > %s 2>&1' %(results.iperfJsonFlags(), results.emulatedMbps(bwLim), IPERF_TEST_DURATION, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
+
+		with latencyProbes(collector.name, pairs, 'different_pod'), failureTest(net, topo, collector.name, pairs):
+			popens = flows.launch()
 				
-		logger.debug("Waiting for UDP test to finish...")
+			logger.debug("Waiting for UDP test to finish...")
 		
-		monitorOutput(popens, 1200)
+			monitor.monitorFlows(popens, flows.deadlines(IPERF_TEST_DURATION + FLOW_GRACE))
+		flows.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+		collector.stop()
 	
 	
 
@@ -407,32 +497,78 @@ def netTest(net):
     net.pingAll()
  
 def run():
+	global IPERF_TEST_DURATION, FAIL_AT
 	logging.debug("Creating Fat Tree Topology")
     
-	topo = FatTreeTopo(kNUMBER)
+	servers, clients = generateServerClientPairs(None, None, kNUMBER)
+	plan = planCPU(servers, clients)
+	logger.info( ">>> " + plan.summary() )
+	hostClass = CPULimitedHost if CPU_POLICY == 'off' else custom(CPULimitedHost, cpu=plan.hostFraction())
+
+	#A time dilated emulation runs the tests longer, the results are converted back to nominal units
+	results.DILATION = plan.dilation
+	IPERF_TEST_DURATION = plan.dilate(IPERF_TEST_DURATION)
+	if FAIL_AT is not None:
+		FAIL_AT = plan.dilate(FAIL_AT)
+
+	topo = FatTreeTopo(kNUMBER, bw=plan.linkMbps, delay=plan.delay('0.1ms'), podAddresses=TWOLEVEL, oversubscription=OVERSUBSCRIPTION)
     
+	#The local controller listens before the switches try to connect
+	controller = minictl.MiniController(CONTROLLER_PORT, LOCAL_CONTROLLER).start() if LOCAL_CONTROLLER else None
+
 	if CONTROLLER:
-		net = Mininet(topo=topo, link=TCLink, host=CPULimitedHost, controller=None)
+		net = startup.FastMininet(topo=topo, link=TCLink, host=hostClass, controller=None)
 		net.addController('controller',controller=RemoteController,ip=CONTROLLER_IP,port=CONTROLLER_PORT)
+	elif TWOLEVEL:
+		net = startup.FastMininet(topo=topo, link=TCLink, host=hostClass, controller=None)
 	else:
-		net = Mininet(switch=OVSBridgeSTP, topo=topo, host=CPULimitedHost, link=TCLink, controller=None)
+		net = startup.FastMininet(switch=OVSBridgeSTP, topo=topo, host=hostClass, link=TCLink, controller=None)
 
 	net.start()
-	servers, clients = generateServerClientPairs(net, topo, kNUMBER)
+	if CPU_POLICY != 'off':
+		cpuplan.pinHosts(net.hosts, plan)
+
+	if controller:
+		controller.setTopology(minictl.Topology.fromNet(net))
+		net.staticArp()
+
+	if TWOLEVEL:
+		twolevel.installTables(net, topo.layout)
 
 	#netTest(net)
 	#netTest(net)
 
-	#allow some time for the controller to initialize all the links
-	time.sleep(60)
+	#wait until STP converged / the controller initialized all the links
+	readiness.waitForNetwork(net, hostPairs(net, topo, servers, clients), READY_TIMEOUT,
+							 stp=not (CONTROLLER or TWOLEVEL), controller=CONTROLLER)
 
-	#runPingTest(net, topo, servers, clients)
-	startIPERFServers(net, topo, servers)
-	runTCPTest(net, topo, servers, clients)
-	runUDPTest(net, topo, servers, clients)
+	if controller:
+		minictl.flowSetupTest(net, controller, hostPairs(net, topo, servers, clients), FILE_PREFIX)
+
+	#CPU, softirq and datapath counters of the machine and the link counters during every test
+	with health.HealthSampler(FILE_PREFIX), linkstats.LinkPoller(net, topo.linkLayer, FILE_PREFIX):
+		if MATRIX:
+			matrix.runMatrix(net, matrix.ExperimentMatrix.load(MATRIX), lambda pattern: patternFlows(net, topo, pattern),
+							 FILE_PREFIX, flushFlows=CONTROLLER, ramp=RAMP, interval=RAMP_INTERVAL, grace=FLOW_GRACE)
+		elif KNEE:
+			#The knee search runs at nominal rates: the planned link rate before time dilation
+			knee.runKneeSearch(net, KNEE, lambda pattern: patternFlows(net, topo, pattern), FILE_PREFIX, plan.linkMbps * plan.dilation, KNEE_LOSS, KNEE_LATENCY,
+							   IPERF_TEST_DURATION, PROBE_RATE, flushFlows=CONTROLLER, ramp=RAMP, interval=RAMP_INTERVAL, grace=FLOW_GRACE)
+		elif FCT:
+			fct.runWorkload('%s_fct_%s_%g' % (FILE_PREFIX, FCT, FCT_LOAD), [net.get(host) for host in topo.hostList], FCT, FCT_LOAD,
+							plan.linkMbps, IPERF_TEST_DURATION, SEED, grace=FLOW_GRACE,
+							relation=lambda client, server: 'same_pod' if topo.hostPod(client) == topo.hostPod(server) else 'different_pod')
+		else:
+			#runPingTest(net, topo, servers, clients)
+			runLatencyTest(net, topo, servers, clients)
+			startIPERFServers(net, topo, servers)
+			runTCPTest(net, topo, servers, clients)
+			runUDPTest(net, topo, servers, clients)
 	
 	CLI(net)
 	net.stop()
+	if controller:
+		controller.stop()
 
 def cleanUp():
 	os.system("mn -c")
@@ -443,20 +579,81 @@ if __name__ == '__main__':
     
 	if args.d:
 		IPERF_TEST_DURATION = args.d
+
+	if args.wait:
+		READY_TIMEOUT = args.wait
+
+	SEED = args.seed if args.seed is not None else traffic.newSeed()
+	logger.info( ">> Server/client pairs seed: %d" % SEED )
+
+	if args.ramp:
+		RAMP = args.ramp
+
+	if args.ramp_interval:
+		RAMP_INTERVAL = args.ramp_interval
+
+	if args.matrix:
+		MATRIX = args.matrix
+
+	if args.fct:
+		FCT = args.fct
+
+	if args.fail:
+		FAIL = args.fail
+
+	if args.knee:
+		KNEE = args.knee
+
+	if args.knee_loss is not None:
+		KNEE_LOSS = args.knee_loss
+
+	if args.knee_latency is not None:
+		KNEE_LATENCY = args.knee_latency
+
+	if args.fail_at is not None:
+		FAIL_AT = args.fail_at
+
+	if args.probe_rate is not None:
+		PROBE_RATE = args.probe_rate
+
+	if args.load:
+		FCT_LOAD = args.load
+
+	if args.cpu_policy:
+		CPU_POLICY = args.cpu_policy
+
+	if args.cores:
+		CORES = args.cores
 		
-	if args.controller:
+	if args.local_controller:
+		LOCAL_CONTROLLER = args.local_controller
+		CONTROLLER = 1
+		FILE_PREFIX = "%s_mc%s" % (FILE_PREFIX, LOCAL_CONTROLLER)
+		if args.port:
+			CONTROLLER_PORT = args.port
+	elif args.controller:
 		CONTROLLER = 1
 		FILE_PREFIX = "%s_sdn" % FILE_PREFIX
 		if args.ip:
 			CONTROLLER_IP = args.ip
 		if args.port:
 			CONTROLLER_PORT = args.port
+	elif args.twolevel:
+		TWOLEVEL = 1
+		FILE_PREFIX = "%s_2l" % FILE_PREFIX
 	else:
 		FILE_PREFIX = "%s_stp" % FILE_PREFIX
 	
 	if args.k:
 		FILE_PREFIX = "%s_k%d" % (FILE_PREFIX, args.k)
 		kNUMBER = args.k
+
+	if args.oversubscription:
+		OVERSUBSCRIPTION = args.oversubscription
+		FILE_PREFIX = "%s_os%g" % (FILE_PREFIX, OVERSUBSCRIPTION)
+
+	if FAIL:
+		FILE_PREFIX = "%s_fail%s" % (FILE_PREFIX, FAIL)
 	
 	logger.info( "Iniating Fat Tree topology test with k = %d" % (kNUMBER) )
 	logger.info( "IPERF test will run for %d seconds " % (IPERF_TEST_DURATION) )
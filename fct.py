@@ -0,0 +1,357 @@
+"""
+fct.py: flow completion times of short flows
+
+Open-loop workload of short TCP flows over all the hosts: every host starts
+flows at Poisson arrivals to uniformly chosen other hosts, with sizes drawn
+from a measured data center flow size distribution, at a rate that offers
+a given fraction (the load) of its link capacity. A flow is a request for
+size bytes that the server answers before closing the connection; its
+completion time runs from the connect to the last byte, so it includes the
+flow setup by a reactive controller as well as the queueing in the fabric.
+
+Workloads (flow size CDFs in 1460 byte packets):
+websearch: web search cluster (Alizadeh et al., DCTCP)
+datamining: data mining cluster (Greenberg et al., VL2)
+
+The completion times are reported per flow in results/<name>_fct.tsv and
+as percentiles by flow size bucket and by pod relation in
+results/<name>_fct_summary.tsv.
+
+The module is also the server and the client run in the host namespaces:
+	python fct.py serve --port <port>
+	python fct.py client --schedule <file> --port <port> --at <clock> --out <file>
+"""
+
+import os
+import sys
+import time
+import bisect
+import socket
+import struct
+import random
+import signal
+import logging
+import argparse
+import threading
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver
+
+import health
+import monitor
+import results
+import scheduler
+import iperfservers
+
+logger = logging.getLogger( __name__ )
+
+AGENT = os.path.abspath(__file__).replace('.pyc', '.py')
+
+FCT_PORT = 5101
+
+PACKET = 1460
+
+WORKLOADS = {
+	'websearch': ((1, 0.0), (6, 0.15), (13, 0.2), (19, 0.3), (33, 0.4), (53, 0.53), (133, 0.6),
+				  (667, 0.7), (1333, 0.8), (3333, 0.9), (6667, 0.97), (20000, 1.0)),
+	'datamining': ((1, 0.0), (1, 0.5), (2, 0.6), (3, 0.7), (7, 0.8), (267, 0.9),
+				   (2107, 0.95), (66667, 0.99), (666667, 1.0)),
+}
+
+#Upper bounds of the flow size buckets, in bytes
+BUCKETS = ((100 * 1000, "small"), (10 * 1000 * 1000, "medium"), (None, "large"))
+
+PERCENTILES = (50, 95, 99)
+
+FLOW_COLUMNS = ("flow", "client", "server", "relation", "bucket", "size", "start", "fct_ms", "ok")
+SUMMARY_COLUMNS = ("group", "value", "flows", "failed", "mean_ms") + tuple("p%d_ms" % p for p in PERCENTILES)
+
+#Time the clients are given to start before the first arrival, in seconds
+LEAD = 2.0
+
+#Time a flow may take from its connect to its last byte before it counts as failed, in seconds
+FLOW_TIMEOUT = 30.0
+
+_CHUNK = b"\0" * 65536
+
+class FlowSizes(object):
+	"""
+	Flow size distribution given by CDF points, linearly interpolated
+	between the points like the empirical distributions of ns-2
+	"""
+
+	def __init__(self, points, unit=PACKET, maxSize=None):
+		"""
+		:param points: (size, cumulative probability) pairs, increasing
+		:param unit: bytes per size unit of the points
+		:param maxSize: cap of the flow size in bytes
+		"""
+		self.sizes = [size * unit for size, _ in points]
+		self.probabilities = [probability for _, probability in points]
+		self.maxSize = maxSize
+
+	def sample(self, rng):
+		u = rng.random()
+		i = max(1, bisect.bisect_left(self.probabilities, u))
+		low, high = self.probabilities[i - 1], self.probabilities[i]
+		fraction = (u - low) / (high - low) if high > low else 0.0
+		size = max(1, int(self.sizes[i - 1] + fraction * (self.sizes[i] - self.sizes[i - 1])))
+		return min(size, self.maxSize) if self.maxSize else size
+
+	def mean(self):
+		total = 0.0
+		for i in range(1, len(self.sizes)):
+			low, high = self.sizes[i - 1], self.sizes[i]
+			if self.maxSize:
+				low, high = min(low, self.maxSize), min(high, self.maxSize)
+			total += (self.probabilities[i] - self.probabilities[i - 1]) * (low + high) / 2.0
+		return total
+
+def bucket(size):
+	for limit, name in BUCKETS:
+		if limit is None or size <= limit:
+			return name
+
+def arrivals(hostCount, sizes, load, linkMbps, duration, seed=None):
+	"""
+	Open-loop Poisson arrivals of every host over duration seconds
+	:param sizes: FlowSizes
+	:param load: offered load per host, as a fraction of its link capacity
+	:return: list of (start offset, client, server, size) sorted by start
+	"""
+	rng = random.Random(seed)
+	rate = load * linkMbps * 1e6 / (8 * sizes.mean())
+	flows = []
+	for client in range(0, hostCount):
+		start = rng.expovariate(rate)
+		while start < duration:
+			server = rng.randrange(hostCount - 1)
+			flows.append((start, client, server + 1 if server >= client else server, sizes.sample(rng)))
+			start += rng.expovariate(rate)
+	flows.sort()
+	logger.debug("%d flows at %.1f flows/s per host, mean size %d bytes" % (len(flows), rate, sizes.mean()))
+	return flows
+
+def summaryRows(flows):
+	"""
+	FCT percentiles of all the flows, by size bucket, by relation and by both
+	:param flows: list of dicts with the FLOW_COLUMNS
+	"""
+	groups = {}
+	for flow in flows:
+		for group, value in (("all", "-"), ("bucket", flow["bucket"]), ("relation", flow["relation"]),
+							 ("bucket_relation", "%s_%s" % (flow["bucket"], flow["relation"]))):
+			groups.setdefault((group, value), []).append(flow)
+
+	order = dict((name, i) for i, (_, name) in enumerate(BUCKETS))
+	rows = []
+	for group, value in sorted(groups, key=lambda key: (key[0], order.get(key[1].split("_")[0], -1), key[1])):
+		members = groups[(group, value)]
+		fcts = sorted(flow["fct_ms"] for flow in members if flow["ok"])
+		rows.append((group, value, len(members), len(members) - len(fcts),
+					 sum(fcts) / len(fcts) if fcts else None) + tuple(results.percentile(fcts, p) for p in PERCENTILES))
+	return rows
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+	allow_reuse_address = True
+	daemon_threads = True
+	request_queue_size = 1024
+
+class _Handler(socketserver.BaseRequestHandler):
+
+	def handle(self):
+		header = b""
+		while len(header) < 8:
+			data = self.request.recv(8 - len(header))
+			if not data:
+				return
+			header += data
+		remaining = struct.unpack("!Q", header)[0]
+		while remaining > 0:
+			remaining -= self.request.send(_CHUNK[:min(remaining, len(_CHUNK))])
+
+def serverCommand(port):
+	return ('iptables -C INPUT -p tcp --dport %d -j ACCEPT 2>/dev/null || iptables -A INPUT -p tcp --dport %d -j ACCEPT; '
+			'exec %s %s serve --port %d' % (port, port, sys.executable, AGENT, port))
+
+def serve(port):
+	_Server(("", port), _Handler).serve_forever()
+
+def fetch(address, port, size, timeout=FLOW_TIMEOUT):
+	"""
+	Request size bytes from a server
+	:param timeout: time the whole flow may take, in seconds
+	:return: completion time in seconds, None when the flow failed
+	"""
+	start = time.time()
+	deadline = start + timeout
+	received = 0
+	try:
+		connection = socket.create_connection((address, port), timeout)
+		try:
+			connection.sendall(struct.pack("!Q", size))
+			while received < size:
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					return None
+				connection.settimeout(remaining)
+				data = connection.recv(65536)
+				if not data:
+					break
+				received += len(data)
+		finally:
+			connection.close()
+	except (socket.error, socket.timeout):
+		return None
+	return time.time() - start if received >= size else None
+
+def runClient(schedule, port, at, out, timeout=FLOW_TIMEOUT):
+	"""
+	Start every flow of a schedule at its time, each in its own thread, and
+	write the completion time of every flow as soon as it finishes, so that
+	a client stopped at the deadline keeps its finished flows
+	:param schedule: lines "flow, start offset, server address, size"
+	:param at: start time of the schedule on the scheduler clock
+	"""
+	flows = []
+	with open(schedule) as f:
+		for line in f:
+			index, offset, address, size = line.split()
+			flows.append((int(index), float(offset), address, int(size)))
+
+	lock = threading.Lock()
+	output = open(out, "w")
+
+	def run(index, offset, address, size):
+		fct = fetch(address, port, size, timeout)
+		with lock:
+			if output.closed:
+				return
+			output.write("%d\t%.6f\t%s\n" % (index, offset, "%.6f" % fct if fct is not None else "-"))
+			output.flush()
+
+	threads = []
+	for index, offset, address, size in flows:
+		remaining = at + offset - scheduler.clock()
+		if remaining > 0:
+			time.sleep(remaining)
+		thread = threading.Thread(target=run, args=(index, offset, address, size))
+		thread.daemon = True
+		thread.start()
+		threads.append(thread)
+	for thread in threads:
+		thread.join(timeout + 5)
+
+	with lock:
+		output.close()
+
+def runWorkload(name, hosts, workload='websearch', load=0.3, linkMbps=1000, duration=40, seed=None,
+				relation=None, maxSize=None, port=FCT_PORT, grace=60):
+	"""
+	Run an open-loop short flow workload over the hosts of a started network
+	:param name: experiment name of the results
+	:param hosts: mininet hosts, indexed like the topology hosts
+	:param workload: flow size distribution, one of WORKLOADS
+	:param load: offered load per host, as a fraction of linkMbps
+	:param linkMbps: host link capacity in Mbit/s
+	:param duration: time during which flows arrive, in seconds
+	:param relation: function (client index, server index) -> pod relation
+	:param maxSize: cap of the flow size in bytes
+	:return: list of summary rows
+	"""
+	sizes = FlowSizes(WORKLOADS[workload], maxSize=maxSize)
+	flows = arrivals(len(hosts), sizes, load, linkMbps, duration, seed)
+	flowDir = os.path.join(results.RESULTS_DIR, name)
+	if not os.path.isdir(flowDir):
+		os.makedirs(flowDir)
+	logger.info( ">>> %d %s flows at load %.2f over %d seconds" % (len(flows), workload, load, duration) )
+
+	servers = [host.popen(serverCommand(port), shell=True) for host in hosts]
+	try:
+		missing = iperfservers.waitForListeners([(host, [port]) for host in hosts])
+		if missing:
+			logger.info( ">>> FCT servers not listening on %d hosts" % len(missing) )
+
+		schedules = dict((client, []) for client in range(0, len(hosts)))
+		for index, (start, client, server, size) in enumerate(flows):
+			schedules[client].append("%d\t%.6f\t%s\t%d\n" % (index, start, hosts[server].IP(), size))
+
+		health.mark(name)
+		at = scheduler.clock() + LEAD
+		popens = {}
+		for client, lines in schedules.items():
+			if not lines:
+				continue
+			schedule = os.path.join(flowDir, "client%03d.schedule" % client)
+			with open(schedule, "w") as f:
+				f.writelines(lines)
+			popens[client] = hosts[client].popen('%s %s client --schedule %s --port %d --at %.6f --out %s' %
+												 (sys.executable, AGENT, schedule, port, at, os.path.join(flowDir, "client%03d.fct" % client)),
+												 shell=True)
+		monitor.monitorFlows(popens, LEAD + duration + FLOW_TIMEOUT + grace)
+		health.mark()
+	finally:
+		for popen in servers:
+			monitor.signalFlow(popen, signal.SIGKILL)
+
+	completed = {}
+	for client in popens:
+		try:
+			with open(os.path.join(flowDir, "client%03d.fct" % client)) as f:
+				for line in f:
+					fields = line.split()
+					if len(fields) != 3:
+						continue
+					index, _, fct = fields
+					completed[int(index)] = float(fct) if fct != "-" else None
+		except IOError:
+			pass
+
+	rows = []
+	for index, (start, client, server, size) in enumerate(flows):
+		fct = completed.get(index)
+		rows.append({"flow": index, "client": str(hosts[client]), "server": str(hosts[server]),
+					 "relation": relation(client, server) if relation else "-", "bucket": bucket(size),
+					 "size": size, "start": results.nominalTime(start), "fct_ms": results.nominalTime(1000 * fct) if fct is not None else None,
+					 "ok": fct is not None})
+
+	with open(os.path.join(results.RESULTS_DIR, "%s_fct.tsv" % name), "w") as f:
+		f.write("\t".join(FLOW_COLUMNS) + "\n")
+		for row in rows:
+			f.write("%d\t%s\t%s\t%s\t%s\t%d\t%.6f\t%s\t%d\n" % (row["flow"], row["client"], row["server"], row["relation"], row["bucket"],
+															  row["size"], row["start"], "%.3f" % row["fct_ms"] if row["ok"] else "-", row["ok"]))
+
+	summary = summaryRows(rows)
+	with open(os.path.join(results.RESULTS_DIR, "%s_fct_summary.tsv" % name), "w") as f:
+		f.write("\t".join(SUMMARY_COLUMNS) + "\n")
+		for row in summary:
+			f.write("\t".join(results.field(value) for value in row) + "\n")
+	for row in summary:
+		if row[0] in ("bucket", "relation"):
+			logger.info( ">>> FCT %s %s: %d flows, %d failed, p50 %s ms, p99 %s ms" %
+						 (row[0], row[1], row[2], row[3], results.field(row[5]), results.field(row[7])) )
+	return summary
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Short flow server and client run in the host namespaces')
+	sub = parser.add_subparsers(dest='role')
+	server = sub.add_parser('serve', help='Answer flow requests')
+	server.add_argument('--port', type=int, default=FCT_PORT)
+	client = sub.add_parser('client', help='Run a flow schedule')
+	client.add_argument('--schedule', type=str, required=True, help='Flow schedule file')
+	client.add_argument('--port', type=int, default=FCT_PORT)
+	client.add_argument('--at', type=float, required=True, help='Start time of the schedule on the monotonic clock')
+	client.add_argument('--out', type=str, required=True, help='File the completion times are written to')
+	client.add_argument('--timeout', type=float, default=FLOW_TIMEOUT, help='Time after which a flow fails, in seconds')
+	args = parser.parse_args(argv)
+
+	if args.role == 'serve':
+		serve(args.port)
+	else:
+		runClient(args.schedule, args.port, args.at, args.out, args.timeout)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
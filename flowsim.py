@@ -0,0 +1,356 @@
+"""
+flowsim.py: flow-level max-min fair throughput of the Fat Tree and Jellyfish topologies
+
+Predicts what the IPERF TCP tests would report without starting Mininet.
+Every flow is routed over the switch graph of layout.py, and the max-min
+fair rates of all the flows are then computed at once by progressive
+filling (water-filling): all the unfrozen flows grow together until a link
+saturates, and the flows crossing it are frozen. Every step is a NumPy
+bincount over the (flow, link) incidence, so thousands of flows over
+thousands of links take milliseconds.
+
+The output is a results table with the columns of results.TABLE_COLUMNS,
+one summary row per flow. The test pattern simulates the passes of
+runTCPTest one by one, every flow capped at the -b limit of its pass, and
+writes one table per pass named like the collected one
+(<out>_tcp_results_same_pod_100M.tsv, ...), so that both compare one to one.
+
+Routing:
+stp: every flow follows the spanning tree rooted at the first switch, the
+	 root bridge of OVSBridgeSTP
+ecmp: every flow is hashed onto one of its equal-cost shortest paths
+ksp: every flow is hashed onto one of its k shortest paths, or split over
+	 several of them as independent subflows (MPTCP)
+
+Network: directed link graph of a topology
+
+Usage:
+	python flowsim.py fattree -k 8 --routing ecmp --pattern test
+	python flowsim.py jellyfish -H 686 -s 245 -p 14 --routing ksp --paths 8 --subflows 8 --runs 20
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+import numpy as np
+
+import layout
+import traffic
+import results
+import pathstats
+
+logger = logging.getLogger( __name__ )
+
+ROUTINGS = ('stp', 'ecmp', 'ksp')
+
+#Remaining capacity below which a link counts as saturated, relative to its capacity
+EPSILON = 1e-9
+
+#Per-flow -b limits of the passes of fattree.runTCPTest, in Mbit/s
+TCP_TEST_LIMITS = (100, 1000)
+
+class Network(object):
+	"""
+	Directed links of a topology: switch link i is 2i from its first to its
+	second end and 2i+1 back; every host has an up link and a down link
+	"""
+
+	def __init__(self, switchCount, links, hostSwitch, bandwidth=1000, hostBandwidth=None):
+		"""
+		:param switchCount: number of switches
+		:param links: list of (switch, switch) links
+		:param hostSwitch: host index -> switch index
+		:param bandwidth: switch link capacity in Mbit/s
+		:param hostBandwidth: host link capacity in Mbit/s, bandwidth by default
+		"""
+		self.switchCount = switchCount
+		self.links = list(links)
+		self.hostSwitch = list(hostSwitch)
+		self.neighbours = pathstats.neighbours(switchCount, self.links)
+		self.adjacency = None
+
+		self.linkIndex = {}
+		for i, (a, b) in enumerate(self.links):
+			self.linkIndex[(a, b)] = 2 * i
+			self.linkIndex[(b, a)] = 2 * i + 1
+
+		hostCount = len(self.hostSwitch)
+		self.hostUp = 2 * len(self.links)
+		self.hostDown = self.hostUp + hostCount
+		self.capacity = np.concatenate((np.full(2 * len(self.links), float(bandwidth)),
+										np.full(2 * hostCount, float(hostBandwidth or bandwidth))))
+
+	def pathLinks(self, client, server, path):
+		"""
+		Directed links used by a host-to-host flow over a switch path
+		"""
+		return ([self.hostUp + client] + [self.linkIndex[hop] for hop in zip(path, path[1:])] +
+				[self.hostDown + server])
+
+	def shortestPaths(self, sources):
+		if self.adjacency is None:
+			self.adjacency = pathstats.adjacencyMatrix(self.switchCount, self.links)
+		return pathstats.shortestPaths(self.adjacency, sources)
+
+def stpPaths(network, servers, clients, root=0):
+	"""
+	Paths along the spanning tree: every switch keeps the lowest-index
+	neighbour closer to the root as its parent, like the lowest bridge ID of
+	OVSBridgeSTP's creation-ordered priorities
+	"""
+	neighbours = network.neighbours
+	depth = {root: 0}
+	frontier = [root]
+	while frontier:
+		nextFrontier = []
+		for node in frontier:
+			for neighbour in neighbours[node]:
+				if neighbour not in depth:
+					depth[neighbour] = depth[node] + 1
+					nextFrontier.append(neighbour)
+		frontier = nextFrontier
+	parent = dict((node, min(n for n in neighbours[node] if depth.get(n) == depth[node] - 1))
+				  for node in depth if node != root)
+
+	def treePath(a, b):
+		up = [a]
+		down = [b]
+		while up[-1] != down[-1]:
+			if depth[up[-1]] >= depth[down[-1]]:
+				up.append(parent[up[-1]])
+			else:
+				down.append(parent[down[-1]])
+		return up + down[-2::-1]
+
+	return [[treePath(network.hostSwitch[client], network.hostSwitch[server])]
+			for server, client in zip(servers, clients)]
+
+def ecmpPaths(network, servers, clients, seed=None):
+	"""
+	One equal-cost shortest path per flow; at every hop the next switch is
+	drawn in proportion to its number of shortest paths to the destination,
+	so every shortest path is equally likely, like a per-flow hash
+	"""
+	rng = random.Random(seed)
+	destinations = np.unique([network.hostSwitch[server] for server in servers])
+	distances, counts = network.shortestPaths(destinations)
+	row = dict((switch, i) for i, switch in enumerate(destinations))
+
+	paths = []
+	for server, client in zip(servers, clients):
+		dst = network.hostSwitch[server]
+		distance = distances[row[dst]]
+		count = counts[row[dst]]
+		path = [network.hostSwitch[client]]
+		if distance[path[0]] < 0:
+			raise ValueError("Host %d cannot reach host %d" % (client, server))
+		while path[-1] != dst:
+			nextHops = [n for n in network.neighbours[path[-1]] if distance[n] == distance[path[-1]] - 1]
+			draw = rng.random() * sum(count[n] for n in nextHops)
+			for n in nextHops:
+				draw -= count[n]
+				if draw < 0:
+					break
+			path.append(n)
+		paths.append([path])
+	return paths
+
+def kspPaths(network, servers, clients, k=8, subflows=1, seed=None):
+	"""
+	k shortest paths of every switch pair (computed once per pair); a flow is
+	hashed onto one of them, or uses the first subflows of them
+	"""
+	rng = random.Random(seed)
+	cache = {}
+	paths = []
+	for server, client in zip(servers, clients):
+		pair = (network.hostSwitch[client], network.hostSwitch[server])
+		if pair not in cache:
+			cache[pair] = pathstats.kShortestPaths(network.neighbours, pair[0], pair[1], k)
+			if not cache[pair]:
+				raise ValueError("Host %d cannot reach host %d" % (client, server))
+		candidates = cache[pair]
+		if subflows > 1:
+			paths.append(candidates[:subflows])
+		else:
+			paths.append([candidates[rng.randrange(len(candidates))]])
+	return paths
+
+def maxMinRates(capacity, subflowOf, linkOf, subflowCount):
+	"""
+	Max-min fair rates by progressive filling
+	:param capacity: capacity of every link
+	:param subflowOf: subflow of every (subflow, link) incidence
+	:param linkOf: link of every (subflow, link) incidence
+	:return: rate of every subflow
+	"""
+	rates = np.zeros(subflowCount)
+	remaining = np.array(capacity, dtype=np.float64)
+	active = np.ones(subflowCount, dtype=bool)
+	iterations = 0
+
+	while active.any():
+		iterations += 1
+		entries = active[subflowOf]
+		load = np.bincount(linkOf[entries], minlength=len(remaining))
+		used = load > 0
+		if not used.any():
+			break
+		delta = (remaining[used] / load[used]).min()
+		rates[active] += delta
+		remaining -= delta * load
+		saturated = used & (remaining <= EPSILON * capacity)
+		frozen = np.bincount(subflowOf[entries], weights=saturated[linkOf[entries]], minlength=subflowCount) > 0
+		active &= ~frozen
+
+	logger.debug("Water-filling converged in %d iterations" % iterations)
+	return rates
+
+def simulate(network, servers, clients, routing='ecmp', k=8, subflows=1, seed=None, limit=None):
+	"""
+	Max-min fair throughput of every (client, server) flow
+	:param routing: one of ROUTINGS
+	:param k: number of shortest paths of the ksp routing
+	:param subflows: subflows per flow of the ksp routing
+	:param limit: rate limit of every flow in Mbit/s (IPERF -b), None for unlimited flows
+	:return: (throughput array in Mbit/s, link utilization array)
+	"""
+	if routing == 'stp':
+		paths = stpPaths(network, servers, clients)
+	elif routing == 'ecmp':
+		paths = ecmpPaths(network, servers, clients, seed)
+	elif routing == 'ksp':
+		paths = kspPaths(network, servers, clients, k, subflows, seed)
+	else:
+		raise ValueError("Unknown routing %s" % routing)
+
+	#A rate limit is a virtual link of its own per flow, shared by its subflows
+	capacity = network.capacity
+	if limit is not None:
+		capacity = np.concatenate((capacity, np.full(len(clients), float(limit))))
+
+	flowOf = []
+	subflowOf = []
+	linkOf = []
+	for flow, (server, client, flowPaths) in enumerate(zip(servers, clients, paths)):
+		for path in flowPaths:
+			links = network.pathLinks(client, server, path)
+			if limit is not None:
+				links.append(len(network.capacity) + flow)
+			subflowOf.extend([len(flowOf)] * len(links))
+			linkOf.extend(links)
+			flowOf.append(flow)
+
+	flowOf = np.asarray(flowOf, dtype=np.int64)
+	subflowOf = np.asarray(subflowOf, dtype=np.int64)
+	linkOf = np.asarray(linkOf, dtype=np.int64)
+	rates = maxMinRates(capacity, subflowOf, linkOf, len(flowOf))
+
+	throughput = np.bincount(flowOf, weights=rates, minlength=len(clients))
+	utilization = (np.bincount(linkOf, weights=rates[subflowOf], minlength=len(capacity)) / capacity)[:len(network.capacity)]
+	return throughput, utilization
+
+def fatTreeTestPasses(kNUMBER, seed=None):
+	"""
+	Passes of fattree.runTCPTest: the same-pod pairs, then the different-pod
+	pairs (servers in reverse order), each at every -b limit
+	:return: list of (experiment name suffix, servers, clients, relation, per-flow limit in Mbit/s)
+	"""
+	servers, clients = traffic.fatTreePairs(kNUMBER, seed)
+	return [('tcp_results_%s_%dM' % (relation, limit), passServers, clients, relation, limit)
+			for relation, passServers in (('same_pod', servers), ('different_pod', servers[::-1]))
+			for limit in TCP_TEST_LIMITS]
+
+def tableRows(throughput, servers, clients, hostNames, relations, duration=0):
+	"""
+	One results summary row per flow, see results.TABLE_COLUMNS
+	"""
+	return [{"flow": index, "client": hostNames[client], "server": hostNames[server], "relation": relation,
+			 "type": "summary", "start": 0.0, "end": float(duration), "mbps": float(mbps)}
+			for index, (server, client, relation, mbps) in enumerate(zip(servers, clients, relations, throughput))]
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Flow-level max-min fair throughput of the test topologies')
+	sub = parser.add_subparsers(dest='topology')
+	ft = sub.add_parser('fattree', help='Fat Tree topology')
+	ft.add_argument('-k', type=int, default=4, help='Number of PODs')
+	jf = sub.add_parser('jellyfish', help='Jellyfish topology')
+	jf.add_argument('-H', type=int, default=16, help='Number of servers (hosts)')
+	jf.add_argument('-s', type=int, default=None, help='Number of switches')
+	jf.add_argument('-p', type=int, default=4, help='Number of switch ports')
+	jf.add_argument('--graph', type=str, default=None, help='Switch graph exported by jellyfish.py --export')
+	for p in (ft, jf):
+		p.add_argument('--routing', type=str, default='ecmp', choices=ROUTINGS, help='Routing policy')
+		p.add_argument('--paths', type=int, default=8, help='Number of shortest paths of the ksp routing')
+		p.add_argument('--subflows', type=int, default=1, help='Subflows per flow of the ksp routing')
+		p.add_argument('--pattern', type=str, default='test', choices=('test',) + traffic.PATTERNS,
+					   help='Traffic pattern; test uses the pairs of the emulated TCP test')
+		p.add_argument('--stride', type=int, default=1, help='Stride of the stride pattern')
+		p.add_argument('--hotspots', type=int, default=1, help='Number of hotspot servers')
+		p.add_argument('--bw', type=float, default=1000, help='Link bandwidth in Mbit/s')
+		p.add_argument('--seed', type=int, default=None, help='Random seed of the pairs, the hashing and the topology')
+		p.add_argument('--runs', type=int, default=1, help='Number of runs, with seeds seed, seed+1, ...')
+		p.add_argument('-d', type=int, default=40, help='Duration reported in the table, in seconds')
+		p.add_argument('--out', type=str, default=None, help='Write results/<out>.tsv (results/<out>_<run>.tsv for several runs); '
+					   'with the test pattern, one results/<out>_tcp_results_<pass>.tsv per pass')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO)
+	seed = args.seed if args.seed is not None else traffic.newSeed()
+
+	print("run\tseed\tpass\tflows\tmin_mbps\tmean_mbps\tmedian_mbps\tmax_mbps\tmax_utilization\tseconds")
+	for run in range(1, args.runs + 1):
+		runSeed = seed + run - 1
+
+		if args.topology == 'fattree':
+			fatTree = layout.FatTreeLayout(args.k)
+			switchCount, links, hostSwitch = layout.fatTreeLinks(args.k)
+			hostNames = fatTree.names(layout.HOST)
+			podSize = fatTree.hostNumber // args.k
+			if args.pattern == 'test':
+				passes = [(name, servers, clients, [relation] * len(clients), limit)
+						  for name, servers, clients, relation, limit in fatTreeTestPasses(args.k, runSeed)]
+			else:
+				servers, clients = traffic.TrafficMatrix(fatTree.hostNumber, podSize, runSeed).generate(args.pattern, args.stride, args.hotspots)
+				relations = ['same_pod' if fatTree.hostPod(c) == fatTree.hostPod(s) else 'different_pod' for s, c in zip(servers, clients)]
+				passes = [(args.pattern, servers, clients, relations, None)]
+		else:
+			if args.graph:
+				graph = layout.JellyfishLayout.load(args.graph)
+				switchCount, links, hostSwitch = graph.switchNumber, graph.links(), graph.hostSwitches()
+			else:
+				switchCount, links, hostSwitch = layout.jellyfishLinks(args.H, args.s or args.H, args.p, runSeed)
+			hostNames = ['h%d' % (host + 1) for host in range(0, len(hostSwitch))]
+			pattern = 'pairs' if args.pattern == 'test' else args.pattern
+			servers, clients = traffic.TrafficMatrix(len(hostSwitch), seed=runSeed).generate(pattern, args.stride, args.hotspots)
+			#jellyfish.runTCPTest runs one unlimited pass per run, named after the run
+			name = 'tcp_results_%d' % run if args.pattern == 'test' else args.pattern
+			passes = [(name, servers, clients, ['-'] * len(clients), None)]
+
+		network = Network(switchCount, links, hostSwitch, args.bw)
+		for name, servers, clients, relations, limit in passes:
+			passStart = time.time()
+			throughput, utilization = simulate(network, servers, clients, args.routing, args.paths, args.subflows, runSeed, limit)
+
+			if args.out:
+				if args.pattern != 'test':
+					table = args.out if args.runs == 1 else '%s_%d' % (args.out, run)
+				elif args.topology == 'fattree' and args.runs > 1:
+					table = '%s_%d_%s' % (args.out, run, name)
+				else:
+					table = '%s_%s' % (args.out, name)
+				if not os.path.isdir(results.RESULTS_DIR):
+					os.makedirs(results.RESULTS_DIR)
+				results.writeTable(os.path.join(results.RESULTS_DIR, '%s.tsv' % table),
+								   tableRows(throughput, servers, clients, hostNames, relations, args.d))
+
+			print("%d\t%d\t%s\t%d\t%.1f\t%.1f\t%.1f\t%.1f\t%.3f\t%.3f" % (run, runSeed, name, len(clients), throughput.min(), throughput.mean(),
+																	  np.median(throughput), throughput.max(), utilization.max(),
+																	  time.time() - passStart))
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+health.py: health of the emulation host while the tests are running
+
+A low IPERF result can come from the emulated fabric or from the machine
+that emulates it. HealthSampler polls the machine in the background and
+records, per sample:
+
+results/<name>_health_cpu.tsv: busy, system and softirq time of every core
+							   (/proc/stat) and its NET_RX/NET_TX softirqs
+							   (/proc/softirqs)
+results/<name>_health_dp.tsv: lookups hit, missed and lost by every OVS
+							  datapath (ovs-dpctl show); missed lookups are
+							  the upcalls to ovs-vswitchd, lost ones are
+							  upcalls it dropped
+
+Every row carries the test phase it was sampled in. The phases are marked
+with mark(), which results.FlowCollector does for every experiment it
+collects, and summarized per phase in results/<name>_health_phases.tsv.
+
+HealthSampler: background sampler of the emulation host
+"""
+
+import os
+import time
+import threading
+import subprocess
+import logging
+
+logger = logging.getLogger( __name__ )
+
+RESULTS_DIR = "results"
+
+#Phase of the samples taken outside of any test
+IDLE = "idle"
+
+#A phase in which a core was busier than this, or in which the datapath lost
+#upcalls, was limited by the emulation host
+BUSY_PERCENT = 90.0
+
+CPU_COLUMNS = ("time", "phase", "cpu", "busy_pct", "system_pct", "softirq_pct", "net_rx_per_s", "net_tx_per_s")
+DP_COLUMNS = ("time", "phase", "datapath", "hit_per_s", "missed_per_s", "lost_per_s", "upcalls_per_s", "flows")
+PHASE_COLUMNS = ("phase", "start", "end", "samples", "max_busy_pct", "mean_softirq_pct", "upcalls_per_s", "lost")
+
+#Running samplers, see mark()
+_samplers = []
+
+def register(sampler):
+	"""
+	Have mark() reach a sampler; anything with a mark(phase) method will do
+	"""
+	_samplers.append(sampler)
+
+def unregister(sampler):
+	if sampler in _samplers:
+		_samplers.remove(sampler)
+
+def mark(phase=None):
+	"""
+	Start a new phase in every running sampler
+	:param phase: phase name, None when a test ends
+	"""
+	for sampler in list(_samplers):
+		sampler.mark(phase)
+
+def cpuTimes(path="/proc/stat"):
+	"""
+	Jiffies of every core
+	:return: dict core name -> (total, idle, system, softirq); softirq
+			 includes the hardware interrupts
+	"""
+	times = {}
+	try:
+		with open(path) as f:
+			for line in f:
+				fields = line.split()
+				if not fields or not fields[0].startswith("cpu") or fields[0] == "cpu":
+					continue
+				values = [int(value) for value in fields[1:]]
+				#user nice system idle iowait irq softirq steal (guest time is part of user)
+				values += [0] * (8 - len(values))
+				times[fields[0]] = (sum(values[:8]), values[3] + values[4], values[2], values[5] + values[6])
+	except IOError:
+		pass
+	return times
+
+def netSoftirqs(path="/proc/softirqs"):
+	"""
+	NET_RX and NET_TX softirq counts of every core
+	:return: dict core name -> (net_rx, net_tx)
+	"""
+	counts = {}
+	try:
+		with open(path) as f:
+			cores = [name.lower() for name in f.readline().split()]
+			rows = {}
+			for line in f:
+				fields = line.split()
+				if fields and fields[0] in ("NET_RX:", "NET_TX:"):
+					rows[fields[0]] = [int(value) for value in fields[1:]]
+	except IOError:
+		return counts
+	for index, core in enumerate(cores):
+		counts[core] = tuple(rows.get(name, [])[index] if index < len(rows.get(name, [])) else 0
+							 for name in ("NET_RX:", "NET_TX:"))
+	return counts
+
+def parseDpctl(output):
+	"""
+	Lookup counters and flow count of every datapath in the output of
+	ovs-dpctl show
+	:return: dict datapath -> (hit, missed, lost, flows)
+	"""
+	datapaths = {}
+	name = None
+	for line in output.splitlines():
+		if line and not line[0].isspace() and line.rstrip().endswith(":"):
+			name = line.strip().rstrip(":")
+			datapaths[name] = [0, 0, 0, 0]
+			continue
+		fields = line.split()
+		if name is None or not fields:
+			continue
+		if fields[0] == "lookups:":
+			counters = dict(field.split(":", 1) for field in fields[1:] if ":" in field)
+			datapaths[name][:3] = [int(counters.get(key, 0)) for key in ("hit", "missed", "lost")]
+		elif fields[0] == "flows:" and len(fields) > 1:
+			datapaths[name][3] = int(fields[1])
+	return dict((name, tuple(values)) for name, values in datapaths.items())
+
+def dpctlShow():
+	"""
+	Run ovs-dpctl show in the root namespace, None when it is not available
+	"""
+	try:
+		process = subprocess.Popen(["ovs-dpctl", "show"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	except OSError:
+		return None
+	output, _ = process.communicate()
+	if process.returncode:
+		return None
+	return output.decode("utf-8", "replace")
+
+def _rate(now, before, seconds):
+	return max(0, now - before) / seconds if seconds > 0 else 0.0
+
+def _percent(part, total):
+	return 100.0 * part / total if total > 0 else 0.0
+
+class _Phase(object):
+
+	def __init__(self, name, start):
+		self.name = name
+		self.start = start
+		self.end = None
+		self.samples = 0
+		self.maxBusy = 0.0
+		self.softirq = 0.0
+		self.upcalls = 0.0
+		self.lost = 0
+
+class HealthSampler(object):
+	"""
+	Samples the CPU, softirq and OVS datapath counters of the emulation host
+	in a background thread
+	"""
+
+	def __init__(self, name, interval=1.0, directory=RESULTS_DIR):
+		"""
+		:param name: name of the test run, e.g. ft_stp_k4
+		:param interval: sampling interval in seconds
+		:param directory: base results directory
+		"""
+		self.name = name
+		self.interval = interval
+		self.cpuPath = os.path.join(directory, "%s_health_cpu.tsv" % name)
+		self.dpPath = os.path.join(directory, "%s_health_dp.tsv" % name)
+		self.phasePath = os.path.join(directory, "%s_health_phases.tsv" % name)
+		self.lock = threading.Lock()
+		self.stopped = threading.Event()
+		self.thread = None
+		self.started = None
+		self.phases = []
+		self.dpctl = True
+		self.last = None
+		self.cpuTable = None
+		self.dpTable = None
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def start(self):
+		self.cpuTable = open(self.cpuPath, "w")
+		self.cpuTable.write("\t".join(CPU_COLUMNS) + "\n")
+		self.dpTable = open(self.dpPath, "w")
+		self.dpTable.write("\t".join(DP_COLUMNS) + "\n")
+		self.started = time.time()
+		self.phases = [_Phase(IDLE, 0.0)]
+		self.last = self._read()
+		self.thread = threading.Thread(target=self._run, name="health-%s" % self.name)
+		self.thread.daemon = True
+		self.thread.start()
+		register(self)
+		return self
+
+	def stop(self):
+		"""
+		Take a last sample, close the tables and write the phase summary
+		:return: list of the phases limited by the emulation host
+		"""
+		unregister(self)
+		self.stopped.set()
+		if self.thread:
+			self.thread.join()
+		self._sample()
+		self.cpuTable.close()
+		self.dpTable.close()
+		self.phases[-1].end = time.time() - self.started
+		return self._writePhases()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def mark(self, phase=None):
+		"""
+		Start a new phase; the current sample interval is closed first so that
+		no sample straddles two phases
+		"""
+		self._sample()
+		with self.lock:
+			now = time.time() - self.started
+			self.phases[-1].end = now
+			self.phases.append(_Phase(phase or IDLE, now))
+
+	def _run(self):
+		while not self.stopped.wait(self.interval):
+			self._sample()
+
+	def _read(self):
+		output = dpctlShow() if self.dpctl else None
+		if self.dpctl and output is None:
+			logger.debug("ovs-dpctl is not available, datapath counters are not sampled")
+			self.dpctl = False
+		return time.time(), cpuTimes(), netSoftirqs(), parseDpctl(output or "")
+
+	def _sample(self):
+		with self.lock:
+			if self.last is None:
+				return
+			now, cpus, softirqs, datapaths = self._read()
+			before, lastCpus, lastSoftirqs, lastDatapaths = self.last
+			self.last = (now, cpus, softirqs, datapaths)
+			seconds = now - before
+			if seconds <= 0:
+				return
+			phase = self.phases[-1]
+			stamp = "%.3f" % (now - self.started)
+
+			maxBusy = 0.0
+			softirq = 0.0
+			for core in sorted(cpus, key=lambda name: int(name[3:]) if name[3:].isdigit() else 0):
+				if core not in lastCpus:
+					continue
+				total, idle, system, irq = [a - b for a, b in zip(cpus[core], lastCpus[core])]
+				busy = _percent(total - idle, total)
+				maxBusy = max(maxBusy, busy)
+				softirq += _percent(irq, total)
+				netRx, netTx = [_rate(a, b, seconds) for a, b in zip(softirqs.get(core, (0, 0)), lastSoftirqs.get(core, (0, 0)))]
+				self.cpuTable.write("%s\t%s\t%s\t%.1f\t%.1f\t%.1f\t%.0f\t%.0f\n" %
+									(stamp, phase.name, core, busy, _percent(system, total), _percent(irq, total), netRx, netTx))
+
+			upcalls = 0.0
+			for name in sorted(datapaths):
+				hit, missed, lost, flows = datapaths[name]
+				lastHit, lastMissed, lastLost, _ = lastDatapaths.get(name, datapaths[name])
+				rates = (_rate(hit, lastHit, seconds), _rate(missed, lastMissed, seconds), _rate(lost, lastLost, seconds))
+				upcalls += rates[1] + rates[2]
+				phase.lost += max(0, lost - lastLost)
+				self.dpTable.write("%s\t%s\t%s\t%.0f\t%.0f\t%.0f\t%.0f\t%d\n" %
+								   ((stamp, phase.name, name) + rates + (rates[1] + rates[2], flows)))
+
+			phase.samples += 1
+			phase.maxBusy = max(phase.maxBusy, maxBusy)
+			phase.softirq += softirq / max(len(cpus), 1)
+			phase.upcalls += upcalls
+			self.cpuTable.flush()
+			self.dpTable.flush()
+
+	def _writePhases(self):
+		limited = []
+		with open(self.phasePath, "w") as f:
+			f.write("\t".join(PHASE_COLUMNS) + "\n")
+			for phase in self.phases:
+				if not phase.samples:
+					continue
+				samples = float(phase.samples)
+				f.write("%s\t%.3f\t%.3f\t%d\t%.1f\t%.1f\t%.0f\t%d\n" %
+						(phase.name, phase.start, phase.end, phase.samples, phase.maxBusy,
+						 phase.softirq / samples, phase.upcalls / samples, phase.lost))
+				if phase.name != IDLE and (phase.maxBusy >= BUSY_PERCENT or phase.lost):
+					limited.append(phase.name)
+					logger.info( ">>> Emulation host limited %s: a core was %.0f%% busy, %d upcalls lost" %
+								 (phase.name, phase.maxBusy, phase.lost) )
+		logger.debug("Health of the emulation host written to %s" % self.phasePath)
+		return limited
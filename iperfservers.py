@@ -0,0 +1,111 @@
+"""
+iperfservers.py: concurrent IPERF server bring-up
+
+All the servers are launched at once, each one in its own host namespace,
+and every listener is then confirmed by looking for its listening socket
+with ss, which does not disturb iperf3 the way a test connection would.
+
+An iperf3 server serves one test at a time, so a host that appears n times
+in the server list (e.g. hotspot or all-to-all traffic) gets n servers on
+consecutive ports; flowPorts gives the port each flow must connect to.
+"""
+
+import time
+import logging
+
+logger = logging.getLogger( __name__ )
+
+IPERF_PORT = 5201
+
+POLL_INTERVAL = 0.2
+
+def flowPorts(servers, port=IPERF_PORT):
+	"""
+	IPERF port of every flow: the n-th flow to a server uses port + n
+	:param servers: server of every flow
+	:return: list of ports, one per flow
+	"""
+	seen = {}
+	ports = []
+	for server in servers:
+		ports.append(port + seen.get(server, 0))
+		seen[server] = seen.get(server, 0) + 1
+	return ports
+
+def serverCommand(ports):
+	rules = ['iptables -C INPUT -p tcp --dport %d -j ACCEPT 2>/dev/null || iptables -A INPUT -p tcp --dport %d -j ACCEPT' % (port, port)
+			 for port in [5001] + list(ports)]
+	return '; '.join(rules + ['iperf3 -sD -p %d' % port for port in ports])
+
+def listenerCommand(ports, udp=False):
+	if udp:
+		return '; '.join("ss -lun 'sport = :%d' | grep -q UNCONN || exit 1" % port for port in ports)
+	return '; '.join("ss -ltn 'sport = :%d' | grep -q LISTEN || exit 1" % port for port in ports)
+
+def serverPorts(hosts, port=IPERF_PORT):
+	"""
+	Ports to open on every server host, in first appearance order
+	:return: list of (host, list of ports)
+	"""
+	ports = {}
+	order = []
+	for host, flowPort in zip(hosts, flowPorts(hosts, port)):
+		if host not in ports:
+			ports[host] = []
+			order.append(host)
+		ports[host].append(flowPort)
+	return [(host, ports[host]) for host in order]
+
+def waitForListeners(hostPorts, deadline=30, udp=False):
+	"""
+	Probe the IPERF ports of all the hosts concurrently until they all listen
+	:param hostPorts: list of (host, list of ports)
+	:param deadline: maximum time to wait, in seconds
+	:param udp: probe bound UDP ports instead of listening TCP ports
+	:return: list of hosts that are still not listening
+	"""
+	deadline = time.time() + deadline
+	pending = list(hostPorts)
+
+	while pending:
+		popens = [(host, ports, host.popen(listenerCommand(ports, udp), shell=True)) for host, ports in pending]
+		pending = [(host, ports) for host, ports, popen in popens if popen.wait() != 0]
+		if not pending or time.time() >= deadline:
+			break
+		time.sleep(POLL_INTERVAL)
+
+	return [host for host, ports in pending]
+
+def startIperfServers(hosts, port=IPERF_PORT, deadline=30):
+	"""
+	Start IPERF server daemons on all the hosts in parallel
+	:param hosts: server of every flow; a host listed n times gets n servers
+	:param port: first IPERF port
+	:param deadline: maximum time to wait for the listeners, in seconds
+	:return: True if every server is listening
+	"""
+	start = time.time()
+	hostPorts = serverPorts(hosts, port)
+
+	popens = [host.popen(serverCommand(ports), shell=True) for host, ports in hostPorts]
+	for popen in popens:
+		popen.wait()
+
+	missing = waitForListeners(hostPorts, deadline)
+	servers = sum(len(ports) for host, ports in hostPorts)
+	if missing:
+		logger.info( ">>> IPERF servers not listening on %d of %d hosts after %.1f seconds: %s" %
+					 (len(missing), len(hostPorts), time.time() - start, " ".join(str(host) for host in missing[:10])) )
+	else:
+		logger.info( ">>> %d IPERF servers up on %d hosts in %.1f seconds" % (servers, len(hostPorts), time.time() - start) )
+
+	return not missing
+
+def stopIperfServers(net):
+	"""
+	Stop every IPERF server; Mininet hosts share the PID namespace, so one
+	killall from any node is enough
+	"""
+	node = net.hosts[0] if net.hosts else None
+	if node is not None:
+		node.cmd('killall -q iperf3; while pgrep -x iperf3 > /dev/null; do sleep 0.1; done')
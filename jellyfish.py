@@ -3,7 +3,8 @@ jellyfish.py: script to run Jellyfish topology test
 
 The tests performed are packet delay (ping), throughput (IPERF-TCP), jitter and packet loss (IPERF-UDP)
 
-OVSBridgeSTP: STP-Enabled OVS switch class
+OVSBridgeSTP: STP-Enabled OVS switch class (startup.py)
+JellyfishTopo: Jellyfish topology class for mininet
 
 @author Victor Mehmeri (vime@fotonik.dtu.dk)
 """
@@ -14,15 +15,33 @@ from mininet.cli import CLI
 from mininet.log import setLogLevel, info
 from mininet.link import Link, Intf, TCLink
 from mininet.topo import Topo
-from mininet.util import dumpNodeConnections, pmonitor
-from ripl.ripl.dctopo import JellyfishTopo
-from signal import SIGINT
+from mininet.util import dumpNodeConnections, pmonitor, custom
 import time
 import sys
 import random
 import logging
 import os 
 import argparse
+import readiness
+import results
+import traffic
+import layout
+import iperfservers
+import scheduler
+import monitor
+import startup
+import cpuplan
+import capacity
+import health
+import linkstats
+import fct
+import probe
+import minictl
+import failure
+import knee
+from startup import OVSBridgeSTP
+import matrix
+import proactive
  
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger( __name__ )
@@ -40,84 +59,192 @@ parser.add_argument('-r', type=int, nargs='?',
 				   help='Number of test runs')
 parser.add_argument('--controller', action='store_true',
 				   help='use SDN controller')
+parser.add_argument('--proactive', action='store_true',
+				   help='install k-shortest-path flows directly into the switches, without controller or STP')
+parser.add_argument('--paths', type=int, nargs='?',
+				   help='Number of shortest paths per pair of the proactive mode')
+parser.add_argument('--local-controller', type=str, nargs='?', const='ecmp', choices=minictl.MODES,
+				   help='use the bundled OpenFlow controller (default ecmp) and benchmark its flow setup')
 parser.add_argument('--ip', type=str, nargs='?',
 				   help='Controller IP address')
 parser.add_argument('--port', type=int, nargs='?',
 				   help='Controller Port')
+parser.add_argument('--wait', type=int, nargs='?',
+				   help='Maximum time to wait for the network to become ready (seconds)')
+parser.add_argument('--seed', type=int, nargs='?',
+				   help='Random seed of the topology and of the server/client pairs')
+parser.add_argument('--graph', type=str, nargs='?',
+				   help='Load the switch graph exported by --export instead of building a new one')
+parser.add_argument('--expand', type=int, nargs='?',
+				   help='Add this many switches to the graph by link swaps')
+parser.add_argument('--expand-hosts', type=int, nargs='?',
+				   help='Number of hosts on the switches added by --expand')
+parser.add_argument('--export', type=str, nargs='?',
+				   help='Write the switch graph as JSON for offline analysis or later expansion')
+parser.add_argument('--ramp', type=str, nargs='?', choices=scheduler.RAMPS,
+				   help='How the IPERF flows start: simultaneous, staggered or poisson')
+parser.add_argument('--ramp-interval', type=float, nargs='?',
+				   help='Stagger interval or mean Poisson gap between flow starts (seconds)')
+parser.add_argument('--cpu-policy', type=str, nargs='?', choices=cpuplan.POLICIES,
+				   help='What to do when the test needs more CPU than the machine has: scale the link rate down, dilate time (link rates divided, '
+						'delays and durations multiplied by a factor chosen from the measured capacity), refuse, or off')
+parser.add_argument('--cores', type=int, nargs='?',
+				   help='Number of CPU cores to plan for (default: all the available ones)')
+parser.add_argument('--unshaped', action='store_true',
+				   help='Leave the links unshaped (plain veth pairs) instead of shaping them at the planned link rate')
+parser.add_argument('--fct', type=str, nargs='?', choices=sorted(fct.WORKLOADS),
+				   help='Run an open-loop short flow workload with this flow size distribution and report flow completion times')
+parser.add_argument('--load', type=float, nargs='?',
+				   help='Offered load of every host in the short flow workload, as a fraction of its link rate (default 0.3)')
+parser.add_argument('--probe-rate', type=float, nargs='?',
+				   help='Latency probes per second of every pair, idle and alongside the load tests (default %d, 0 disables them)' % probe.PROBE_RATE)
+parser.add_argument('--fail', type=str, nargs='?', choices=failure.TARGETS,
+				   help='Take down the busiest switch-switch link, or a whole switch, in the middle of every TCP and UDP test and measure the recovery')
+parser.add_argument('--fail-at', type=float, nargs='?',
+				   help='Time of the failure, in seconds after the start of the test (default: half the test duration)')
+parser.add_argument('--udp-rates', type=float, nargs='+',
+				   help='Rates of the UDP test in Mbit/s, one pass per rate (default 5)')
+parser.add_argument('--knee', type=str, nargs='+', choices=traffic.PATTERNS,
+				   help='Search the saturation knee of these traffic patterns by bisection on the UDP rate instead of the fixed test sequence')
+parser.add_argument('--knee-loss', type=float, nargs='?',
+				   help='Loss in percent at which the knee search considers the network saturated (default %g)' % knee.LOSS_THRESHOLD)
+parser.add_argument('--knee-latency', type=float, nargs='?',
+				   help='p99 RTT in microseconds at which the knee search considers the network saturated (default: loss only)')
+parser.add_argument('--matrix', type=str, nargs='?',
+				   help='JSON experiment matrix to run on one network instead of the fixed test sequence')
 
 args = parser.parse_args()
 
-global IPERF_TEST_DURATION, kNUMBER, CONTROLLER, CONTROLLER_IP, CONTROLLER_PORT, FILE_PREFIX
+global IPERF_TEST_DURATION, kNUMBER, CONTROLLER, LOCAL_CONTROLLER, CONTROLLER_IP, CONTROLLER_PORT, FILE_PREFIX, READY_TIMEOUT, RAMP, RAMP_INTERVAL, SEED, MATRIX, FCT, FCT_LOAD, PROBE_RATE, FAIL, FAIL_AT, UDP_RATES, KNEE, KNEE_LOSS, KNEE_LATENCY, PROACTIVE, KSP_PATHS, LINK_BW, UNSHAPED, CPU_POLICY, CORES
 	
 #Set defaults
 CONTROLLER = 0
+LOCAL_CONTROLLER = None
+PROACTIVE = 0
+KSP_PATHS = 8
 CONTROLLER_IP = "127.0.0.1"
 CONTROLLER_PORT = 6633 
 FILE_PREFIX = "jf"
 IPERF_TEST_DURATION = 40
+READY_TIMEOUT = 300
+RAMP = 'simultaneous'
+RAMP_INTERVAL = 1.0
+#Extra time an IPERF flow gets beyond its duration (omitted intervals,
+#connection setup) before it is stopped
+FLOW_GRACE = 60
+SEED = None
+MATRIX = None
+FCT = None
+FCT_LOAD = 0.3
+PROBE_RATE = probe.PROBE_RATE
+FAIL = None
+FAIL_AT = None
+UDP_RATES = [5]
+KNEE = None
+KNEE_LOSS = knee.LOSS_THRESHOLD
+KNEE_LATENCY = None
+#Nominal link rate the CPU plan is made for; the links are shaped at the planned rate unless UNSHAPED
+LINK_BW = 1000
+UNSHAPED = False
+CPU_POLICY = 'scale'
+CORES = None
 
 
-class OVSBridgeSTP( OVSKernelSwitch ):
-    """Open vSwitch Ethernet bridge with Spanning Tree Protocol
-       rooted at the first bridge that is created"""
-    prio = 1000
-    def start( self, *args, **kwargs ):
-        OVSKernelSwitch.start( self, *args, **kwargs )
-        OVSBridgeSTP.prio += 1
-        self.cmd( 'ovs-vsctl set-fail-mode', self, 'standalone' )
-        self.cmd( 'ovs-vsctl set-controller', self )
-        self.cmd( 'ovs-vsctl set Bridge', self,
-                  'stp_enable=true',
-                  'other_config:stp-priority=%d' % OVSBridgeSTP.prio )
-
 switches = { 'ovs-stp': OVSBridgeSTP }
-            
-
-def monitorOutput(popens, duration):
-	endTime = time.time() + duration
-	for host, line in pmonitor( popens ):
-		if host:
-			logger.debug( "<%s>: %s" % ( host, line.strip() ) )
-		if time.time() >= endTime:
-			logger.debug("*** One or more connections timed out ***")
-			for p in popens.values():
-				p.send_signal( SIGINT )
-			break
-    	
+
+
+class JellyfishTopo(Topo):
+    """Jellyfish topology: random regular graph between the switches
+
+       The graph is a layout.JellyfishLayout; switch i is named s<i+1> and
+       host i is named h<i+1>"""
+
+    def __init__(self, nServers=16, nSwitches=16, nPorts=4, seed=None, graph=None, bw=None):
+        """
+        Instantiate Jellyfish topology
+        :param graph: layout.JellyfishLayout to use instead of building a new one
+        :param bw: link bandwidth in Mbit/s, unlimited by default
+        """
+        self.layout = graph if graph is not None else layout.JellyfishLayout(nServers, nSwitches, nPorts, seed)
+        self.bw = bw
+
+        #Init Topo
+        Topo.__init__(self)
+
+        linkopts = dict(bw=bw) if bw else {}
+        logger.debug("Creating %d switches and %d hosts" % (self.layout.switchNumber, len(self.layout.hostSwitch)))
+        self.switchList = [self.addSwitch('s%d' % (x + 1)) for x in range(0, self.layout.switchNumber)]
+        self.hostList = [self.addHost('h%d' % (x + 1)) for x in range(0, len(self.layout.hostSwitch))]
+        self.hostSet = set(self.hostList)
+
+        logger.debug("Creating links")
+        for a, b in self.layout.links():
+            self.addLink(self.switchList[a], self.switchList[b], **linkopts)
+        for host, switch in enumerate(self.layout.hostSwitches()):
+            self.addLink(self.hostList[host], self.switchList[switch], **linkopts)
+
+    def linkLayer(self, node1, node2):
+        """Layer of the link between two nodes: switch-switch or switch-host"""
+        return 'switch-host' if node1 in self.hostSet or node2 in self.hostSet else 'switch-switch'
+
+    def hosts(self, sort=True):
+        return self.hostList
+
+
 def startIperfServers(net, topo, servers):
 	#Start IPERF servers
 	logger.info( ">>> Starting IPERF servers..." )
-	for serverHostIndex in servers:
-		net.get(serverHostIndex).popen('iptables -A INPUT -p tcp --dport 5001 -j ACCEPT', shell=True)
-		net.get(serverHostIndex).popen('iptables -A INPUT -p tcp --dport 5201 -j ACCEPT', shell=True)
-		net.get(serverHostIndex).popen('iperf3 -sD', shell=True)
-		time.sleep(1)
-	time.sleep(60)
+	iperfservers.startIperfServers([net.get(serverHostIndex) for serverHostIndex in servers])
 
 def generateServerClientPairs(net, topo):
-	clients = []
-	servers = []
-	
+	return traffic.randomPairs(topo.hosts(), SEED)
+
+def patternFlows(net, topo, pattern):
+	"""
+	(client, server, relation) host flows of a traffic pattern for the experiment matrix;
+	Jellyfish has no pods, so the pod patterns are not available
+	"""
 	hosts = topo.hosts()
-	
-	while (len(hosts) > 1):
-		randomServer = random.choice(hosts)
-		randomClient = random.choice(hosts)
-		
-		while (randomClient == randomServer):
-			randomClient = random.choice(hosts)
-		
-		clients.append(randomClient) 
-		servers.append(randomServer)
-		hosts.remove(randomClient)
-		hosts.remove(randomServer)
-	
-	logger.debug( "Clients: " + " ".join(str(e) for e in clients) )
-	logger.debug( "Servers: " + " ".join(str(e) for e in servers) )
-	
-	return (servers, clients)
+	servers, clients = traffic.TrafficMatrix(len(hosts), seed=SEED).generate(pattern)
+	return [(net.get(hosts[client]), net.get(hosts[server]), '-') for server, client in zip(servers, clients)]
+
+def planCPU(graph):
+	"""
+	CPU plan of the tests, for the server/client pairs generateServerClientPairs draws
+	"""
+	hostCount = len(graph.hostSwitch)
+	servers, clients = traffic.randomPairs(list(range(0, hostCount)), SEED)
+	hops = cpuplan.meanHops(graph.switchNumber, graph.links(), graph.hostSwitches(), servers, clients)
+	flows = hostCount if MATRIX or FCT or KNEE else len(clients)
+	gbpsPerCore = capacity.measureGbpsPerCore() if CPU_POLICY == 'dilate' else cpuplan.GBPS_PER_CORE
+	return cpuplan.CPUPlan(hostCount, flows, LINK_BW, hops, CORES, policy=CPU_POLICY, gbpsPerCore=gbpsPerCore)
+
+def hostPairs(net, servers, clients):
+	"""
+	(client, server) host pairs used by the tests
+	"""
+	return [(net.get(clients[index]), net.get(servers[index])) for index in range(0, len(clients))]
  
 
+def latencyProbes(name, pairs, relation='-'):
+	"""
+	Latency probes of the (client, server) host pairs of a load test, running alongside it
+	"""
+	return probe.LatencyProbes('%s_latency' % name, [(client, server, relation) for client, server in pairs], PROBE_RATE, IPERF_TEST_DURATION)
+
+def failureTest(net, topo, name, pairs):
+	"""
+	Failure of the busiest switch-switch link, or of a switch without test hosts, while a load test runs
+	"""
+	return failure.FailureTest(net, topo.linkLayer, name, FAIL, 'switch-switch', pairs, FAIL_AT if FAIL_AT is not None else IPERF_TEST_DURATION / 2.0)
+
+def runLatencyTest(net, topo, servers, clients):
+	"""
+	Probe the latency distribution of the test pairs on the idle network
+	"""
+	logger.info( ">>> Starting latency probes on the idle network" )
+	latencyProbes('%s_idle' % FILE_PREFIX, hostPairs(net, servers, clients)).start().stop()
+
 def runPingTest(net, topo, servers, clients):
 	"""
 	Run PING test, for delay measurement,
@@ -136,21 +263,26 @@ def runPingTest(net, topo, servers, clients):
 	if args.r:
 		runs = args.r
 	
+	#Paths are set up by a reactive controller on the first packets, all the pairs at once
+	if not PROACTIVE:
+		readiness.waitForReachability(hostPairs(net, servers, clients), time.time() + 15)
+
 	for run in range(1, runs+1):
 		popens = {}
+		collector = results.FlowCollector('%s_ping_results_%d' % (FILE_PREFIX, run)).start()
 		
 		logger.info( ">>> Starting PING test..." )
 		for index in range(0, len(clients)):
 			clientHost = net.get(clients[index])
 			serverHost = net.get(servers[index])
 			logger.debug("[PING] %s --> %s" %(clientHost.IP(), serverHost.IP()))
-			#discard first ping
-			clientHost.popen('ping -q -n -c 1 %s' %(serverHost.IP()), shell=True).wait()
-			popens[index] = clientHost.popen('ping -q -n -c 8 %s >> results/%s_ping_results_%d 2>&1' %(serverHost.IP(), FILE_PREFIX, run), shell=True)
+			outFile = collector.flowFile(index, clientHost, serverHost, kind='ping')
+			popens[index] = clientHost.popen('ping -q -n -c 8 %s > %s 2>&1' %(serverHost.IP(), outFile), shell=True)
 					
 		logger.debug(">>> Waiting for PING test to finish...")
 		
-		monitorOutput(popens, 60)
+		monitor.monitorFlows(popens, 60)
+		collector.stop()
  
 def runTCPTest(net, topo, servers, clients):
 	"""
@@ -171,32 +303,31 @@ def runTCPTest(net, topo, servers, clients):
 		runs = args.r
 	
 	for run in range(1, runs+1):
-		popens = {}
+		flows = scheduler.FlowScheduler(RAMP, RAMP_INTERVAL)
+		collector = results.FlowCollector('%s_tcp_results_%d' % (FILE_PREFIX, run)).start()
 		
 		#First, ping everyone to add the flows/paths
-		for index in range(0, len(clients)):
-			clientHost = net.get(clients[index])
-			serverHost = net.get(servers[index])
-			clientHost.popen('ping -n -c 1 -W 10 %s ' %(serverHost.IP()), shell=True)
-		
-		time.sleep(15)
+		if not PROACTIVE:
+			readiness.waitForReachability(hostPairs(net, servers, clients), time.time() + 15)
 		
 		#Start IPERF TCP clients	
 		logger.info( ">>> Starting IPERF TCP Clients..." )
 		for index in range(0, len(clients)):
-			duration = IPERF_TEST_DURATION
-			#if IPERF tests start to fail, try uncommenting the following lines
-			#duration = IPERF_TEST_DURATION + len(clients) - index
-			#time.sleep(1)
 			clientHost = net.get(clients[index])
 			serverHost = net.get(servers[index])
 			logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-			popens[index] = clientHost.popen('iperf3 -O 10 -f k -i 10 -t %d -Z -c %s >> results/%s_tcp_results_%d 2>&1' %(duration, serverHost.IP(), FILE_PREFIX, run), shell=True)
-			
+			outFile = collector.flowFile(index, clientHost, serverHost)
+			flows.add(index, clientHost, 'iperf3 %s -O 10 -i 10 -t %d -Z -c %s > %s 2>&1' %(results.iperfJsonFlags(), IPERF_TEST_DURATION, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
+
+		pairs = hostPairs(net, servers, clients)
+		with latencyProbes(collector.name, pairs), failureTest(net, topo, collector.name, pairs):
+			popens = flows.launch()
 					
-		logger.debug(">>> Waiting for TCP test to finish...")
+			logger.debug(">>> Waiting for TCP test to finish...")
 		
-		monitorOutput(popens, 300)
+			monitor.monitorFlows(popens, flows.deadlines(IPERF_TEST_DURATION + FLOW_GRACE))
+		flows.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+		collector.stop()
 	
 	
 def runUDPTest(net, topo, servers, clients, bwList = [5]):
@@ -218,31 +349,30 @@ def runUDPTest(net, topo, servers, clients, bwList = [5]):
 		runs = args.r
 
 	for run in range(1, runs+1):
-		popens = {}
-
-		for index in range(0, len(clients)):
-			clientHost = net.get(clients[index])
-			serverHost = net.get(servers[index])
-			clientHost.popen('ping -n -c 1 %s -W 5' %(serverHost.IP()), shell=True)
-
-		time.sleep(5)
+		if not PROACTIVE:
+			readiness.waitForReachability(hostPairs(net, servers, clients), time.time() + 5)
 
 		for bw in bwList:
 			#Start IPERF UDP clients
 			logger.info( ">>> Starting IPERF UDP Clients..." )
+			flows = scheduler.FlowScheduler(RAMP, RAMP_INTERVAL)
+			collector = results.FlowCollector('%s_udp_results_%.1fM_%d' % (FILE_PREFIX, bw, run)).start()
 			for index in range(0, len(clients)):
-				#duration = IPERF_TEST_DURATION
-				#if IPERF tests start to fail, try uncommenting the following lines
-				duration = IPERF_TEST_DURATION + len(clients) - index
 				clientHost = net.get(clients[index])
 				serverHost = net.get(servers[index])
 				logger.debug("%s --> %s" %(clientHost.IP(), serverHost.IP()))
-				popens[index] = clientHost.popen('iperf3 -O 10 -f k -u -b %.1fM -i 10 -t %d -Z -c %s >> results/%s_udp_results_%.1fM_%d 2>&1' %(bw, duration, serverHost.IP(), FILE_PREFIX, bw, run), shell=True)
-				time.sleep(1)
+				outFile = collector.flowFile(index, clientHost, serverHost)
+				flows.add(index, clientHost, 'iperf3 %s -O 10 -u -b %gM -i 10 -t %d -Z -c %s > %s 2>&1' %(results.iperfJsonFlags(), results.emulatedMbps(bw), IPERF_TEST_DURATION, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
 
-			logger.debug(">>> Waiting for UDP test to finish...")
+			pairs = hostPairs(net, servers, clients)
+			with latencyProbes(collector.name, pairs), failureTest(net, topo, collector.name, pairs):
+				popens = flows.launch()
 
-			monitorOutput(popens, 12000)
+				logger.debug(">>> Waiting for UDP test to finish...")
+
+				monitor.monitorFlows(popens, flows.deadlines(IPERF_TEST_DURATION + FLOW_GRACE))
+			flows.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+			collector.stop()
 		
 		
 
@@ -251,38 +381,94 @@ def netTest(net):
     net.pingAll()
  
 def run():
+	global IPERF_TEST_DURATION, FAIL_AT
 	logging.debug("Creating Jellyfish Topology")
 	
-	if (args.H and args.s and args.p):
-		topo = JellyfishTopo(args.H, args.s, args.p)
+	if args.graph:
+		graph = layout.JellyfishLayout.load(args.graph, SEED)
+	elif (args.H and args.s and args.p):
+		graph = layout.JellyfishLayout(args.H, args.s, args.p, SEED)
 	elif args.H and args.p:
-		topo = JellyfishTopo(args.H, args.H, args.p)
+		graph = layout.JellyfishLayout(args.H, args.H, args.p, SEED)
 	else:
-		topo = JellyfishTopo() #run with defaults
+		graph = layout.JellyfishLayout(16, 16, 4, SEED) #run with defaults
+
+	if args.expand:
+		graph.expand(args.expand, args.expand_hosts or 0)
+
+	if args.export:
+		graph.save(args.export)
+
+	plan = planCPU(graph)
+	logger.info( ">>> " + plan.summary() )
+	hostClass = CPULimitedHost if CPU_POLICY == 'off' else custom(CPULimitedHost, cpu=plan.hostFraction())
+
+	#A time dilated emulation runs the tests longer, the results are converted back to nominal units
+	results.DILATION = plan.dilation
+	IPERF_TEST_DURATION = plan.dilate(IPERF_TEST_DURATION)
+	if FAIL_AT is not None:
+		FAIL_AT = plan.dilate(FAIL_AT)
+
+	topo = JellyfishTopo(graph=graph, bw=None if UNSHAPED else plan.linkMbps)
 	
+	#The local controller listens before the switches try to connect
+	controller = minictl.MiniController(CONTROLLER_PORT, LOCAL_CONTROLLER).start() if LOCAL_CONTROLLER else None
+
 	if CONTROLLER:
-		net = Mininet(topo=topo, link=TCLink, host=CPULimitedHost, controller=None)
+		net = startup.FastMininet(topo=topo, link=TCLink, host=hostClass, controller=None)
 		net.addController('controller',controller=RemoteController,ip=CONTROLLER_IP,port=CONTROLLER_PORT)
 		logging.debug( 	">>> Connecting to controller at %s:%s" % (CONTROLLER_IP, CONTROLLER_PORT) )
+	elif PROACTIVE:
+		net = startup.FastMininet(topo=topo, link=TCLink, host=hostClass, controller=None)
+		logging.debug( ">>> Using proactive %d-shortest-path flows" % KSP_PATHS )
 	else:
-		net = Mininet(switch=OVSBridgeSTP, topo=topo, host=CPULimitedHost, link=TCLink, controller=None)
+		net = startup.FastMininet(switch=OVSBridgeSTP, topo=topo, host=hostClass, link=TCLink, controller=None)
 		logging.debug( ">>> Using Spanning Tree Protocol" )
  
 	net.start()
+	if CPU_POLICY != 'off':
+		cpuplan.pinHosts(net.hosts, plan)
+
+	if controller:
+		controller.setTopology(minictl.Topology.fromNet(net))
+		net.staticArp()
 	servers, clients = generateServerClientPairs(net, topo)
+
+	if PROACTIVE:
+		proactive.installPaths(net, topo, servers, clients, KSP_PATHS, SEED)
 	
 	#netTest(net)
 	
-	#allow some time for the controller to initialize all the links
-	time.sleep(300)
+	#wait until STP converged / the controller initialized all the links
+	readiness.waitForNetwork(net, hostPairs(net, servers, clients), READY_TIMEOUT,
+							 stp=not (CONTROLLER or PROACTIVE), controller=CONTROLLER)
+
+	if controller:
+		minictl.flowSetupTest(net, controller, hostPairs(net, servers, clients), FILE_PREFIX)
 	
-	runPingTest(net, topo, servers, clients)
-	startIperfServers(net, topo, servers)
-	runTCPTest(net, topo, servers, clients)
-	runUDPTest(net, topo, servers, clients)
+	#CPU, softirq and datapath counters of the machine and the link counters during every test
+	with health.HealthSampler(FILE_PREFIX), linkstats.LinkPoller(net, topo.linkLayer, FILE_PREFIX):
+		if MATRIX:
+			matrix.runMatrix(net, matrix.ExperimentMatrix.load(MATRIX), lambda pattern: patternFlows(net, topo, pattern),
+							 FILE_PREFIX, flushFlows=CONTROLLER, ramp=RAMP, interval=RAMP_INTERVAL, grace=FLOW_GRACE)
+		elif KNEE:
+			#The knee search runs at nominal rates: the planned link rate before time dilation
+			knee.runKneeSearch(net, KNEE, lambda pattern: patternFlows(net, topo, pattern), FILE_PREFIX, plan.linkMbps * plan.dilation, KNEE_LOSS, KNEE_LATENCY,
+							   IPERF_TEST_DURATION, PROBE_RATE, flushFlows=CONTROLLER, ramp=RAMP, interval=RAMP_INTERVAL, grace=FLOW_GRACE)
+		elif FCT:
+			fct.runWorkload('%s_fct_%s_%g' % (FILE_PREFIX, FCT, FCT_LOAD), [net.get(host) for host in topo.hosts()], FCT, FCT_LOAD,
+							plan.linkMbps, IPERF_TEST_DURATION, SEED, grace=FLOW_GRACE)
+		else:
+			runPingTest(net, topo, servers, clients)
+			runLatencyTest(net, topo, servers, clients)
+			startIperfServers(net, topo, servers)
+			runTCPTest(net, topo, servers, clients)
+			runUDPTest(net, topo, servers, clients, UDP_RATES)
  
 	#CLI(net)
 	net.stop()
+	if controller:
+		controller.stop()
 
 def cleanUp():
 	os.system("mn -c")
@@ -293,19 +479,87 @@ if __name__ == '__main__':
 	
 	if args.d:
 		IPERF_TEST_DURATION = args.d
+
+	if args.wait:
+		READY_TIMEOUT = args.wait
+
+	SEED = args.seed if args.seed is not None else traffic.newSeed()
+	logger.info( ">> Topology and server/client pairs seed: %d" % SEED )
+
+	if args.ramp:
+		RAMP = args.ramp
+
+	if args.ramp_interval:
+		RAMP_INTERVAL = args.ramp_interval
+
+	if args.matrix:
+		MATRIX = args.matrix
+
+	if args.fct:
+		FCT = args.fct
+
+	if args.fail:
+		FAIL = args.fail
+
+	if args.udp_rates:
+		UDP_RATES = args.udp_rates
+
+	if args.knee:
+		KNEE = args.knee
+
+	if args.knee_loss is not None:
+		KNEE_LOSS = args.knee_loss
+
+	if args.knee_latency is not None:
+		KNEE_LATENCY = args.knee_latency
+
+	if args.fail_at is not None:
+		FAIL_AT = args.fail_at
+
+	if args.probe_rate is not None:
+		PROBE_RATE = args.probe_rate
+
+	if args.load:
+		FCT_LOAD = args.load
+
+	if args.cpu_policy:
+		CPU_POLICY = args.cpu_policy
+
+	if args.cores:
+		CORES = args.cores
+
+	if args.unshaped:
+		UNSHAPED = True
 		
-	if args.controller:
+	if args.local_controller:
+		LOCAL_CONTROLLER = args.local_controller
+		CONTROLLER = 1
+		FILE_PREFIX = "%s_mc%s" % (FILE_PREFIX, LOCAL_CONTROLLER)
+		if args.port:
+			CONTROLLER_PORT = args.port
+	elif args.controller:
 		CONTROLLER = 1
 		FILE_PREFIX = "%s_sdn" % FILE_PREFIX
 		if args.ip:
 			CONTROLLER_IP = args.ip
 		if args.port:
 			CONTROLLER_PORT = args.port
+	elif args.proactive:
+		PROACTIVE = 1
+		if args.paths:
+			KSP_PATHS = args.paths
+		FILE_PREFIX = "%s_ksp%d" % (FILE_PREFIX, KSP_PATHS)
 	else:
 		FILE_PREFIX = "%s_stp" % FILE_PREFIX
 
 	if args.H:
 		FILE_PREFIX = "%s_%d" % (FILE_PREFIX, args.H)
+
+	if FAIL:
+		FILE_PREFIX = "%s_fail%s" % (FILE_PREFIX, FAIL)
+
+	if UNSHAPED:
+		FILE_PREFIX = "%s_unshaped" % FILE_PREFIX
 	
 	logger.info( ">> Iniating Jellyfish topology test"  )
 	logger.info( ">> IPERF tests will run for %d seconds " % (IPERF_TEST_DURATION) )
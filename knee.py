@@ -0,0 +1,151 @@
+"""
+knee.py: saturation knee of a traffic pattern by bisection on the offered load
+
+Stepping through a grid of UDP rates spends most of the runs far below or
+far above the interesting point. The knee search runs the flows of a
+pattern at one per-flow rate, measures the loss (and, with the latency
+probes, the tail latency) and bisects between the highest rate that stayed
+under the thresholds and the lowest one that crossed them, until the two
+are within a resolution of the link rate. Every step is a normal experiment
+(results/<prefix>_knee_<pattern>_<rate>M.tsv and its latency table) run on
+the same started network, the state being reset between the steps as in
+the experiment matrix.
+
+Results:
+results/<prefix>_knee_steps.tsv: every measured step of every pattern
+results/<prefix>_knee.tsv: the knee of every pattern, per flow and in total
+
+The search runs in nominal units on a time dilated emulation: the rates,
+the thresholds and the knee are nominal, and only the IPERF target rates
+are converted to the dilated links (matrix.runIperfPass).
+
+A step crosses the thresholds when the mean loss of the flows is above the
+loss threshold, or when the median over the pairs of the p99 round trip
+time is above the latency threshold.
+"""
+
+import os
+import time
+import logging
+
+import results
+import probe
+import matrix
+import readiness
+import iperfservers
+
+logger = logging.getLogger( __name__ )
+
+#Mean loss of the flows, in percent, above which the network is saturated
+LOSS_THRESHOLD = 1.0
+
+#Search resolution, as a fraction of the highest rate
+RESOLUTION = 0.05
+
+#Measurements of a pattern at most
+MAX_STEPS = 8
+
+STEP_COLUMNS = ("pattern", "step", "rate_mbps", "loss_percent", "rtt_p99_us", "crossed")
+KNEE_COLUMNS = ("pattern", "flows", "knee_mbps", "crossed_mbps", "total_mbps", "loss_threshold", "latency_threshold_us", "steps")
+
+def bisect(measure, high, resolution=RESOLUTION, steps=MAX_STEPS):
+	"""
+	Highest rate in (0, high] that does not cross the thresholds
+	:param measure: function rate -> True when the rate crossed the thresholds
+	:return: (highest rate measured below the thresholds or 0, lowest rate
+			 measured above them or None, list of (rate, crossed))
+	"""
+	low, crossed = 0.0, None
+	history = []
+	rate = high
+	while len(history) < steps:
+		over = measure(rate)
+		history.append((rate, over))
+		if over:
+			crossed = rate
+		else:
+			low = rate
+		if crossed is None or crossed - low <= resolution * high:
+			break
+		rate = (low + crossed) / 2.0
+	return low, crossed, history
+
+def stepLoss(name):
+	"""
+	Mean loss in percent of the flows of a collected experiment, None without reports
+	"""
+	try:
+		rows = results.parseTable(os.path.join(results.RESULTS_DIR, "%s.tsv" % name))
+	except IOError:
+		return None
+	losses = [float(row["lost_percent"]) for row in rows if row.get("lost_percent") is not None]
+	return sum(losses) / len(losses) if losses else None
+
+def runKneeSearch(net, patterns, patternFlows, prefix, maxRate, lossThreshold=LOSS_THRESHOLD, latencyThreshold=None,
+				  duration=10, probeRate=probe.PROBE_RATE, flushFlows=False, ramp='simultaneous', interval=1.0, grace=60,
+				  resolution=RESOLUTION, steps=MAX_STEPS):
+	"""
+	Knee of every pattern on one started, converged network
+	:param patterns: traffic pattern names
+	:param patternFlows: function pattern -> list of (client host, server host, relation)
+	:param prefix: results file prefix
+	:param maxRate: highest per-flow UDP rate searched, in nominal Mbit/s (the link rate)
+	:param lossThreshold: mean loss of the flows, in percent
+	:param latencyThreshold: median pair p99 RTT in microseconds, None to search on the loss only
+	:param duration: IPERF duration of a step in seconds
+	:param flushFlows: delete the flow tables between steps (see matrix.resetRunState)
+	:return: list of knee rows
+	"""
+	if not os.path.isdir(results.RESULTS_DIR):
+		os.makedirs(results.RESULTS_DIR)
+	stepTable = open(os.path.join(results.RESULTS_DIR, "%s_knee_steps.tsv" % prefix), "w")
+	stepTable.write("\t".join(STEP_COLUMNS) + "\n")
+	p99 = probe.PAIR_COLUMNS.index("rtt_p99_us")
+	knees = []
+
+	try:
+		for pattern in patterns:
+			flows = patternFlows(pattern)
+			measured = []
+
+			def measure(rate):
+				name = "%s_knee_%s_%gM" % (prefix, pattern, rate)
+				logger.info( ">>> Knee search %s: %d flows at %g Mbit/s" % (pattern, len(flows), rate) )
+				matrix.resetRunState(net, flushFlows)
+				iperfservers.startIperfServers([server for client, server, relation in flows])
+				readiness.waitForReachability(list(set((client, server) for client, server, relation in flows)),
+											  time.time() + matrix.REACHABILITY_TIMEOUT)
+
+				probes = probe.LatencyProbes("%s_latency" % name, flows, probeRate, duration).start()
+				try:
+					matrix.runIperfPass(name, flows, duration, True, rate, ramp, interval, grace)
+				finally:
+					pairs = probes.stop()
+
+				loss = stepLoss(name)
+				tails = sorted(row[p99] for row in pairs if row[p99] is not None)
+				latency = results.percentile(tails, 50)
+				crossed = (loss is None or loss > lossThreshold or
+						   (latencyThreshold is not None and latency is not None and latency > latencyThreshold))
+				measured.append((rate, loss, latency, crossed))
+				stepTable.write("\t".join(results.field(value) for value in
+										  (pattern, len(measured), rate, loss, latency, int(crossed))) + "\n")
+				stepTable.flush()
+				return crossed
+
+			knee, crossed, history = bisect(measure, float(maxRate), resolution, steps)
+			knees.append((pattern, len(flows), knee, crossed, knee * len(flows), lossThreshold, latencyThreshold, len(history)))
+			if crossed is None:
+				logger.info( ">>> Knee of %s above %g Mbit/s per flow, the highest rate searched" % (pattern, knee) )
+			else:
+				logger.info( ">>> Knee of %s: %g Mbit/s per flow (%g Mbit/s in total), saturated at %g Mbit/s" %
+							 (pattern, knee, knee * len(flows), crossed) )
+	finally:
+		stepTable.close()
+		iperfservers.stopIperfServers(net)
+
+	with open(os.path.join(results.RESULTS_DIR, "%s_knee.tsv" % prefix), "w") as f:
+		f.write("\t".join(KNEE_COLUMNS) + "\n")
+		for row in knees:
+			f.write("\t".join(results.field(value) for value in row) + "\n")
+	return knees
@@ -0,0 +1,357 @@
+"""
+layout.py: switch-level link layout of the evaluated topologies
+
+Switches are numbered with plain integers so that the layouts can be used
+without Mininet, e.g. for the offline analysis in pathstats.py.
+
+FatTreeLayout: index arithmetic shared with FatTreeTopo. Switches are
+numbered core first, then aggregation and edge switches, host i is attached
+to edge switch i // (k/2).
+
+JellyfishLayout: random regular graph between the switches, host i is
+attached to switch i % nSwitches; the graph can be expanded and exported.
+"""
+
+import json
+import random
+import logging
+
+logger = logging.getLogger( __name__ )
+
+CORE, AGG, EDGE, HOST = range(0, 4)
+
+#Node names are the layer prefix followed by the 1-based index in the layer
+LAYER_PREFIX = ("1", "2", "3", "4")
+LAYER_NAMES = ("core", "agg", "edge", "host")
+
+class FatTreeLayout(object):
+	"""
+	Index arithmetic of a Fat Tree with kNUMBER pods
+
+	Every layer is a table indexed from 0. Aggregation and edge switch i sit
+	in pod i // (k/2) at position i % (k/2), host i hangs off edge switch
+	i // (k/2). Aggregation switch at position j is linked to core switches
+	j*(k/2) .. j*(k/2) + k/2 - 1.
+	"""
+
+	def __init__(self, kNUMBER=4):
+		if kNUMBER < 2 or kNUMBER % 2:
+			raise ValueError("Fat Tree needs an even number of pods, got %d" % kNUMBER)
+
+		self.kNUMBER = kNUMBER
+		self.half = kNUMBER // 2
+		self.coreNumber = self.half ** 2
+		self.aggNumber = self.half * kNUMBER
+		self.edgeNumber = self.half * kNUMBER
+		self.hostNumber = self.edgeNumber * self.half
+		self.sizes = (self.coreNumber, self.aggNumber, self.edgeNumber, self.hostNumber)
+
+		#Global switch numbering: core, then aggregation, then edge switches
+		self.offsets = (0, self.coreNumber, self.coreNumber + self.aggNumber)
+		self.switchNumber = self.coreNumber + self.aggNumber + self.edgeNumber
+
+		#Zero padded so that names stay unique within a layer of any size
+		self.widths = tuple(max(3, len(str(size))) for size in self.sizes)
+
+	def name(self, layer, index):
+		return "%s%0*d" % (LAYER_PREFIX[layer], self.widths[layer], index + 1)
+
+	def names(self, layer):
+		return [self.name(layer, index) for index in range(0, self.sizes[layer])]
+
+	def layer(self, name):
+		"""
+		Layer of a node from its name
+		"""
+		return LAYER_PREFIX.index(name[0])
+
+	def hostPod(self, host):
+		return host // (self.half * self.half)
+
+	def hostEdge(self, host):
+		return host // self.half
+
+	def switchPod(self, index):
+		"""
+		Pod of an aggregation or edge switch
+		"""
+		return index // self.half
+
+	def coreLinks(self):
+		"""
+		(aggregation, core) index pairs
+		"""
+		half = self.half
+		return [(agg, (agg % half) * half + x) for agg in range(0, self.aggNumber) for x in range(0, half)]
+
+	def podLinks(self):
+		"""
+		(aggregation, edge) index pairs
+		"""
+		half = self.half
+		return [(pod * half + x, pod * half + y) for pod in range(0, self.kNUMBER)
+				for x in range(0, half) for y in range(0, half)]
+
+	def hostLinks(self):
+		"""
+		(edge, host) index pairs
+		"""
+		return [(host // self.half, host) for host in range(0, self.hostNumber)]
+
+	def hostAddress(self, host):
+		"""
+		Two-level (Al-Fares) address of a host: 10.pod.edge.id, with the edge
+		switch position in its pod and id from 2 to k/2 + 1
+		"""
+		return "10.%d.%d.%d" % (self.hostPod(host), self.hostEdge(host) % self.half, host % self.half + 2)
+
+	def edgePrefix(self, edge):
+		"""
+		Prefix of the hosts of an edge switch
+		"""
+		return "10.%d.%d.0/24" % (self.switchPod(edge), edge % self.half)
+
+	def podPrefix(self, pod):
+		return "10.%d.0.0/16" % pod
+
+	#Port numbers, as assigned by Mininet when the links are added in the
+	#order above: switch ports start at 1, host ports at 0
+
+	def aggUpPort(self, core):
+		"""
+		Port of an aggregation switch towards core switch core
+		"""
+		return core % self.half + 1
+
+	def aggDownPort(self, edge):
+		"""
+		Port of an aggregation switch towards edge switch edge of its pod
+		"""
+		return self.half + edge % self.half + 1
+
+	def corePort(self, agg):
+		"""
+		Port of a core switch towards aggregation switch agg
+		"""
+		return self.switchPod(agg) + 1
+
+	def edgeUpPort(self, agg):
+		"""
+		Port of an edge switch towards aggregation switch agg of its pod
+		"""
+		return agg % self.half + 1
+
+	def edgeDownPort(self, host):
+		"""
+		Port of an edge switch towards host host
+		"""
+		return self.half + host % self.half + 1
+
+	def switchLinks(self):
+		"""
+		Switch-to-switch links in the global switch numbering
+		"""
+		aggOffset, edgeOffset = self.offsets[AGG], self.offsets[EDGE]
+		return ([(aggOffset + agg, core) for agg, core in self.coreLinks()] +
+				[(aggOffset + agg, edgeOffset + edge) for agg, edge in self.podLinks()])
+
+	def hostSwitches(self):
+		"""
+		Host index -> global switch number of its edge switch
+		"""
+		return [self.offsets[EDGE] + host // self.half for host in range(0, self.hostNumber)]
+
+def fatTreeLinks(kNUMBER):
+	"""
+	Switch-to-switch links of a Fat Tree
+	:param kNUMBER: number of pods
+	:return: (number of switches, list of (switch, switch) links, host -> switch list)
+	"""
+	fatTree = FatTreeLayout(kNUMBER)
+	return fatTree.switchNumber, fatTree.switchLinks(), fatTree.hostSwitches()
+
+def _discard(items, index, item):
+	#O(1) removal from a list, swapping in the last element
+	position = index.pop(item)
+	last = items.pop()
+	if last != item:
+		items[position] = last
+		index[last] = position
+
+class JellyfishLayout(object):
+	"""
+	Random regular graph between the switches of a Jellyfish topology, built
+	like in the Jellyfish paper: link random switches with free ports and, when
+	stuck, break an existing link to use the remaining ports. Every step is
+	O(1) expected, so thousands of switches take well under a second.
+
+	expand() grows the graph like the paper's incremental expansion: each new
+	switch breaks random existing links and connects to both of their ends,
+	the rest of the graph is kept.
+	"""
+
+	def __init__(self, nServers=0, nSwitches=0, nPorts=4, seed=None):
+		"""
+		:param nServers: number of hosts
+		:param nSwitches: number of switches
+		:param nPorts: number of ports per switch
+		:param seed: random seed
+		"""
+		self.nPorts = nPorts
+		self.seed = seed
+		self.rng = random.Random(seed)
+		self.switchNumber = 0
+		self.hostSwitch = []
+		self.freePorts = []
+		self.adjacency = []
+		self.edges = []
+		self.edgeIndex = {}
+		self.openSwitches = []
+		self.openIndex = {}
+
+		self.addSwitches(nSwitches, nServers)
+		self.connect()
+
+	def addSwitches(self, nSwitches, nServers=0):
+		"""
+		Add unconnected switches, with the new hosts spread round-robin on them
+		"""
+		first = self.switchNumber
+		if nServers and not nSwitches:
+			raise ValueError("New hosts need new switches")
+		self.switchNumber += nSwitches
+		self.freePorts.extend([self.nPorts] * nSwitches)
+		self.adjacency.extend(set() for _ in range(0, nSwitches))
+		for host in range(0, nServers):
+			switch = first + host % nSwitches
+			self.hostSwitch.append(switch)
+			self.freePorts[switch] -= 1
+		if nSwitches and min(self.freePorts[first:]) < 0:
+			raise ValueError("%d ports per switch are not enough for %d hosts on %d switches" % (self.nPorts, nServers, nSwitches))
+		for switch in range(first, self.switchNumber):
+			if self.freePorts[switch] > 0:
+				self.openIndex[switch] = len(self.openSwitches)
+				self.openSwitches.append(switch)
+
+	def link(self, a, b):
+		self.adjacency[a].add(b)
+		self.adjacency[b].add(a)
+		self.edgeIndex[(min(a, b), max(a, b))] = len(self.edges)
+		self.edges.append((min(a, b), max(a, b)))
+		for s in (a, b):
+			self.freePorts[s] -= 1
+			if self.freePorts[s] == 0:
+				_discard(self.openSwitches, self.openIndex, s)
+
+	def unlink(self, a, b):
+		self.adjacency[a].discard(b)
+		self.adjacency[b].discard(a)
+		_discard(self.edges, self.edgeIndex, (min(a, b), max(a, b)))
+		for s in (a, b):
+			if self.freePorts[s] == 0:
+				self.openIndex[s] = len(self.openSwitches)
+				self.openSwitches.append(s)
+			self.freePorts[s] += 1
+
+	def _randomPair(self):
+		openSwitches = self.openSwitches
+		for _ in range(0, 32):
+			a, b = self.rng.choice(openSwitches), self.rng.choice(openSwitches)
+			if a != b and b not in self.adjacency[a]:
+				return a, b
+		options = [(a, b) for i, a in enumerate(openSwitches) for b in openSwitches[i + 1:] if b not in self.adjacency[a]]
+		if options:
+			return self.rng.choice(options)
+		return None
+
+	def _splice(self, switch):
+		"""
+		Break a random link whose ends are not neighbours of switch and link
+		switch to both ends; False when no such link was found
+		"""
+		for _ in range(0, 32 * len(self.edges)):
+			a, b = self.rng.choice(self.edges)
+			if switch not in (a, b) and a not in self.adjacency[switch] and b not in self.adjacency[switch]:
+				self.unlink(a, b)
+				self.link(switch, a)
+				self.link(switch, b)
+				return True
+		return False
+
+	def connect(self):
+		"""
+		Use the free ports: link random pairs, splice links when stuck
+		"""
+		while len(self.openSwitches) > 0:
+			pair = self._randomPair() if len(self.openSwitches) > 1 else None
+			if pair:
+				self.link(*pair)
+				continue
+
+			#Stuck: a switch with at least two free ports takes over a random link
+			stuck = [s for s in self.openSwitches if self.freePorts[s] > 1]
+			if not stuck or not self.edges or not self._splice(stuck[0]):
+				break
+
+		if self.openSwitches:
+			logger.debug("%d switch ports left unconnected" % sum(self.freePorts[s] for s in self.openSwitches))
+
+	def expand(self, nSwitches, nServers=0):
+		"""
+		Add switches (and hosts) to the built graph by link swaps
+		:param nSwitches: number of new switches
+		:param nServers: number of new hosts, spread on the new switches
+		"""
+		first = self.switchNumber
+		self.addSwitches(nSwitches, nServers)
+		for switch in range(first, self.switchNumber):
+			while self.freePorts[switch] > 1 and self.edges and self._splice(switch):
+				pass
+		self.connect()
+
+	def links(self):
+		return sorted(self.edges)
+
+	def hostSwitches(self):
+		return list(self.hostSwitch)
+
+	def toDict(self):
+		return {"switches": self.switchNumber, "ports": self.nPorts, "seed": self.seed,
+				"links": [list(edge) for edge in self.links()], "hosts": self.hostSwitches()}
+
+	def save(self, path):
+		"""
+		Export the graph as JSON, for offline analysis or later expansion
+		"""
+		with open(path, "w") as f:
+			json.dump(self.toDict(), f)
+
+	@classmethod
+	def load(cls, path, seed=None):
+		"""
+		Graph exported by save(); seed drives any later expansion
+		"""
+		with open(path) as f:
+			graph = json.load(f)
+		jellyfish = cls(nPorts=graph["ports"], seed=seed)
+		jellyfish.addSwitches(graph["switches"])
+		for switch in graph["hosts"]:
+			jellyfish.hostSwitch.append(switch)
+			jellyfish.freePorts[switch] -= 1
+			if jellyfish.freePorts[switch] == 0:
+				_discard(jellyfish.openSwitches, jellyfish.openIndex, switch)
+		for a, b in graph["links"]:
+			jellyfish.link(a, b)
+		return jellyfish
+
+def jellyfishLinks(nServers, nSwitches, nPorts, seed=None):
+	"""
+	Switch-to-switch links of a Jellyfish topology
+	:param nServers: number of hosts
+	:param nSwitches: number of switches
+	:param nPorts: number of ports per switch
+	:param seed: random seed
+	:return: (number of switches, list of (switch, switch) links, host -> switch list)
+	"""
+	jellyfish = JellyfishLayout(nServers, nSwitches, nPorts, seed)
+	return jellyfish.switchNumber, jellyfish.links(), jellyfish.hostSwitches()
@@ -0,0 +1,270 @@
+"""
+linkstats.py: per-link utilization of the emulated fabric during the tests
+
+End to end IPERF throughput does not show where the traffic went. LinkPoller
+reads the byte and packet counters of the switch interfaces at a fixed
+interval, attributes every interface to its link and topology layer
+(core-agg, agg-edge, edge-host in the Fat Tree, switch-switch and
+switch-host in Jellyfish) and writes:
+
+results/<name>_links.tsv: rate and utilization of every link in both
+						  directions, forward being node1 -> node2 as the
+						  topology created the link
+results/<name>_layers.tsv: per-layer timeline (busy links, mean and maximum
+						   utilization, total rate)
+results/<name>_hotspots.tsv: per test phase and layer, the busiest link and
+							 the imbalance between the links; STP shows as a
+							 few hot links next to idle ones, ECMP as an even
+							 spread
+
+All the interfaces are read from one /proc/net/dev read per sample, the
+same counters as /sys/class/net/<intf>/statistics without a file per
+counter. Only the switch side of a link is read, the host side lives in
+another network namespace. The test phases come from health.mark(). Rates
+and times of a time dilated emulation are reported in nominal units.
+
+LinkPoller: background poller of the link counters
+"""
+
+import os
+import time
+import threading
+import logging
+
+import health
+import results
+
+logger = logging.getLogger( __name__ )
+
+RESULTS_DIR = "results"
+
+#A link direction below this utilization (or rate, for unlimited links) is idle
+IDLE_UTILIZATION = 0.01
+IDLE_MBPS = 1.0
+
+#Links listed per phase and layer in the log
+HOTSPOTS = 3
+
+LINK_COLUMNS = ("time", "phase", "link", "layer", "forward_mbps", "reverse_mbps", "forward_pps", "reverse_pps", "utilization")
+LAYER_COLUMNS = ("time", "phase", "layer", "links", "busy_links", "mean_utilization", "max_utilization", "total_mbps")
+HOTSPOT_COLUMNS = ("phase", "layer", "links", "idle_links", "mean_mbps", "max_mbps", "max_link", "imbalance")
+
+def interfaceCounters(path="/proc/net/dev"):
+	"""
+	Byte and packet counters of every interface of the root namespace
+	:return: dict interface -> (rx_bytes, rx_packets, tx_bytes, tx_packets)
+	"""
+	counters = {}
+	try:
+		with open(path) as f:
+			lines = f.readlines()[2:]
+	except IOError:
+		return counters
+	for line in lines:
+		name, _, data = line.partition(":")
+		fields = data.split()
+		if len(fields) >= 10:
+			counters[name.strip()] = (int(fields[0]), int(fields[1]), int(fields[8]), int(fields[9]))
+	return counters
+
+def isIdle(mbps, capacity):
+	"""
+	Whether a link direction at mbps is idle, capacity None for unlimited links
+	"""
+	if capacity:
+		return mbps / capacity <= IDLE_UTILIZATION
+	return mbps <= IDLE_MBPS
+
+class MeasuredLink(object):
+	"""
+	A link of the network and the switch interface its counters are read from
+	"""
+
+	def __init__(self, name, layer, intf, reverse, mbps):
+		"""
+		:param intf: name of the measured (switch) interface
+		:param reverse: True when the measured interface is on node2, so that
+						its transmit counters are the reverse direction
+		:param mbps: link capacity, None for unlimited links
+		"""
+		self.name = name
+		self.layer = layer
+		self.intf = intf
+		self.reverse = reverse
+		self.mbps = mbps
+
+def measuredLinks(net, linkLayer):
+	"""
+	Attribute the links of a network to the topology layers
+	:param net: mininet network
+	:param linkLayer: function (node1 name, node2 name) -> layer name
+	:return: list of MeasuredLink, links without a switch are left out
+	"""
+	switches = set(switch.name for switch in net.switches)
+	links = []
+	for link in net.links:
+		intf1, intf2 = link.intf1, link.intf2
+		node1, node2 = intf1.node.name, intf2.node.name
+		if node1 in switches:
+			intf, reverse = intf1, False
+		elif node2 in switches:
+			intf, reverse = intf2, True
+		else:
+			continue
+		links.append(MeasuredLink("%s-%s" % (node1, node2), linkLayer(node1, node2), intf.name, reverse,
+								  results.nominalMbps(intf.params.get('bw'))))
+	return links
+
+class _Layer(object):
+
+	def __init__(self):
+		self.samples = 0
+		self.links = {}
+
+class LinkPoller(object):
+	"""
+	Polls the counters of the links of a network in a background thread
+	"""
+
+	def __init__(self, net, linkLayer, name, interval=1.0, directory=RESULTS_DIR):
+		"""
+		:param net: started mininet network
+		:param linkLayer: function (node1 name, node2 name) -> layer name, e.g.
+						  FatTreeTopo.linkLayer
+		:param name: name of the test run, e.g. ft_stp_k4
+		:param interval: polling interval in seconds
+		:param directory: base results directory
+		"""
+		self.name = name
+		self.interval = interval
+		self.links = measuredLinks(net, linkLayer)
+		self.linkPath = os.path.join(directory, "%s_links.tsv" % name)
+		self.layerPath = os.path.join(directory, "%s_layers.tsv" % name)
+		self.hotspotPath = os.path.join(directory, "%s_hotspots.tsv" % name)
+		self.lock = threading.Lock()
+		self.stopped = threading.Event()
+		self.thread = None
+		self.started = None
+		self.last = None
+		self.phase = health.IDLE
+		#(phase, dict layer -> _Layer) in the order the phases ran
+		self.phases = []
+		self.linkTable = None
+		self.layerTable = None
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def start(self):
+		self.linkTable = open(self.linkPath, "w")
+		self.linkTable.write("\t".join(LINK_COLUMNS) + "\n")
+		self.layerTable = open(self.layerPath, "w")
+		self.layerTable.write("\t".join(LAYER_COLUMNS) + "\n")
+		self.started = time.time()
+		self.phases = [(self.phase, {})]
+		self.last = (self.started, interfaceCounters())
+		self.thread = threading.Thread(target=self._run, name="linkstats-%s" % self.name)
+		self.thread.daemon = True
+		self.thread.start()
+		health.register(self)
+		logger.debug("Polling %d links every %.1f seconds" % (len(self.links), self.interval))
+		return self
+
+	def stop(self):
+		"""
+		Take a last sample, close the timelines and write the hotspot report
+		"""
+		health.unregister(self)
+		self.stopped.set()
+		if self.thread:
+			self.thread.join()
+		self._sample()
+		self.linkTable.close()
+		self.layerTable.close()
+		self._writeHotspots()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def mark(self, phase=None):
+		"""
+		Start a new test phase, see health.mark
+		"""
+		self._sample()
+		with self.lock:
+			self.phase = phase or health.IDLE
+			self.phases.append((self.phase, {}))
+
+	def _run(self):
+		while not self.stopped.wait(self.interval):
+			self._sample()
+
+	def _sample(self):
+		with self.lock:
+			if self.last is None:
+				return
+			now, counters = time.time(), interfaceCounters()
+			before, lastCounters = self.last
+			self.last = (now, counters)
+			seconds = results.nominalTime(now - before)
+			if seconds <= 0:
+				return
+			stamp = "%.3f" % results.nominalTime(now - self.started)
+			layers = self.phases[-1][1]
+			timeline = {}
+
+			for link in self.links:
+				if link.intf not in counters or link.intf not in lastCounters:
+					continue
+				rxBytes, rxPackets, txBytes, txPackets = [max(0, a - b) for a, b in zip(counters[link.intf], lastCounters[link.intf])]
+				forward, reverse = (rxBytes, txBytes) if link.reverse else (txBytes, rxBytes)
+				forwardPackets, reversePackets = (rxPackets, txPackets) if link.reverse else (txPackets, rxPackets)
+				forwardMbps = forward * 8 / (seconds * 1e6)
+				reverseMbps = reverse * 8 / (seconds * 1e6)
+				utilization = max(forwardMbps, reverseMbps) / link.mbps if link.mbps else None
+				self.linkTable.write("%s\t%s\t%s\t%s\t%.3f\t%.3f\t%.0f\t%.0f\t%s\n" %
+									 (stamp, self.phase, link.name, link.layer, forwardMbps, reverseMbps,
+									  forwardPackets / seconds, reversePackets / seconds,
+									  "%.4f" % utilization if utilization is not None else "-"))
+
+				layer = layers.setdefault(link.layer, _Layer())
+				layer.links[link.name] = layer.links.get(link.name, 0.0) + max(forwardMbps, reverseMbps)
+				timeline.setdefault(link.layer, []).append((max(forwardMbps, reverseMbps), utilization, link.mbps))
+
+			for name in sorted(timeline):
+				rates = timeline[name]
+				layers[name].samples += 1
+				utilizations = [utilization for mbps, utilization, capacity in rates if utilization is not None]
+				busy = [mbps for mbps, utilization, capacity in rates if not isIdle(mbps, capacity)]
+				self.layerTable.write("%s\t%s\t%s\t%d\t%d\t%s\t%s\t%.3f\n" %
+									  (stamp, self.phase, name, len(rates), len(busy),
+									   "%.4f" % (sum(utilizations) / len(utilizations)) if utilizations else "-",
+									   "%.4f" % max(utilizations) if utilizations else "-",
+									   sum(rate[0] for rate in rates)))
+			self.linkTable.flush()
+			self.layerTable.flush()
+
+	def _writeHotspots(self):
+		capacity = dict((link.name, link.mbps) for link in self.links)
+		with open(self.hotspotPath, "w") as f:
+			f.write("\t".join(HOTSPOT_COLUMNS) + "\n")
+			for phase, layers in self.phases:
+				for name in sorted(layers):
+					layer = layers[name]
+					if not layer.samples:
+						continue
+					means = dict((link, mbps / layer.samples) for link, mbps in layer.links.items())
+					ranked = sorted(means, key=means.get, reverse=True)
+					idle = [link for link in ranked if isIdle(means[link], capacity[link])]
+					mean = sum(means.values()) / len(means)
+					f.write("%s\t%s\t%d\t%d\t%.3f\t%.3f\t%s\t%s\n" %
+							(phase, name, len(means), len(idle), mean, means[ranked[0]], ranked[0],
+							 "%.2f" % (means[ranked[0]] / mean) if mean > 0 else "-"))
+					if phase != health.IDLE and mean > 0:
+						logger.info( ">>> %s %s: %d of %d links idle, hottest %s" %
+									 (phase, name, len(idle), len(means),
+									  ", ".join("%s %.1f Mbit/s" % (link, means[link]) for link in ranked[:HOTSPOTS])) )
+		logger.debug("Link hotspots written to %s" % self.hotspotPath)
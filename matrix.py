@@ -0,0 +1,175 @@
+"""
+matrix.py: experiment matrix run on a single started network
+
+Building a topology and waiting for STP or the controller to converge takes
+far longer than most of the tests, so the whole matrix of a spec file is run
+on one network. Between two cells only the per-run state is reset: IPERF
+servers, iptables counters, and the MAC learning tables (STP) or the flow
+tables (controller); the network itself is never rebuilt.
+
+Spec file (JSON), every key optional:
+	{"bwLimit": [100, 1000], "udpRates": [5, 10], "patterns": ["intrapod", "interpod"],
+	 "durations": [40], "repetitions": 3}
+
+bwLimit: TCP cells, one per limit in Mbit/s (0 runs TCP unpaced)
+udpRates: UDP cells, one per rate in Mbit/s
+patterns: traffic patterns of traffic.py
+durations: IPERF durations in seconds
+repetitions: number of times every cell is run
+
+ExperimentMatrix: cells of a spec, in run order
+"""
+
+import os
+import json
+import time
+import itertools
+import logging
+
+import readiness
+import results
+import iperfservers
+import scheduler
+import monitor
+
+logger = logging.getLogger( __name__ )
+
+#Time allowed for the pairs of a cell to reach each other after the reset
+REACHABILITY_TIMEOUT = 15
+
+class ExperimentMatrix(object):
+	"""
+	Cartesian product of the test parameters
+	"""
+
+	def __init__(self, bwLimit=None, udpRates=None, patterns=None, durations=None, repetitions=1):
+		"""
+		:param bwLimit: TCP bandwidth limits in Mbit/s, 0 for no limit
+		:param udpRates: UDP rates in Mbit/s
+		:param patterns: traffic pattern names
+		:param durations: IPERF durations in seconds
+		:param repetitions: runs of every cell
+		"""
+		self.bwLimit = list(bwLimit or [])
+		self.udpRates = list(udpRates or [])
+		self.patterns = list(patterns or ['pairs'])
+		self.durations = list(durations or [40])
+		self.repetitions = repetitions
+
+	@classmethod
+	def load(cls, path):
+		with open(path) as f:
+			spec = json.load(f)
+		unknown = set(spec) - set(['bwLimit', 'udpRates', 'patterns', 'durations', 'repetitions'])
+		if unknown:
+			raise ValueError("Unknown matrix keys in %s: %s" % (path, ", ".join(sorted(unknown))))
+		return cls(spec.get('bwLimit'), spec.get('udpRates'), spec.get('patterns'),
+				   spec.get('durations'), spec.get('repetitions', 1))
+
+	def cells(self):
+		"""
+		Cells in run order: repetitions outermost, so that an interrupted
+		matrix still has complete repetitions of every cell
+		:return: list of dicts with pattern, protocol, rate, duration, repetition
+		"""
+		rates = [('tcp', bw) for bw in self.bwLimit] + [('udp', rate) for rate in self.udpRates]
+		return [{"pattern": pattern, "protocol": protocol, "rate": rate, "duration": duration, "repetition": repetition}
+				for repetition, pattern, duration, (protocol, rate)
+				in itertools.product(range(1, self.repetitions + 1), self.patterns, self.durations, rates)]
+
+def cellName(prefix, cell):
+	rate = ('%gM' % cell["rate"]) if cell["rate"] else 'max'
+	return '%s_%s_%s_%s_%ds_%d' % (prefix, cell["protocol"], cell["pattern"], rate, cell["duration"], cell["repetition"])
+
+def resetRunState(net, flushFlows=False):
+	"""
+	Reset the per-run state of a started network
+	:param net: mininet network
+	:param flushFlows: delete the switch flow tables (reactive controller),
+					   otherwise only the MAC learning tables are flushed
+	"""
+	iperfservers.stopIperfServers(net)
+
+	if flushFlows:
+		command = 'ovs-ofctl del-flows %s'
+	else:
+		command = 'ovs-appctl fdb/flush %s > /dev/null'
+	if net.switches:
+		net.switches[0].cmd('; '.join(command % switch for switch in net.switches))
+
+	popens = [host.popen('iptables -Z', shell=True) for host in net.hosts]
+	for popen in popens:
+		popen.wait()
+
+def runIperfPass(name, flows, duration, udp=False, rate=None, ramp='simultaneous', interval=1.0, grace=60,
+				 port=iperfservers.IPERF_PORT):
+	"""
+	Run one set of concurrent IPERF flows against already started servers
+	:param name: experiment name of the results
+	:param flows: list of (client host, server host, relation)
+	:param duration: IPERF duration in seconds
+	:param udp: UDP instead of TCP
+	:param rate: nominal target rate in Mbit/s, None or 0 for unpaced TCP
+	:return: dict index -> monitor.FlowStatus
+	"""
+	flowScheduler = scheduler.FlowScheduler(ramp, interval)
+	collector = results.FlowCollector(name).start()
+	ports = iperfservers.flowPorts([server for client, server, relation in flows], port)
+
+	options = '-u -b %gM' % results.emulatedMbps(rate) if udp else ('-b %gM' % results.emulatedMbps(rate) if rate else '')
+	for index, ((clientHost, serverHost, relation), flowPort) in enumerate(zip(flows, ports)):
+		logger.debug("%s --> %s:%d" %(clientHost.IP(), serverHost.IP(), flowPort))
+		outFile = collector.flowFile(index, clientHost, serverHost, relation)
+		flowScheduler.add(index, clientHost, 'iperf3 %s -O 10 %s -i 10 -t %d -Z -p %d -c %s > %s 2>&1' %
+						  (results.iperfJsonFlags(), options, duration, flowPort, serverHost.IP(), outFile), collector.flowPath(index, 'start'))
+
+	popens = flowScheduler.launch()
+	statuses = monitor.monitorFlows(popens, flowScheduler.deadlines(duration + grace))
+	flowScheduler.writeOffsets(os.path.join(collector.flowDir, 'starts.tsv'))
+	collector.stop()
+	return statuses
+
+def runMatrix(net, matrix, patternFlows, prefix, flushFlows=False, ramp='simultaneous', interval=1.0, grace=60):
+	"""
+	Run every cell of an experiment matrix on one started, converged network
+	:param net: mininet network
+	:param matrix: ExperimentMatrix
+	:param patternFlows: function pattern -> list of (client host, server host, relation)
+	:param prefix: results file prefix
+	:param flushFlows: delete the flow tables between cells (see resetRunState)
+	"""
+	#Generate every pattern first, an unsupported pattern fails before any test ran
+	flows = dict((pattern, patternFlows(pattern)) for pattern in matrix.patterns)
+	cells = matrix.cells()
+	start = time.time()
+
+	if not os.path.isdir(results.RESULTS_DIR):
+		os.makedirs(results.RESULTS_DIR)
+	index = open(os.path.join(results.RESULTS_DIR, '%s_matrix.tsv' % prefix), 'w')
+	index.write("cell\tpattern\tprotocol\trate\tduration\trepetition\tflows\tstopped\tfailed\treachable\tseconds\n")
+
+	try:
+		for number, cell in enumerate(cells):
+			name = cellName(prefix, cell)
+			pairs = flows[cell["pattern"]]
+			logger.info( ">>> Matrix cell %d/%d: %s (%d flows)" % (number + 1, len(cells), name, len(pairs)) )
+			cellStart = time.time()
+
+			resetRunState(net, flushFlows)
+			iperfservers.startIperfServers([server for client, server, relation in pairs])
+			reachable = readiness.waitForReachability(list(set((client, server) for client, server, relation in pairs)),
+														time.time() + REACHABILITY_TIMEOUT)
+
+			statuses = runIperfPass(name, pairs, cell["duration"] * results.DILATION, cell["protocol"] == 'udp', cell["rate"], ramp, interval, grace)
+
+			stopped = sum(1 for status in statuses.values() if status.stopped)
+			failed = sum(1 for status in statuses.values() if status.returncode and not status.stopped)
+			index.write("%s\t%s\t%s\t%s\t%d\t%d\t%d\t%d\t%d\t%d\t%.1f\n" %
+						(name, cell["pattern"], cell["protocol"], cell["rate"] or '-', cell["duration"], cell["repetition"],
+						 len(pairs), stopped, failed, int(reachable), time.time() - cellStart))
+			index.flush()
+	finally:
+		index.close()
+		iperfservers.stopIperfServers(net)
+
+	logger.info( ">>> Experiment matrix of %d cells done in %.1f seconds" % (len(cells), time.time() - start) )
@@ -0,0 +1,655 @@
+"""
+minictl.py: minimal local OpenFlow 1.0 controller and flow setup benchmark
+
+MiniController takes the place of the external controller of --controller
+so that the cost of the controller can be told apart from the data plane.
+It is reactive and knows the topology: the switch graph and the port of
+every host are read from the started Mininet network and the hosts get
+static ARP entries, so no packet is ever flooded. The first packet of a
+flow reaches the controller, which picks one of the shortest paths to the
+switch of the destination and installs the flow on every switch of the
+path at once, the last hop first, before sending the packet on.
+When a link between switches goes down or comes back, all the flows are
+flushed and the next packets set up paths around it.
+
+Modes:
+l2: flows match the (source, destination) MAC pair; the pair is hashed
+	onto one of the equal-cost paths
+ecmp: flows match the IPv4 5-tuple, every TCP/UDP connection is hashed
+	  onto one of the equal-cost paths
+
+The controller measures itself: the time from every packet-in to its
+flow-mods, and the flow setup time until every switch of the path answered
+a barrier. flowSetupTest adds the first-packet RTT against the steady-state
+RTT of the test pairs, and the bench command measures the flow setups per
+second against emulated switches, like cbench:
+
+	python minictl.py bench --switches 16 --seconds 10 --mode throughput
+
+Topology: switch graph, switch ports and host locations
+MiniController: controller thread
+"""
+
+import sys
+import time
+import zlib
+import errno
+import select
+import socket
+import struct
+import logging
+import argparse
+import threading
+
+import results
+
+logger = logging.getLogger( __name__ )
+
+MODES = ('l2', 'ecmp')
+
+OFP_VERSION = 0x01
+OFPT_HELLO, OFPT_ERROR, OFPT_ECHO_REQUEST, OFPT_ECHO_REPLY = 0, 1, 2, 3
+OFPT_FEATURES_REQUEST, OFPT_FEATURES_REPLY = 5, 6
+OFPT_SET_CONFIG, OFPT_PACKET_IN, OFPT_PORT_STATUS = 9, 10, 12
+OFPT_PACKET_OUT, OFPT_FLOW_MOD = 13, 14
+OFPT_BARRIER_REQUEST, OFPT_BARRIER_REPLY = 18, 19
+
+HEADER = struct.Struct("!BBHI")
+FEATURES = struct.Struct("!QIB3xII")
+PORT = struct.Struct("!H6s16sIIIIII")
+PACKET_IN = struct.Struct("!IHHBx")
+MATCH = struct.Struct("!IH6s6sHBxHBB2xIIHH")
+FLOW_MOD = struct.Struct("!QHHHHIHH")
+PACKET_OUT = struct.Struct("!IHH")
+ACTION_OUTPUT = struct.Struct("!HHHH")
+
+OFPFW_IN_PORT, OFPFW_DL_VLAN, OFPFW_DL_SRC, OFPFW_DL_DST = 1 << 0, 1 << 1, 1 << 2, 1 << 3
+OFPFW_DL_TYPE, OFPFW_NW_PROTO, OFPFW_TP_SRC, OFPFW_TP_DST = 1 << 4, 1 << 5, 1 << 6, 1 << 7
+OFPFW_NW_SRC_MASK, OFPFW_NW_DST_MASK = 0x3f << 8, 0x3f << 14
+OFPFW_ALL = (1 << 22) - 1
+
+OFPFC_ADD, OFPFC_DELETE = 0, 3
+OFPPC_PORT_DOWN = 1
+OFPPS_LINK_DOWN = 1
+OFPP_NONE = 0xffff
+NO_BUFFER = 0xffffffff
+
+ETH_IP = 0x0800
+
+#Timeouts of the installed flows, in seconds
+IDLE_TIMEOUT = 30
+HARD_TIMEOUT = 0
+PRIORITY = 100
+
+#Bytes of a missed packet sent to the controller
+MISS_SEND_LEN = 128
+
+SETUP_COLUMNS = ("flow", "client", "server", "first_ms", "steady_ms", "setup_ms")
+
+def message(kind, body=b"", xid=0):
+	return HEADER.pack(OFP_VERSION, kind, HEADER.size + len(body), xid) + body
+
+def mac(address):
+	"""
+	Bytes of a MAC address string
+	"""
+	return bytes(bytearray(int(part, 16) for part in address.split(":")))
+
+class Topology(object):
+	"""
+	What the controller knows of the network: the links between the
+	switches with their ports, and the switch and port of every host MAC
+	"""
+
+	def __init__(self):
+		self.names = {}
+		self.ports = {}
+		self.hosts = {}
+		self.peers = {}
+		self.distances = {}
+
+	@classmethod
+	def fromNet(cls, net):
+		topology = cls()
+		switches = dict((switch.name, int(switch.dpid, 16)) for switch in net.switches)
+		for name, dpid in switches.items():
+			topology.names[dpid] = name
+			topology.ports.setdefault(dpid, {})
+		for link in net.links:
+			ends = [(intf.node, intf.node.ports[intf]) for intf in (link.intf1, link.intf2)]
+			(node1, port1), (node2, port2) = ends
+			if node1.name in switches and node2.name in switches:
+				topology.addLink(switches[node1.name], port1, switches[node2.name], port2)
+			for (node, port), (host, _) in ((ends[0], ends[1]), (ends[1], ends[0])):
+				if node.name in switches and host.name not in switches:
+					topology.addHost(mac(host.MAC()), switches[node.name], port)
+		return topology
+
+	def addLink(self, dpid1, port1, dpid2, port2):
+		self.ports.setdefault(dpid1, {})[dpid2] = port1
+		self.ports.setdefault(dpid2, {})[dpid1] = port2
+		self.peers[(dpid1, port1)] = (dpid2, port2)
+		self.peers[(dpid2, port2)] = (dpid1, port1)
+		self.distances = {}
+
+	def setPortState(self, dpid, port, up):
+		"""
+		Take the link of a switch port out of the paths, or put it back
+		:return: True when the paths changed
+		"""
+		if (dpid, port) not in self.peers:
+			return False
+		peer, peerPort = self.peers[(dpid, port)]
+		if up == (self.ports[dpid].get(peer) == port):
+			return False
+		if up:
+			self.ports[dpid][peer] = port
+			self.ports[peer][dpid] = peerPort
+		else:
+			self.ports[dpid].pop(peer, None)
+			self.ports[peer].pop(dpid, None)
+		self.distances = {}
+		return True
+
+	def addHost(self, address, dpid, port):
+		"""
+		:param address: MAC of the host as 6 bytes
+		"""
+		self.ports.setdefault(dpid, {})
+		self.hosts[address] = (dpid, port)
+
+	def distancesTo(self, dpid):
+		"""
+		Hop count of every switch to a switch, cached
+		"""
+		if dpid not in self.distances:
+			distance = {dpid: 0}
+			frontier = [dpid]
+			while frontier:
+				nextFrontier = []
+				for node in frontier:
+					for neighbour in self.ports.get(node, {}):
+						if neighbour not in distance:
+							distance[neighbour] = distance[node] + 1
+							nextFrontier.append(neighbour)
+				frontier = nextFrontier
+			self.distances[dpid] = distance
+		return self.distances[dpid]
+
+	def path(self, dpid, destination, key):
+		"""
+		One of the shortest paths from a switch to the host with MAC
+		destination, the next hop of every switch chosen by hashing key
+		:return: list of (dpid, output port), None when the host is unknown
+		"""
+		if destination not in self.hosts:
+			return None
+		last, hostPort = self.hosts[destination]
+		distance = self.distancesTo(last)
+		if dpid not in distance:
+			return None
+		hops = []
+		while dpid != last:
+			candidates = sorted(neighbour for neighbour in self.ports[dpid] if distance.get(neighbour) == distance[dpid] - 1)
+			nextHop = candidates[zlib.crc32(key + struct.pack("!Q", dpid)) % len(candidates)]
+			hops.append((dpid, self.ports[dpid][nextHop]))
+			dpid = nextHop
+		hops.append((last, hostPort))
+		return hops
+
+def parsePacket(data, mode):
+	"""
+	Match fields and path hash key of a packet
+	:return: (wildcards, match fields dict, hash key)
+	"""
+	dst, src, ethType = data[0:6], data[6:12], struct.unpack("!H", data[12:14])[0]
+	wildcards = OFPFW_ALL & ~(OFPFW_DL_SRC | OFPFW_DL_DST)
+	fields = {"dl_src": src, "dl_dst": dst, "dl_type": 0, "nw_proto": 0, "nw_src": 0, "nw_dst": 0, "tp_src": 0, "tp_dst": 0}
+	key = src + dst
+	if mode == 'ecmp' and ethType == ETH_IP and len(data) >= 34:
+		headerLength = (bytearray(data[14:15])[0] & 0x0f) * 4
+		proto = bytearray(data[23:24])[0]
+		fields.update(dl_type=ETH_IP, nw_proto=proto, nw_src=struct.unpack("!I", data[26:30])[0], nw_dst=struct.unpack("!I", data[30:34])[0])
+		wildcards &= ~(OFPFW_DL_TYPE | OFPFW_NW_PROTO | OFPFW_NW_SRC_MASK | OFPFW_NW_DST_MASK)
+		key = data[26:34] + data[23:24]
+		ports = 14 + headerLength
+		if proto in (6, 17) and len(data) >= ports + 4:
+			fields["tp_src"], fields["tp_dst"] = struct.unpack("!HH", data[ports:ports + 4])
+			wildcards &= ~(OFPFW_TP_SRC | OFPFW_TP_DST)
+			key += data[ports:ports + 4]
+	return wildcards, fields, key
+
+def flowMod(wildcards, fields, port, idleTimeout=IDLE_TIMEOUT):
+	match = MATCH.pack(wildcards, 0, fields["dl_src"], fields["dl_dst"], 0, 0, fields["dl_type"], 0, fields["nw_proto"],
+					   fields["nw_src"], fields["nw_dst"], fields["tp_src"], fields["tp_dst"])
+	return message(OFPT_FLOW_MOD, match + FLOW_MOD.pack(0, OFPFC_ADD, idleTimeout, HARD_TIMEOUT, PRIORITY, NO_BUFFER, OFPP_NONE, 0) +
+				   ACTION_OUTPUT.pack(0, ACTION_OUTPUT.size, port, 0))
+
+def packetOut(bufferId, inPort, port, data):
+	actions = ACTION_OUTPUT.pack(0, ACTION_OUTPUT.size, port, 0)
+	return message(OFPT_PACKET_OUT, PACKET_OUT.pack(bufferId, inPort, len(actions)) + actions +
+				   (data if bufferId == NO_BUFFER else b""))
+
+class _Connection(object):
+
+	def __init__(self, sock):
+		self.sock = sock
+		self.buffer = b""
+		self.dpid = None
+		self.closed = False
+
+class _Setup(object):
+
+	def __init__(self, started, pending):
+		self.started = started
+		self.pending = pending
+
+class MiniController(object):
+	"""
+	Reactive OpenFlow 1.0 controller running in a thread of the test script
+	"""
+
+	def __init__(self, port=6633, mode='l2', topology=None, address="127.0.0.1"):
+		"""
+		:param port: TCP port the switches connect to
+		:param mode: one of MODES
+		:param topology: Topology, can be set later with setTopology once the
+						 network is started; packets are dropped until then
+		"""
+		if mode not in MODES:
+			raise ValueError("Unknown controller mode %s" % mode)
+		self.port = port
+		self.mode = mode
+		self.topology = topology
+		self.address = address
+		self.server = None
+		self.thread = None
+		self.stopped = threading.Event()
+		self.connections = {}
+		self.switches = {}
+		self.xid = 1
+		self.setups = {}
+		#Seconds from packet-in to flow-mods sent, and to the barriers answered
+		self.processing = []
+		self.setupTimes = []
+		self.packetIns = 0
+		self.flowMods = 0
+		self.dropped = 0
+		self.firstSetup = None
+		self.lastSetup = None
+
+	def setTopology(self, topology):
+		self.topology = topology
+		logger.debug("Controller topology: %d switches, %d hosts" % (len(topology.ports), len(topology.hosts)))
+
+	def start(self):
+		self._listen()
+		self.thread = threading.Thread(target=self._run, name="minictl")
+		self.thread.daemon = True
+		self.thread.start()
+		logger.info( ">>> Local %s controller listening on %s:%d" % (self.mode, self.address, self.port) )
+		return self
+
+	def stop(self):
+		self.stopped.set()
+		if self.thread:
+			self.thread.join()
+		for connection in list(self.connections.values()):
+			connection.sock.close()
+		self.server.close()
+
+	def resetStats(self):
+		self.processing = []
+		self.setupTimes = []
+		self.packetIns = self.flowMods = self.dropped = 0
+		self.firstSetup = self.lastSetup = None
+
+	def stats(self):
+		"""
+		Controller side flow setup statistics
+		:return: dict name -> value, latencies in milliseconds
+		"""
+		processing = sorted(1000 * value for value in self.processing)
+		setups = sorted(1000 * value for value in self.setupTimes)
+		elapsed = (self.lastSetup - self.firstSetup) if self.setupTimes and self.lastSetup > self.firstSetup else None
+		return {"packet_ins": self.packetIns, "flow_mods": self.flowMods, "dropped": self.dropped, "setups": len(setups),
+				"setups_per_s": (len(setups) - 1) / elapsed if elapsed else None,
+				"processing_p50_ms": results.percentile(processing, 50), "processing_p99_ms": results.percentile(processing, 99),
+				"setup_p50_ms": results.percentile(setups, 50), "setup_p99_ms": results.percentile(setups, 99)}
+
+	def _listen(self):
+		self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.server.bind((self.address, self.port))
+		self.server.listen(128)
+
+	def _nextXid(self):
+		self.xid = (self.xid + 1) & 0xffffffff
+		return self.xid
+
+	def _run(self):
+		while not self.stopped.is_set():
+			self._poll(0.2)
+
+	def _poll(self, timeout):
+		"""
+		Accept the new switches and handle the messages of every readable one
+		"""
+		connections = dict((connection.sock, connection) for connection in self.connections.values())
+		try:
+			readable = select.select([self.server] + list(connections), [], [], timeout)[0]
+		except (select.error, OSError) as e:
+			if e.args[0] == errno.EINTR:
+				return
+			raise
+		for sock in readable:
+			if sock is self.server:
+				self._accept()
+			elif not connections[sock].closed:
+				#Not closed meanwhile by a failed send while handling another switch
+				self._read(connections[sock])
+
+	def _accept(self):
+		sock, _ = self.server.accept()
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		connection = _Connection(sock)
+		self.connections[sock.fileno()] = connection
+		self._send(connection, message(OFPT_HELLO, xid=self._nextXid()))
+		self._send(connection, message(OFPT_FEATURES_REQUEST, xid=self._nextXid()))
+
+	def _send(self, connection, data):
+		"""
+		Send a message to a switch; a switch that dropped its connection is
+		closed instead of stopping the controller
+		:return: False when the connection is closed
+		"""
+		if connection.closed:
+			return False
+		try:
+			connection.sock.sendall(data)
+		except socket.error as e:
+			logger.debug("Connection of %s lost: %s" % (connection.dpid, e))
+			self._close(connection)
+			return False
+		return True
+
+	def _close(self, connection):
+		if connection.closed:
+			return
+		connection.closed = True
+		self.connections.pop(connection.sock.fileno(), None)
+		if connection.dpid is not None and self.switches.get(connection.dpid) is connection:
+			del self.switches[connection.dpid]
+		connection.sock.close()
+
+	def _read(self, connection):
+		try:
+			data = connection.sock.recv(65536)
+		except socket.error:
+			data = b""
+		if not data:
+			self._close(connection)
+			return
+		connection.buffer += data
+		while len(connection.buffer) >= HEADER.size:
+			version, kind, length, xid = HEADER.unpack_from(connection.buffer)
+			if length < HEADER.size:
+				self._close(connection)
+				return
+			if len(connection.buffer) < length:
+				break
+			body = connection.buffer[HEADER.size:length]
+			connection.buffer = connection.buffer[length:]
+			self._handle(connection, kind, xid, body)
+			if connection.closed:
+				return
+
+	def _handle(self, connection, kind, xid, body):
+		if kind == OFPT_ECHO_REQUEST:
+			self._send(connection, message(OFPT_ECHO_REPLY, body, xid))
+		elif kind == OFPT_FEATURES_REPLY:
+			connection.dpid = FEATURES.unpack_from(body)[0]
+			self.switches[connection.dpid] = connection
+			self._send(connection, message(OFPT_SET_CONFIG, struct.pack("!HH", 0, MISS_SEND_LEN), self._nextXid()))
+		elif kind == OFPT_PACKET_IN:
+			self._packetIn(connection, body)
+		elif kind == OFPT_PORT_STATUS:
+			self._portStatus(connection, body)
+		elif kind == OFPT_BARRIER_REPLY:
+			self._barrierReply(xid)
+		elif kind == OFPT_ERROR:
+			logger.debug("OpenFlow error from %s: %r" % (connection.dpid, body[:4]))
+
+	def _packetIn(self, connection, body):
+		received = time.time()
+		self.packetIns += 1
+		bufferId, _, inPort, _ = PACKET_IN.unpack_from(body)
+		data = body[PACKET_IN.size:]
+		if self.topology is None or len(data) < 14:
+			self.dropped += 1
+			return
+		wildcards, fields, key = parsePacket(data, self.mode)
+		hops = self.topology.path(connection.dpid, fields["dl_dst"], key)
+		if not hops or any(dpid not in self.switches for dpid, _ in hops):
+			self.dropped += 1
+			return
+
+		for dpid, port in reversed(hops):
+			if not self._send(self.switches[dpid], flowMod(wildcards, fields, port)):
+				self.dropped += 1
+				return
+		self.flowMods += len(hops)
+		if not self._send(connection, packetOut(bufferId, inPort, hops[0][1], data)):
+			self.dropped += 1
+			return
+		self.processing.append(time.time() - received)
+
+		pending = set()
+		for dpid, _ in hops:
+			xid = self._nextXid()
+			if dpid in self.switches and self._send(self.switches[dpid], message(OFPT_BARRIER_REQUEST, xid=xid)):
+				pending.add(xid)
+				self.setups[xid] = None
+		if not pending:
+			return
+		setup = _Setup(received, pending)
+		for xid in pending:
+			self.setups[xid] = setup
+
+	def _portStatus(self, connection, body):
+		"""
+		A link went down or came back: the installed paths may use it or loop
+		around it, so every switch forgets its flows and the next packets set
+		up new paths
+		"""
+		port, _, _, config, state = PORT.unpack_from(body, 8)[:5]
+		up = not (config & OFPPC_PORT_DOWN or state & OFPPS_LINK_DOWN)
+		if self.topology is None or not self.topology.setPortState(connection.dpid, port, up):
+			return
+		flush = message(OFPT_FLOW_MOD, MATCH.pack(OFPFW_ALL, 0, b"\0" * 6, b"\0" * 6, 0, 0, 0, 0, 0, 0, 0, 0, 0) +
+						FLOW_MOD.pack(0, OFPFC_DELETE, 0, 0, 0, NO_BUFFER, OFPP_NONE, 0))
+		for switch in list(self.switches.values()):
+			self._send(switch, flush)
+		logger.info( ">>> Port %d of %s %s, flows flushed" % (port, self.topology.names.get(connection.dpid, connection.dpid),
+															   "up" if up else "down") )
+
+	def _barrierReply(self, xid):
+		setup = self.setups.pop(xid, None)
+		if setup is None:
+			return
+		setup.pending.discard(xid)
+		if not setup.pending:
+			now = time.time()
+			self.setupTimes.append(now - setup.started)
+			self.firstSetup = self.firstSetup or now
+			self.lastSetup = now
+
+def _pingTimes(output):
+	times = {}
+	for line in output.splitlines():
+		if "icmp_seq=" in line and "time=" in line:
+			sequence = int(line.split("icmp_seq=")[1].split()[0])
+			times[sequence] = float(line.split("time=")[1].split()[0])
+	return times
+
+def flowSetupTest(net, controller, pairs, name, count=5, interval=0.2):
+	"""
+	First-packet RTT against steady-state RTT of every pair, all the pairs
+	at once, from empty flow tables
+	:param pairs: list of (client host, server host)
+	:param name: experiment name, results/<name>_flowsetup.tsv
+	:return: list of rows with the SETUP_COLUMNS
+	"""
+	if net.switches:
+		net.switches[0].cmd('; '.join('ovs-ofctl del-flows %s' % switch for switch in net.switches))
+	controller.resetStats()
+
+	popens = [client.popen('ping -n -c %d -i %g %s' % (count, interval, server.IP()), shell=True) for client, server in pairs]
+	rows = []
+	for index, ((client, server), popen) in enumerate(zip(pairs, popens)):
+		output = popen.communicate()[0]
+		times = _pingTimes(output.decode("utf-8", "replace") if isinstance(output, bytes) else output)
+		steady = sorted(times[sequence] for sequence in times if sequence > 1)
+		first = times.get(1)
+		steadyMs = results.percentile(steady, 50)
+		rows.append((index, str(client), str(server), first, steadyMs,
+					 first - steadyMs if first is not None and steadyMs is not None else None))
+
+	with open("%s/%s_flowsetup.tsv" % (results.RESULTS_DIR, name), "w") as f:
+		f.write("\t".join(SETUP_COLUMNS) + "\n")
+		for row in rows:
+			f.write("\t".join(results.field(value) for value in row) + "\n")
+
+	stats = controller.stats()
+	setups = sorted(row[5] for row in rows if row[5] is not None)
+	logger.info( ">>> Flow setup: first packet %s ms above steady state (median pair), controller %s ms per packet-in, "
+				 "%s ms until the path is installed (p50)" % (results.field(results.percentile(setups, 50)),
+															  results.field(stats["processing_p50_ms"]), results.field(stats["setup_p50_ms"])) )
+	return rows
+
+class _EmulatedSwitch(object):
+	"""
+	cbench style switch: answers the handshake, then sends packet-ins with a
+	new source MAC each, back to back (throughput) or one at a time (latency)
+	"""
+
+	def __init__(self, dpid, address, port):
+		self.dpid = dpid
+		self.sock = socket.create_connection((address, port))
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.buffer = b""
+		self.flowMods = 0
+		self.sequence = 0
+
+	def host(self, port):
+		return struct.pack("!HI", 0x0200, self.dpid * 16 + port)
+
+	def handshake(self):
+		self.sock.sendall(message(OFPT_HELLO))
+		while True:
+			kind, xid, body = self.receive()
+			if kind == OFPT_FEATURES_REQUEST:
+				ports = b"".join(PORT.pack(port, self.host(port), b"eth%d" % port, 0, 0, 0, 0, 0, 0) for port in (1, 2))
+				self.sock.sendall(message(OFPT_FEATURES_REPLY, FEATURES.pack(self.dpid, 256, 1, 0, 0) + ports, xid))
+				return
+
+	def receive(self):
+		while True:
+			if len(self.buffer) >= HEADER.size:
+				_, kind, length, xid = HEADER.unpack_from(self.buffer)
+				if len(self.buffer) >= length:
+					body = self.buffer[HEADER.size:length]
+					self.buffer = self.buffer[length:]
+					if kind == OFPT_ECHO_REQUEST:
+						self.sock.sendall(message(OFPT_ECHO_REPLY, body, xid))
+					elif kind == OFPT_BARRIER_REQUEST:
+						self.sock.sendall(message(OFPT_BARRIER_REPLY, xid=xid))
+					else:
+						if kind == OFPT_FLOW_MOD:
+							self.flowMods += 1
+						return kind, xid, body
+					continue
+			data = self.sock.recv(65536)
+			if not data:
+				raise socket.error("Controller closed the connection")
+			self.buffer += data
+
+	def packetIn(self):
+		self.sequence += 1
+		source = struct.pack("!HI", 0x0a00, (self.dpid << 20) + self.sequence)
+		frame = self.host(2) + source + struct.pack("!H", 0x88b5) + b"\0" * 46
+		return message(OFPT_PACKET_IN, PACKET_IN.pack(NO_BUFFER, len(frame), 1, 0) + frame)
+
+	def run(self, mode, until):
+		latencies = []
+		try:
+			while time.time() < until:
+				if mode == 'throughput':
+					self.sock.sendall(self.packetIn() * 8)
+					self.sock.settimeout(0.001)
+					try:
+						while True:
+							self.receive()
+					except socket.timeout:
+						pass
+					self.sock.settimeout(None)
+				else:
+					started = time.time()
+					self.sock.sendall(self.packetIn())
+					while self.receive()[0] != OFPT_FLOW_MOD:
+						pass
+					latencies.append(time.time() - started)
+		except socket.error:
+			pass
+		return latencies
+
+def bench(switches=16, seconds=10, mode='throughput', port=6653):
+	"""
+	Flow setups per second (throughput) or per packet-in latency (latency)
+	of a MiniController against emulated switches, each with two hosts
+	"""
+	topology = Topology()
+	controller = MiniController(port, 'l2', topology).start()
+	emulated = []
+	for dpid in range(1, switches + 1):
+		switch = _EmulatedSwitch(dpid, "127.0.0.1", port)
+		switch.handshake()
+		topology.addHost(switch.host(2), dpid, 2)
+		emulated.append(switch)
+	while len(controller.switches) < switches:
+		time.sleep(0.01)
+
+	until = time.time() + seconds
+	latencies = []
+	threads = [threading.Thread(target=lambda switch=switch: latencies.extend(switch.run(mode, until))) for switch in emulated]
+	start = time.time()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.time() - start
+	controller.stop()
+
+	flowMods = sum(switch.flowMods for switch in emulated)
+	latencies = sorted(1000 * latency for latency in latencies)
+	return {"switches": switches, "mode": mode, "seconds": elapsed, "flow_mods": flowMods, "flow_mods_per_s": flowMods / elapsed,
+			"latency_p50_ms": results.percentile(latencies, 50), "latency_p99_ms": results.percentile(latencies, 99)}
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the local OpenFlow controller against emulated switches')
+	sub = parser.add_subparsers(dest='command')
+	benchmark = sub.add_parser('bench', help='cbench style flow setup benchmark')
+	benchmark.add_argument('--switches', type=int, default=16, help='Number of emulated switches')
+	benchmark.add_argument('--seconds', type=float, default=10, help='Duration of the benchmark')
+	benchmark.add_argument('--mode', type=str, default='throughput', choices=('throughput', 'latency'))
+	benchmark.add_argument('--port', type=int, default=6653, help='Controller port')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO)
+	report = bench(args.switches, args.seconds, args.mode, args.port)
+	for key in ("switches", "mode", "seconds", "flow_mods", "flow_mods_per_s", "latency_p50_ms", "latency_p99_ms"):
+		print("%s\t%s" % (key, results.field(report[key])))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
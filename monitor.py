@@ -0,0 +1,189 @@
+"""
+monitor.py: event-driven monitoring of the test flows
+
+monitorFlows replaces the pmonitor loop with one global deadline: the
+output of all the popens is multiplexed with epoll (poll where epoll is not
+available), every flow has its own deadline, only the flows that overrun are
+stopped (SIGINT first so that iperf3 still prints its report, SIGKILL after
+a grace period), and the output kept per flow is capped.
+
+FlowStatus: exit status, runtime and output tail of one flow
+"""
+
+import os
+import time
+import errno
+import select
+import signal
+import logging
+
+logger = logging.getLogger( __name__ )
+
+#Output kept per flow, in bytes
+MAX_OUTPUT = 16 * 1024
+
+READ_SIZE = 4096
+
+class FlowStatus(object):
+	"""
+	State of a monitored flow
+	"""
+
+	def __init__(self, index, popen, deadline, started):
+		self.index = index
+		self.popen = popen
+		self.deadline = deadline
+		self.started = started
+		self.ended = None
+		self.returncode = None
+		self.stopped = False
+		self.killAt = None
+		self.eof = popen.stdout is None
+		self.output = b""
+		self.partial = b""
+
+	def runtime(self):
+		return (self.ended or time.time()) - self.started
+
+	def done(self):
+		return self.ended is not None
+
+	def append(self, data, maxOutput):
+		self.output = (self.output + data)[-maxOutput:]
+		lines = (self.partial + data).split(b"\n")
+		self.partial = lines.pop()[-maxOutput:]
+		return lines
+
+class _Poller(object):
+	"""
+	epoll when available, poll otherwise; timeouts in seconds
+	"""
+
+	def __init__(self):
+		if hasattr(select, 'epoll'):
+			self.poller = select.epoll()
+			self.flags = select.EPOLLIN | select.EPOLLHUP | select.EPOLLERR
+			self.scale = 1
+		else:
+			self.poller = select.poll()
+			self.flags = select.POLLIN | select.POLLHUP | select.POLLERR
+			self.scale = 1000
+
+	def register(self, fd):
+		self.poller.register(fd, self.flags)
+
+	def unregister(self, fd):
+		self.poller.unregister(fd)
+
+	def poll(self, timeout):
+		try:
+			return self.poller.poll(timeout * self.scale if self.scale == 1 else int(timeout * self.scale))
+		except (IOError, OSError, select.error) as e:
+			if e.args[0] == errno.EINTR:
+				return []
+			raise
+
+	def close(self):
+		if hasattr(self.poller, 'close'):
+			self.poller.close()
+
+def signalFlow(popen, sig):
+	"""
+	Signal the process group of a flow (Mininet starts popens in their own
+	session), falling back to the process itself
+	"""
+	try:
+		os.killpg(popen.pid, sig)
+	except OSError:
+		try:
+			popen.send_signal(sig)
+		except OSError:
+			pass
+
+def monitorFlows(popens, deadlines=None, grace=5, maxOutput=MAX_OUTPUT):
+	"""
+	Monitor a set of flows until all of them finished or were stopped
+	:param popens: dict index -> popen
+	:param deadlines: maximum runtime of the flows in seconds from now, either
+					  one number for all the flows or a dict index -> seconds;
+					  None means no deadline
+	:param grace: seconds between SIGINT and SIGKILL for overrunning flows
+	:param maxOutput: bytes of output kept per flow
+	:return: dict index -> FlowStatus
+	"""
+	now = time.time()
+	poller = _Poller()
+	flows = {}
+	fds = {}
+
+	for index, popen in popens.items():
+		if isinstance(deadlines, dict):
+			deadline = deadlines.get(index)
+		else:
+			deadline = deadlines
+		flow = FlowStatus(index, popen, now + deadline if deadline is not None else None, now)
+		flows[index] = flow
+		if popen.stdout is not None:
+			fd = popen.stdout.fileno()
+			fds[fd] = flow
+			poller.register(fd)
+
+	active = list(flows.values())
+	try:
+		while active:
+			now = time.time()
+			wakeups = [flow.killAt or flow.deadline for flow in active if (flow.killAt or flow.deadline) is not None]
+			timeout = min([1.0] + [max(0, wakeup - now) for wakeup in wakeups])
+
+			for fd, event in poller.poll(timeout):
+				flow = fds[fd]
+				try:
+					data = os.read(fd, READ_SIZE)
+				except OSError:
+					data = b""
+				if not data:
+					flow.eof = True
+					poller.unregister(fd)
+					del fds[fd]
+					continue
+				for line in flow.append(data, maxOutput):
+					logger.debug( "<%s>: %s" % ( flow.index, line.decode('utf-8', 'replace').strip() ) )
+
+			now = time.time()
+			for flow in active:
+				returncode = flow.popen.poll()
+				if returncode is not None and (flow.eof or flow.stopped):
+					flow.returncode = returncode
+					flow.ended = now
+				elif flow.killAt is not None and now >= flow.killAt:
+					logger.debug("*** Flow %s did not stop, killing it ***" % flow.index)
+					signalFlow(flow.popen, signal.SIGKILL)
+					flow.killAt = None
+				elif not flow.stopped and flow.deadline is not None and now >= flow.deadline:
+					logger.debug("*** Flow %s timed out after %.1f seconds ***" % (flow.index, flow.runtime()))
+					signalFlow(flow.popen, signal.SIGINT)
+					flow.stopped = True
+					flow.killAt = now + grace
+
+			active = [flow for flow in active if not flow.done()]
+	finally:
+		poller.close()
+
+	report(flows)
+	return flows
+
+def report(flows):
+	"""
+	Log a summary of the flow exit statuses and runtimes
+	"""
+	if not flows:
+		return
+	runtimes = [flow.runtime() for flow in flows.values()]
+	stopped = sorted(flow.index for flow in flows.values() if flow.stopped)
+	failed = sorted(flow.index for flow in flows.values() if flow.returncode and not flow.stopped)
+
+	logger.info( ">>> %d flows finished, runtime %.1f-%.1f seconds" % (len(flows), min(runtimes), max(runtimes)) )
+	if stopped:
+		logger.info( ">>> %d flows stopped at their deadline: %s" % (len(stopped), " ".join(str(i) for i in stopped)) )
+	if failed:
+		logger.info( ">>> %d flows exited with an error: %s" % (len(failed), " ".join("%s(%d)" % (i, flows[i].returncode) for i in failed)) )
@@ -0,0 +1,325 @@
+"""
+pathstats.py: offline path and ECMP analysis of the Fat Tree and Jellyfish topologies
+
+No Mininet network is started. The switch graph is built from the link
+layout in layout.py as an adjacency matrix, and breadth-first searches from
+all the host-attached switches are run at once as matrix products, which
+gives the hop counts and the number of equal-cost shortest paths of every
+switch pair. The report covers the same server/client pairs as the emulated
+tests (traffic.py):
+
+hops: host-to-host hop count
+paths: number of equal-cost shortest paths
+diversity: number of distinct first-hop links used by those paths
+bisection: links (and bandwidth) across a balanced cut of the hosts
+
+Usage:
+	python pathstats.py fattree -k 48
+	python pathstats.py jellyfish -H 686 -s 245 -p 14 --seed 1
+"""
+
+import sys
+import json
+import heapq
+import time
+import logging
+import argparse
+
+import numpy as np
+
+import layout
+import traffic
+
+logger = logging.getLogger( __name__ )
+
+#Rows of the BFS frontier processed at once, bounds the memory used
+BLOCK_SIZE = 1024
+
+def adjacencyMatrix(switchCount, links):
+	"""
+	Symmetric adjacency matrix of the switch graph
+	"""
+	adjacency = np.zeros((switchCount, switchCount), dtype=np.float32)
+	if links:
+		ends = np.asarray(links, dtype=np.int64)
+		adjacency[ends[:, 0], ends[:, 1]] = 1
+		adjacency[ends[:, 1], ends[:, 0]] = 1
+	return adjacency
+
+def shortestPaths(adjacency, sources):
+	"""
+	Hop counts and number of shortest paths from every source switch to every
+	switch, using one matrix product per BFS level
+	:param adjacency: adjacency matrix (float32)
+	:param sources: array of source switch indices
+	:return: (distances, counts) arrays of shape (len(sources), switches);
+			 unreachable switches have distance -1 and count 0
+	"""
+	sources = np.asarray(sources, dtype=np.int64)
+	switchCount = adjacency.shape[0]
+	distances = np.full((len(sources), switchCount), -1, dtype=np.int16)
+	counts = np.zeros((len(sources), switchCount), dtype=np.float64)
+
+	for first in range(0, len(sources), BLOCK_SIZE):
+		rows = slice(first, first + BLOCK_SIZE)
+		block = sources[rows]
+		frontier = np.zeros((len(block), switchCount), dtype=np.float32)
+		frontier[np.arange(len(block)), block] = 1
+		distance = distances[rows]
+		count = counts[rows]
+		distance[np.arange(len(block)), block] = 0
+		count[np.arange(len(block)), block] = 1
+
+		level = 0
+		while frontier.any():
+			level += 1
+			reached = frontier.dot(adjacency)
+			new = (reached > 0) & (distance < 0)
+			distance[new] = level
+			count[new] = reached[new]
+			frontier = np.where(new, reached, 0).astype(np.float32)
+
+	return distances, counts
+
+def pairStats(adjacency, hostSwitch, servers, clients, bfs=None):
+	"""
+	Hop count, number of equal-cost paths and first-hop path diversity of
+	every (client, server) pair
+	:param adjacency: adjacency matrix of the switches
+	:param hostSwitch: host index -> switch index
+	:param servers: server host indices
+	:param clients: client host indices
+	:param bfs: optional (sorted sources, distances, counts) from shortestPaths
+				covering all the switches of the pairs
+	:return: dict of arrays 'hops', 'paths', 'diversity'
+	"""
+	hostSwitch = np.asarray(hostSwitch, dtype=np.int64)
+	src = hostSwitch[np.asarray(clients, dtype=np.int64)]
+	dst = hostSwitch[np.asarray(servers, dtype=np.int64)]
+
+	#The graph is undirected: BFS from the destinations gives the distances
+	#of the source neighbours needed for the diversity as well
+	if bfs is None:
+		sources = np.unique(np.concatenate((src, dst)))
+		bfs = (sources,) + shortestPaths(adjacency, sources)
+	sources, distances, counts = bfs
+	srcRow = np.searchsorted(sources, src)
+	dstRow = np.searchsorted(sources, dst)
+
+	distance = distances[srcRow, dst].astype(np.int64)
+	paths = counts[srcRow, dst]
+
+	diversity = np.zeros(len(src), dtype=np.int64)
+	for first in range(0, len(src), BLOCK_SIZE):
+		rows = slice(first, first + BLOCK_SIZE)
+		nextHop = distances[dstRow[rows]] == (distance[rows] - 1)[:, None]
+		diversity[rows] = (adjacency[src[rows]].astype(bool) & nextHop).sum(axis=1)
+	diversity[distance == 0] = 1
+
+	hops = np.where(distance >= 0, distance + 2, -1)
+	return {"hops": hops, "paths": paths, "diversity": diversity}
+
+def neighbours(switchCount, links):
+	"""
+	Sorted neighbour lists of the switch graph
+	"""
+	lists = [[] for _ in range(0, switchCount)]
+	for a, b in links:
+		lists[a].append(b)
+		lists[b].append(a)
+	for neighbourList in lists:
+		neighbourList.sort()
+	return lists
+
+def _bfsPath(neighbours, src, dst, blockedNodes=(), blockedEdges=()):
+	parent = {src: None}
+	frontier = [src]
+	while frontier and dst not in parent:
+		nextFrontier = []
+		for node in frontier:
+			for neighbour in neighbours[node]:
+				if neighbour in parent or neighbour in blockedNodes or (node, neighbour) in blockedEdges:
+					continue
+				parent[neighbour] = node
+				nextFrontier.append(neighbour)
+		frontier = nextFrontier
+	if dst not in parent:
+		return None
+	path = [dst]
+	while path[-1] != src:
+		path.append(parent[path[-1]])
+	return path[::-1]
+
+def kShortestPaths(neighbours, src, dst, k):
+	"""
+	k shortest loop-free switch paths from src to dst (Yen's algorithm on the
+	unweighted graph); ties are broken by the lowest switch indices, so the
+	result is deterministic
+	:param neighbours: neighbour lists from neighbours()
+	:return: list of at most k paths, each a list of switch indices
+	"""
+	if src == dst:
+		return [[src]]
+	first = _bfsPath(neighbours, src, dst)
+	if first is None:
+		return []
+
+	paths = [first]
+	candidates = []
+	seen = set([tuple(first)])
+	while len(paths) < k:
+		last = paths[-1]
+		for i in range(0, len(last) - 1):
+			root = last[:i + 1]
+			blockedEdges = set((path[i], path[i + 1]) for path in paths if path[:i + 1] == root)
+			spur = _bfsPath(neighbours, last[i], dst, set(root[:-1]), blockedEdges)
+			if spur is not None:
+				candidate = root[:-1] + spur
+				if tuple(candidate) not in seen:
+					seen.add(tuple(candidate))
+					heapq.heappush(candidates, (len(candidate), candidate))
+		if not candidates:
+			break
+		paths.append(heapq.heappop(candidates)[1])
+	return paths
+
+def fiedlerVector(adjacency, iterations=300, seed=0):
+	"""
+	Approximate Fiedler vector of the graph Laplacian by power iteration on
+	(c*I - L), orthogonal to the constant vector
+	"""
+	degree = adjacency.sum(axis=1)
+	shift = 2 * degree.max() + 1
+	vector = np.random.RandomState(seed).rand(adjacency.shape[0]) - 0.5
+	for _ in range(0, iterations):
+		vector -= vector.mean()
+		vector = shift * vector - (degree * vector - adjacency.dot(vector))
+		vector /= np.linalg.norm(vector) or 1
+	return vector
+
+def bisection(adjacency, links, hostSwitch, side=None):
+	"""
+	Number of links across a cut that splits the hosts in two halves
+	:param side: boolean array, switch -> side of the cut; when None the cut
+				 is taken from the spectral ordering of the switches
+	:return: (number of links across the cut, side array)
+	"""
+	hostSwitch = np.asarray(hostSwitch, dtype=np.int64)
+	if side is None:
+		order = np.argsort(fiedlerVector(adjacency))
+		hostsPerSwitch = np.bincount(hostSwitch, minlength=adjacency.shape[0])
+		side = np.zeros(adjacency.shape[0], dtype=bool)
+		side[order[np.cumsum(hostsPerSwitch[order]) <= len(hostSwitch) // 2]] = True
+	ends = np.asarray(links, dtype=np.int64)
+	return int((side[ends[:, 0]] != side[ends[:, 1]]).sum()), side
+
+def fatTreeSide(kNUMBER):
+	"""
+	Cut of a Fat Tree that puts half of the pods (and half of the core
+	switches) on each side
+	"""
+	half = kNUMBER // 2
+	coreNumber = half ** 2
+	podNumber = half * kNUMBER
+	side = np.zeros(coreNumber + 2 * podNumber, dtype=bool)
+	side[0:coreNumber // 2] = True
+	side[coreNumber:coreNumber + podNumber // 2] = True
+	side[coreNumber + podNumber:coreNumber + podNumber + podNumber // 2] = True
+	return side
+
+def summarize(values):
+	values = np.asarray(values, dtype=np.float64)
+	return {"min": float(values.min()), "mean": float(values.mean()),
+			"median": float(np.median(values)), "max": float(values.max())}
+
+def analyze(switchCount, links, hostSwitch, pairSets, linkBandwidth=1000, side=None):
+	"""
+	Full report for one topology
+	:param pairSets: dict relation -> (servers, clients)
+	:param linkBandwidth: link capacity in Mbit/s
+	:return: report dict
+	"""
+	start = time.time()
+	adjacency = adjacencyMatrix(switchCount, links)
+
+	report = {"switches": switchCount, "links": len(links), "hosts": len(hostSwitch), "pairs": {}}
+
+	hostSwitches = np.unique(hostSwitch)
+	distances, counts = shortestPaths(adjacency, hostSwitches)
+	reachable = distances[:, hostSwitches]
+	report["hops"] = {"histogram": dict((int(d) + 2, int(n)) for d, n in
+										zip(*np.unique(reachable[reachable >= 0], return_counts=True))),
+					  "diameter": int(reachable.max()) + 2,
+					  "unreachable": int((reachable < 0).sum())}
+
+	cut, side = bisection(adjacency, links, hostSwitch, side)
+	report["bisection"] = {"links": cut, "mbps": cut * linkBandwidth,
+						   "per_host_mbps": 2.0 * cut * linkBandwidth / max(len(hostSwitch), 1)}
+
+	hostSide = side[np.asarray(hostSwitch, dtype=np.int64)]
+	for relation, (servers, clients) in sorted(pairSets.items()):
+		stats = pairStats(adjacency, hostSwitch, servers, clients, (hostSwitches, distances, counts))
+		crossing = int((hostSide[np.asarray(servers, dtype=np.int64)] != hostSide[np.asarray(clients, dtype=np.int64)]).sum())
+		report["pairs"][relation] = {
+			"count": len(clients),
+			"hops": summarize(stats["hops"]),
+			"paths": summarize(stats["paths"]),
+			"diversity": summarize(stats["diversity"]),
+			"crossing_bisection": crossing,
+			"bisection_mbps_per_flow": float(cut * linkBandwidth) / crossing if crossing else None}
+
+	report["seconds"] = time.time() - start
+	return report
+
+def printReport(report):
+	print("switches %d, links %d, hosts %d, analyzed in %.2f s" % (report["switches"], report["links"], report["hosts"], report["seconds"]))
+	print("diameter %d hops, hop histogram %s" % (report["hops"]["diameter"], report["hops"]["histogram"]))
+	print("bisection: %d links, %d Mbit/s (%.1f Mbit/s per host)" % (report["bisection"]["links"], report["bisection"]["mbps"], report["bisection"]["per_host_mbps"]))
+	for relation, stats in sorted(report["pairs"].items()):
+		print("%s: %d pairs" % (relation, stats["count"]))
+		for metric in ("hops", "paths", "diversity"):
+			values = stats[metric]
+			print("  %-10s min %8.1f  mean %8.1f  median %8.1f  max %8.1f" % (metric, values["min"], values["mean"], values["median"], values["max"]))
+		print("  %d pairs cross the bisection" % stats["crossing_bisection"])
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Offline path and ECMP analysis of the test topologies')
+	sub = parser.add_subparsers(dest='topology')
+	ft = sub.add_parser('fattree', help='Fat Tree topology')
+	ft.add_argument('-k', type=int, default=4, help='Number of PODs')
+	jf = sub.add_parser('jellyfish', help='Jellyfish topology')
+	jf.add_argument('-H', type=int, default=16, help='Number of servers (hosts)')
+	jf.add_argument('-s', type=int, default=None, help='Number of switches')
+	jf.add_argument('-p', type=int, default=4, help='Number of switch ports')
+	jf.add_argument('--graph', type=str, default=None, help='Switch graph exported by jellyfish.py --export')
+	for p in (ft, jf):
+		p.add_argument('--seed', type=int, default=None, help='Random seed for the pairs and the topology')
+		p.add_argument('--bw', type=int, default=1000, help='Link bandwidth in Mbit/s')
+		p.add_argument('--json', type=str, default=None, help='Write the report to this file')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO)
+
+	if args.topology == 'fattree':
+		switchCount, links, hostSwitch = layout.fatTreeLinks(args.k)
+		servers, clients = traffic.fatTreePairs(args.k, args.seed)
+		pairSets = {"same_pod": (servers, clients), "different_pod": (servers[::-1], clients)}
+		side = fatTreeSide(args.k)
+	else:
+		if args.graph:
+			graph = layout.JellyfishLayout.load(args.graph)
+			switchCount, links, hostSwitch = graph.switchNumber, graph.links(), graph.hostSwitches()
+		else:
+			switchCount, links, hostSwitch = layout.jellyfishLinks(args.H, args.s or args.H, args.p, args.seed)
+		pairSets = {"random": traffic.randomPairs(list(range(0, len(hostSwitch))), args.seed)}
+		side = None
+
+	report = analyze(switchCount, links, hostSwitch, pairSets, args.bw, side)
+	printReport(report)
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+proactive.py: proactive k-shortest-path forwarding, without a controller
+
+Every OpenFlow rule is computed up front from the switch graph and written
+into the switches in bulk with ovs-ofctl, so no packet ever waits for a flow
+setup and no controller is in the loop. The switches run in fail-mode secure
+and ARP is resolved with static entries (net.staticArp()).
+
+Two layers of rules are installed:
+destination: one shortest-path tree per destination host, so that any pair
+			 can talk (pings, other traffic patterns)
+pair: for every (client, server) test pair, one of the k shortest paths of
+	  the pair in both directions; the pairs are spread over the k paths at
+	  random, which uses the path diversity of the topology
+
+The topology must provide the layout.JellyfishLayout graph as topo.layout,
+with its switches and hosts in topo.switchList and topo.hostList.
+"""
+
+import os
+import time
+import random
+import shutil
+import logging
+import tempfile
+
+import pathstats
+import readiness
+
+logger = logging.getLogger( __name__ )
+
+PAIR_PRIORITY = 200
+DESTINATION_PRIORITY = 100
+
+def _bfsTree(neighbours, root, rng):
+	"""
+	Next hop towards root of every switch, drawn at random among the
+	neighbours one hop closer to root
+	"""
+	depth = {root: 0}
+	frontier = [root]
+	while frontier:
+		nextFrontier = []
+		for node in frontier:
+			for neighbour in neighbours[node]:
+				if neighbour not in depth:
+					depth[neighbour] = depth[node] + 1
+					nextFrontier.append(neighbour)
+		frontier = nextFrontier
+	return dict((node, rng.choice([n for n in neighbours[node] if depth.get(n) == depth[node] - 1]))
+				for node in depth if node != root)
+
+def _output(topo, node, nextNode):
+	return 'output:%d' % topo.port(node, nextNode)[0]
+
+def flowRules(net, topo, servers, clients, k=8, seed=None):
+	"""
+	OpenFlow rules of every switch
+	:param net: mininet network (for the host IP addresses)
+	:param topo: topology with a layout.JellyfishLayout graph
+	:param servers: server host names of the test pairs
+	:param clients: client host names of the test pairs
+	:param k: number of shortest paths per pair
+	:param seed: random seed of the path choices
+	:return: dict switch name -> list of ovs-ofctl flow lines
+	"""
+	rng = random.Random(seed)
+	graph = topo.layout
+	neighbours = pathstats.neighbours(graph.switchNumber, graph.links())
+	hostSwitch = graph.hostSwitches()
+	hostIndex = dict((host, index) for index, host in enumerate(topo.hostList))
+	ips = [net.get(host).IP() for host in topo.hostList]
+	rules = dict((switch, []) for switch in topo.switchList)
+
+	#Destination layer
+	trees = {}
+	for host, switch in enumerate(hostSwitch):
+		if switch not in trees:
+			trees[switch] = _bfsTree(neighbours, switch, rng)
+		name = topo.hostList[host]
+		rules[topo.switchList[switch]].append('priority=%d,ip,nw_dst=%s,actions=%s' %
+											  (DESTINATION_PRIORITY, ips[host], _output(topo, topo.switchList[switch], name)))
+		for node, nextHop in trees[switch].items():
+			rules[topo.switchList[node]].append('priority=%d,ip,nw_dst=%s,actions=%s' %
+												(DESTINATION_PRIORITY, ips[host], _output(topo, topo.switchList[node], topo.switchList[nextHop])))
+
+	#Pair layer
+	cache = {}
+	for server, client in zip(servers, clients):
+		src, dst = hostIndex[str(client)], hostIndex[str(server)]
+		pair = (hostSwitch[src], hostSwitch[dst])
+		if pair not in cache:
+			cache[pair] = pathstats.kShortestPaths(neighbours, pair[0], pair[1], k)
+		if not cache[pair]:
+			raise ValueError("%s cannot reach %s" % (client, server))
+		path = [topo.switchList[switch] for switch in rng.choice(cache[pair])]
+
+		for a, b, hops in ((src, dst, path), (dst, src, path[::-1])):
+			match = 'priority=%d,ip,nw_src=%s,nw_dst=%s' % (PAIR_PRIORITY, ips[a], ips[b])
+			for node, nextNode in zip(hops, hops[1:] + [topo.hostList[b]]):
+				rules[node].append('%s,actions=%s' % (match, _output(topo, node, nextNode)))
+
+	return rules
+
+def installRules(net, rules, groups=None):
+	"""
+	Replace the flow tables of all the switches at once: one ovs-vsctl
+	transaction puts every switch in fail-mode secure without controller, then
+	every table is loaded from a file by concurrent ovs-ofctl add-flows
+	:param rules: dict switch name -> list of flow lines
+	:param groups: dict switch name -> list of group lines; groups need
+				   OpenFlow 1.3, which is then enabled beside OpenFlow 1.0
+	:return: True if every switch holds at least its rules
+	"""
+	start = time.time()
+	groups = groups or {}
+	ofctl = 'ovs-ofctl -O OpenFlow13' if groups else 'ovs-ofctl'
+	directory = tempfile.mkdtemp(prefix='proactive')
+	try:
+		#One shell line: Mininet's cmd() returns at the first prompt
+		vsctl = ''.join(' -- set-fail-mode %s secure -- del-controller %s' % (switch, switch) for switch in sorted(rules))
+		if groups:
+			vsctl += ''.join(' -- set bridge %s protocols=OpenFlow10,OpenFlow13' % switch for switch in sorted(rules))
+		script = ['ovs-vsctl' + vsctl + ';']
+		for switch, lines in sorted(rules.items()):
+			path = os.path.join(directory, '%s.flows' % switch)
+			with open(path, 'w') as f:
+				f.write('\n'.join(lines) + '\n')
+			commands = ['%s del-flows %s' % (ofctl, switch)]
+			if groups:
+				commands.append('%s del-groups %s' % (ofctl, switch))
+			if groups.get(switch):
+				groupPath = os.path.join(directory, '%s.groups' % switch)
+				with open(groupPath, 'w') as f:
+					f.write('\n'.join(groups[switch]) + '\n')
+				commands.append('%s add-groups %s %s' % (ofctl, switch, groupPath))
+			commands.append('%s add-flows %s %s' % (ofctl, switch, path))
+			script.append('(%s) &' % ' && '.join(commands))
+		script.append('wait')
+		net.switches[0].cmd(' '.join(script))
+	finally:
+		shutil.rmtree(directory, ignore_errors=True)
+
+	#Identical rules from the two layers collapse into one, so only check for a lower bound
+	expected = dict((switch, len(set(line.split(',actions=')[0] for line in lines))) for switch, lines in rules.items())
+	short = [switch for switch in net.switches if readiness.flowCount(switch) < expected.get(switch.name, 0)]
+	logger.info( ">>> %d rules installed on %d switches in %.1f seconds" %
+				 (sum(len(lines) for lines in rules.values()), len(rules), time.time() - start) )
+	if short:
+		logger.info( ">>> Missing rules on %d switches: %s" % (len(short), " ".join(str(switch) for switch in short[:10])) )
+	return not short
+
+def installPaths(net, topo, servers, clients, k=8, seed=None):
+	"""
+	Compute and install the k-shortest-path rules of a started network
+	"""
+	net.staticArp()
+	return installRules(net, flowRules(net, topo, servers, clients, k, seed))
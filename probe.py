@@ -0,0 +1,259 @@
+"""
+probe.py: latency distribution of host pairs, idle and under load
+
+A ping every second only gives an average. LatencyProbes sends timestamped
+UDP probes from every client to a reflector on its server, all the pairs at
+the same time and at hundreds to thousands of probes per second, so that
+the tail of the latency distribution is measured, also while the TCP and
+UDP load tests run. The Mininet hosts share the kernel clock, so besides
+the round trip time the reflector timestamp gives the one-way delay.
+
+Results: results/<name>.tsv, one row per pair with the probes sent and
+lost and the p50/p99/p99.9 round trip and one-way delays in microseconds;
+the samples of every pair are kept in results/<name>/. The delays of a time
+dilated emulation are reported in nominal time.
+
+The module is also the reflector and the sender run in the host namespaces:
+	python probe.py reflect --port <port>
+	python probe.py send --target <address> --port <port> --rate <pps> --duration <s> --at <clock> --out <file>
+"""
+
+import os
+import sys
+import time
+import array
+import socket
+import signal
+import struct
+import logging
+import argparse
+import threading
+
+import monitor
+import results
+import scheduler
+import iperfservers
+
+logger = logging.getLogger( __name__ )
+
+AGENT = os.path.abspath(__file__).replace('.pyc', '.py')
+
+PROBE_PORT = 7007
+
+#Probes per second of every pair
+PROBE_RATE = 1000
+
+#sequence number, send time, reflect time (scheduler clock)
+PROBE = struct.Struct("!Idd")
+PROBE_SIZE = 64
+
+#Time a probe may take before it counts as lost, in seconds
+PROBE_TIMEOUT = 1.0
+
+#Time the senders are given to start before the first probe, in seconds
+LEAD = 1.0
+
+#Time the reflectors are given to bind their port, in seconds
+REFLECTOR_TIMEOUT = 30
+
+PERCENTILES = (50, 99, 99.9)
+
+PAIR_COLUMNS = (("flow", "client", "server", "relation", "sent", "received", "lost_percent") +
+				tuple("rtt_p%g_us" % p for p in PERCENTILES) + ("rtt_max_us",) + tuple("owd_p%g_us" % p for p in PERCENTILES))
+
+def _readSamples(path):
+	values = array.array('d')
+	with open(path, 'rb') as f:
+		data = f.read()
+	getattr(values, 'frombytes', getattr(values, 'fromstring', None))(data)
+	return values
+
+def _writeSamples(path, values):
+	with open(path, 'wb') as f:
+		values.tofile(f)
+
+def reflect(port):
+	"""
+	Send every probe back with the time it arrived
+	"""
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+	sock.bind(("", port))
+	while True:
+		data, address = sock.recvfrom(PROBE_SIZE)
+		if len(data) < PROBE.size:
+			continue
+		sequence, sent, _ = PROBE.unpack_from(data)
+		sock.sendto(PROBE.pack(sequence, sent, scheduler.clock()) + data[PROBE.size:], address)
+
+def send(target, port, rate, duration, at, out, timeout=PROBE_TIMEOUT):
+	"""
+	Send rate probes per second for duration seconds from the clock time at,
+	then write the round trip and one-way delays of every probe in
+	microseconds (NaN for lost probes) to out.rtt and out.owd
+	"""
+	count = max(1, int(rate * duration))
+	interval = 1.0 / rate
+	rtts = array.array('d', [float('nan')]) * count
+	owds = array.array('d', [float('nan')]) * count
+	padding = b"\0" * (PROBE_SIZE - PROBE.size)
+
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+	sock.connect((target, port))
+	done = threading.Event()
+
+	def receive():
+		sock.settimeout(0.1)
+		while not done.is_set():
+			try:
+				data = sock.recv(PROBE_SIZE)
+			except socket.timeout:
+				continue
+			except socket.error:
+				#e.g. ICMP port unreachable before the reflector is up
+				continue
+			now = scheduler.clock()
+			sequence, sent, reflected = PROBE.unpack_from(data)
+			if sequence < count:
+				rtts[sequence] = (now - sent) * 1e6
+				owds[sequence] = (reflected - sent) * 1e6
+
+	receiver = threading.Thread(target=receive)
+	receiver.daemon = True
+	receiver.start()
+
+	for sequence in range(0, count):
+		remaining = at + sequence * interval - scheduler.clock()
+		if remaining > 0:
+			time.sleep(remaining)
+		try:
+			sock.send(PROBE.pack(sequence, scheduler.clock(), 0.0) + padding)
+		except socket.error:
+			pass
+
+	time.sleep(timeout)
+	done.set()
+	receiver.join()
+	_writeSamples(out + ".rtt", rtts)
+	_writeSamples(out + ".owd", owds)
+
+def pairRow(rtts, owds):
+	"""
+	Probe counts and delay percentiles of a pair from its samples
+	"""
+	received = sorted(value for value in rtts if value == value)
+	oneWay = sorted(value for value in owds if value == value)
+	sent = len(rtts)
+	return ((sent, len(received), 100.0 * (sent - len(received)) / sent if sent else None) +
+			tuple(results.percentile(received, p) for p in PERCENTILES) + (received[-1] if received else None,) +
+			tuple(results.percentile(oneWay, p) for p in PERCENTILES))
+
+class LatencyProbes(object):
+	"""
+	Concurrent latency probes over a set of host pairs; a rate of 0 disables
+	the probes, so that the tests can always wrap their load in it
+	"""
+
+	def __init__(self, name, pairs, rate=PROBE_RATE, duration=10, port=PROBE_PORT):
+		"""
+		:param name: experiment name of the results
+		:param pairs: list of (client host, server host, relation)
+		:param rate: probes per second of every pair
+		:param duration: probing time in seconds
+		"""
+		self.name = name
+		self.pairs = pairs
+		self.rate = rate
+		self.duration = duration
+		self.port = port
+		self.flowDir = os.path.join(results.RESULTS_DIR, name)
+		self.reflectors = []
+		self.popens = {}
+
+	def start(self):
+		if not self.rate or not self.pairs:
+			return self
+		if not os.path.isdir(self.flowDir):
+			os.makedirs(self.flowDir)
+
+		servers = []
+		for client, server, relation in self.pairs:
+			if server not in servers:
+				servers.append(server)
+		self.reflectors = [server.popen('%s %s reflect --port %d' % (sys.executable, AGENT, self.port), shell=True) for server in servers]
+		missing = iperfservers.waitForListeners([(server, [self.port]) for server in servers], REFLECTOR_TIMEOUT, udp=True)
+		if missing:
+			down = [(client, server) for client, server, relation in self.pairs if server in missing]
+			logger.info( ">>> Probe reflectors not up on %d of %d hosts, the probes of %d pairs will be lost: %s" %
+						 (len(missing), len(servers), len(down), " ".join("%s->%s" % pair for pair in down[:10])) )
+
+		at = scheduler.clock() + LEAD
+		for index, (client, server, relation) in enumerate(self.pairs):
+			self.popens[index] = client.popen('%s %s send --target %s --port %d --rate %g --duration %g --at %.6f --out %s' %
+											  (sys.executable, AGENT, server.IP(), self.port, self.rate, self.duration, at,
+											   os.path.join(self.flowDir, "pair%03d" % index)), shell=True)
+		logger.info( ">>> Probing %d pairs at %g probes/s for %d seconds" % (len(self.pairs), self.rate, self.duration) )
+		return self
+
+	def stop(self):
+		"""
+		Wait for the senders, stop the reflectors and write the pair table
+		:return: list of pair rows
+		"""
+		if not self.popens:
+			return []
+		monitor.monitorFlows(self.popens, LEAD + self.duration + PROBE_TIMEOUT + 10)
+		for popen in self.reflectors:
+			monitor.signalFlow(popen, signal.SIGKILL)
+
+		rows = []
+		for index, (client, server, relation) in enumerate(self.pairs):
+			path = os.path.join(self.flowDir, "pair%03d" % index)
+			try:
+				row = pairRow(_readSamples(path + ".rtt"), _readSamples(path + ".owd"))
+				row = row[:3] + tuple(results.nominalTime(value) for value in row[3:])
+			except IOError:
+				row = (None,) * (len(PAIR_COLUMNS) - 4)
+			rows.append((index, str(client), str(server), relation) + row)
+
+		with open(os.path.join(results.RESULTS_DIR, "%s.tsv" % self.name), "w") as f:
+			f.write("\t".join(PAIR_COLUMNS) + "\n")
+			for row in rows:
+				f.write("\t".join(results.field(value, "%.1f") for value in row) + "\n")
+
+		tails = sorted(row[9] for row in rows if row[9] is not None)
+		if tails:
+			logger.info( ">>> %s: p99.9 latency %.0f us (median pair) to %.0f us (worst pair)" %
+						 (self.name, results.percentile(tails, 50), tails[-1]) )
+		self.popens = {}
+		return rows
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='UDP latency probe reflector and sender run in the host namespaces')
+	sub = parser.add_subparsers(dest='role')
+	reflector = sub.add_parser('reflect', help='Send the probes back')
+	reflector.add_argument('--port', type=int, default=PROBE_PORT)
+	sender = sub.add_parser('send', help='Send probes to a reflector')
+	sender.add_argument('--target', type=str, required=True, help='Address of the reflector')
+	sender.add_argument('--port', type=int, default=PROBE_PORT)
+	sender.add_argument('--rate', type=float, default=PROBE_RATE, help='Probes per second')
+	sender.add_argument('--duration', type=float, default=10, help='Probing time in seconds')
+	sender.add_argument('--at', type=float, required=True, help='Time of the first probe on the monotonic clock')
+	sender.add_argument('--out', type=str, required=True, help='Prefix of the sample files')
+	args = parser.parse_args(argv)
+
+	if args.role == 'reflect':
+		reflect(args.port)
+	else:
+		send(args.target, args.port, args.rate, args.duration, args.at, args.out)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+readiness.py: active readiness probing for the emulated data center networks
+
+Instead of sleeping for a fixed amount of time after net.start(), the test
+scripts poll the network until it is usable or until a deadline expires:
+
+waitForSTP: all OVSBridgeSTP ports have left the listening/learning states
+waitForFlows: all switches are connected and their flow tables stopped changing
+waitForReachability: every (client, server) pair answers a ping
+waitForNetwork: runs the checks above in order under one deadline
+"""
+
+import re
+import time
+import logging
+
+logger = logging.getLogger( __name__ )
+
+POLL_INTERVAL = 0.5
+
+#STP states in which a port no longer changes its forwarding decision
+STP_STABLE_STATES = ('forwarding', 'blocking', 'disabled')
+STP_TRANSIENT_STATES = ('listening', 'learning')
+
+def _remaining(deadline):
+	return max(0, deadline - time.time())
+
+def switchPorts(switch):
+	"""
+	Names of the data ports of a switch (loopback excluded)
+	"""
+	return [name for name in switch.intfNames() if name != 'lo']
+
+def stpPortStates(net):
+	"""
+	Read the STP state of every port of every bridge with a single ovs-vsctl call
+	:param net: mininet network
+	:return: dict port name -> STP state
+	"""
+	states = {}
+	if not net.switches:
+		return states
+
+	output = net.switches[0].cmd('ovs-vsctl --format=csv --no-headings --columns=name,status list Port')
+	for line in output.splitlines():
+		fields = line.split(',', 1)
+		if len(fields) != 2:
+			continue
+		match = re.search(r'stp_state=(\w+)', fields[1])
+		if match:
+			states[fields[0].strip('"')] = match.group(1)
+
+	if states:
+		return states
+
+	#Older OVS releases only expose the STP state through ovs-appctl
+	for switch in net.switches:
+		output = switch.cmd('ovs-appctl stp/show %s' % switch)
+		for name in switchPorts(switch):
+			match = re.search(r'%s\b.*?\b(%s)\b' % (re.escape(name), '|'.join(STP_STABLE_STATES + STP_TRANSIENT_STATES)), output, re.S)
+			if match:
+				states[name] = match.group(1)
+	return states
+
+def waitForSTP(net, deadline):
+	"""
+	Poll the STP port states until every port of every switch is stable
+	:param net: mininet network
+	:param deadline: absolute time (time.time()) after which we give up
+	:return: True if the spanning tree converged before the deadline
+	"""
+	ports = [name for switch in net.switches for name in switchPorts(switch)]
+	pending = ports
+
+	while True:
+		states = stpPortStates(net)
+		pending = [name for name in ports if states.get(name) not in STP_STABLE_STATES]
+		if not pending:
+			return True
+		if time.time() >= deadline:
+			logger.debug("*** STP did not converge, %d ports still pending: %s" % (len(pending), " ".join(pending[:10])))
+			return False
+		time.sleep(min(POLL_INTERVAL, _remaining(deadline)))
+
+def flowCount(switch):
+	"""
+	Number of flows installed in a switch
+	"""
+	output = switch.cmd('ovs-ofctl dump-aggregate %s' % switch)
+	match = re.search(r'flow_count=(\d+)', output)
+	if match:
+		return int(match.group(1))
+	return -1
+
+def waitForFlows(net, deadline, settle=2):
+	"""
+	Wait until every switch is connected to the controller and its flow table
+	stopped changing for a number of consecutive polls
+	:param net: mininet network
+	:param deadline: absolute time (time.time()) after which we give up
+	:param settle: number of consecutive polls without changes in the flow counts
+	:return: True if the flow tables settled before the deadline
+	"""
+	while True:
+		disconnected = [str(switch) for switch in net.switches
+						if hasattr(switch, 'connected') and not switch.connected()]
+		if not disconnected:
+			break
+		if time.time() >= deadline:
+			logger.debug("*** %d switches not connected to the controller" % len(disconnected))
+			return False
+		time.sleep(min(POLL_INTERVAL, _remaining(deadline)))
+
+	previous = None
+	stable = 0
+	while True:
+		counts = [flowCount(switch) for switch in net.switches]
+		if counts == previous:
+			stable += 1
+		else:
+			stable = 0
+		if stable >= settle:
+			logger.debug("Flow tables settled with %d flows" % sum(counts))
+			return True
+		if time.time() >= deadline:
+			logger.debug("*** Flow tables still changing")
+			return False
+		previous = counts
+		time.sleep(min(POLL_INTERVAL, _remaining(deadline)))
+
+def waitForReachability(pairs, deadline, timeout=1):
+	"""
+	Ping every (client, server) pair concurrently, retrying only the pairs that
+	failed, until all of them answer
+	:param pairs: list of (client host, server host) tuples
+	:param deadline: absolute time (time.time()) after which we give up
+	:param timeout: timeout of a single ping in seconds
+	:return: True if every pair became reachable before the deadline
+	"""
+	pending = list(pairs)
+
+	while pending:
+		popens = [(client, server, client.popen('ping -n -q -c 1 -W %d %s' % (timeout, server.IP()), shell=True))
+				  for client, server in pending]
+		pending = [(client, server) for client, server, popen in popens if popen.wait() != 0]
+
+		if pending and time.time() >= deadline:
+			logger.debug("*** %d pairs still unreachable: %s" % (len(pending),
+						 " ".join("%s->%s" % (client, server) for client, server in pending[:10])))
+			return False
+		if pending:
+			#A ping that fails at once (no route yet) must not turn this into a busy loop
+			time.sleep(min(POLL_INTERVAL, _remaining(deadline)))
+
+	return True
+
+def waitForNetwork(net, pairs, deadline, stp=False, controller=False):
+	"""
+	Wait until the network is usable
+	:param net: mininet network
+	:param pairs: list of (client host, server host) tuples that must be reachable
+	:param deadline: maximum time to wait, in seconds
+	:param stp: poll the STP port states
+	:param controller: poll the controller connection and flow tables
+	:return: True if the network became ready before the deadline
+	"""
+	start = time.time()
+	deadline = start + deadline
+	ready = True
+
+	if stp:
+		ready = waitForSTP(net, deadline) and ready
+		logger.debug("STP converged after %.1f seconds" % (time.time() - start))
+	if controller:
+		ready = waitForFlows(net, deadline) and ready
+		logger.debug("Controller ready after %.1f seconds" % (time.time() - start))
+
+	ready = waitForReachability(pairs, deadline) and ready
+
+	if ready:
+		logger.info( ">>> Network ready after %.1f seconds" % (time.time() - start) )
+	else:
+		logger.info( ">>> Network NOT ready after %.1f seconds, continuing anyway" % (time.time() - start) )
+
+	return ready
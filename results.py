@@ -0,0 +1,352 @@
+"""
+results.py: structured capture of the IPERF and PING results
+
+Every flow of a test writes its own file in results/<experiment>/, so that
+concurrent clients never share an output file. IPERF is run with JSON
+output; FlowCollector tails the per-flow files while the test is running and
+folds the interval reports into one table per experiment,
+results/<experiment>.tsv, with one row per flow interval and one summary
+row per flow. Every experiment is a phase of the running health samplers.
+
+The interval reports are streamed with --json-stream, which needs iperf3
+3.17 or newer. Older versions (those of most Mininet distributions) only
+write one JSON document when the flow exits; iperfJsonFlags falls back to
+plain -J for them and the collector reads that document once it is complete.
+
+When the emulation runs time dilated (cpuplan 'dilate' policy), DILATION is
+its factor and the rates and times of the results are converted back to
+nominal units with nominalMbps and nominalTime.
+
+FlowCollector: streaming per-experiment result collector
+"""
+
+import os
+import re
+import json
+import threading
+import subprocess
+import logging
+
+import health
+
+logger = logging.getLogger( __name__ )
+
+RESULTS_DIR = "results"
+
+IPERF_JSON_STREAM_FLAGS = "-J --json-stream"
+IPERF_JSON_FLAGS = "-J"
+
+_iperfFlags = None
+
+#The links run DILATION times slower and the tests DILATION times longer than nominal
+DILATION = 1
+
+TABLE_COLUMNS = ("flow", "client", "server", "relation", "type", "start", "end",
+				 "mbps", "retransmits", "jitter_ms", "lost_percent", "rtt_ms")
+
+PING_LOSS = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?received.*?([\d.]+)% packet loss')
+PING_RTT = re.compile(r'= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms')
+
+def field(value, fmt="%.3f"):
+	if value is None:
+		return "-"
+	if isinstance(value, float):
+		return fmt % value
+	return str(value)
+
+def iperfJsonFlags():
+	"""
+	JSON output flags of the installed iperf3, probed once: streamed interval
+	reports when it knows --json-stream, a single final document otherwise
+	"""
+	global _iperfFlags
+	if _iperfFlags is None:
+		try:
+			usage = subprocess.check_output(['iperf3', '--help'], stderr=subprocess.STDOUT)
+		except subprocess.CalledProcessError as e:
+			usage = e.output or b""
+		except OSError:
+			usage = b""
+		if b"--json-stream" in usage:
+			_iperfFlags = IPERF_JSON_STREAM_FLAGS
+		else:
+			_iperfFlags = IPERF_JSON_FLAGS
+			logger.info( ">>> iperf3 without --json-stream (3.17 and newer), results are collected when the flows end" )
+	return _iperfFlags
+
+def nominalMbps(mbps):
+	"""
+	Nominal rate of a rate measured on the dilated emulation
+	"""
+	return mbps * DILATION if mbps is not None else None
+
+def emulatedMbps(mbps):
+	"""
+	Rate on the dilated emulation of a nominal rate, e.g. of an IPERF target rate
+	"""
+	return mbps / float(DILATION)
+
+def nominalTime(value):
+	"""
+	Nominal duration, in any unit, of a duration measured on the dilated emulation
+	"""
+	return value / float(DILATION) if value is not None else None
+
+def percentile(values, p):
+	"""
+	Percentile of sorted values, linearly interpolated
+	"""
+	if not values:
+		return None
+	position = (len(values) - 1) * p / 100.0
+	low = int(position)
+	high = min(low + 1, len(values) - 1)
+	return values[low] + (values[high] - values[low]) * (position - low)
+
+def writeTable(path, rows):
+	"""
+	Write rows (dicts keyed by TABLE_COLUMNS) as a results table, e.g. for
+	results computed offline that must compare with the collected ones
+	"""
+	with open(path, "w") as f:
+		f.write("\t".join(TABLE_COLUMNS) + "\n")
+		for row in rows:
+			f.write("\t".join(field(row.get(column)) for column in TABLE_COLUMNS) + "\n")
+
+def parseTable(path):
+	"""
+	Per-flow summary rows of a table written by FlowCollector
+	:return: list of dicts column -> value, None for '-' fields
+	"""
+	rows = []
+	with open(path) as f:
+		header = f.readline().rstrip("\n").split("\t")
+		for line in f:
+			fields = line.rstrip("\n").split("\t")
+			if len(fields) != len(header):
+				continue
+			row = dict(zip(header, fields))
+			if row.get("type") != "summary":
+				continue
+			rows.append(dict((key, None if value == "-" else value) for key, value in row.items()))
+	return rows
+
+def intervalRow(data):
+	"""
+	Table fields of an IPERF interval event, None for omitted intervals
+	"""
+	total = data.get("sum", {})
+	if total.get("omitted"):
+		return None
+	return {"type": "interval",
+			"start": total.get("start"),
+			"end": total.get("end"),
+			"mbps": total.get("bits_per_second", 0) / 1e6,
+			"retransmits": total.get("retransmits"),
+			"jitter_ms": total.get("jitter_ms"),
+			"lost_percent": total.get("lost_percent")}
+
+def summaryRow(data):
+	"""
+	Table fields of an IPERF end event
+	"""
+	if "sum_received" in data:
+		#TCP: throughput seen by the receiver, retransmits seen by the sender
+		received = data["sum_received"]
+		sent = data.get("sum_sent", {})
+		return {"type": "summary",
+				"start": received.get("start"),
+				"end": received.get("end"),
+				"mbps": received.get("bits_per_second", 0) / 1e6,
+				"retransmits": sent.get("retransmits")}
+
+	total = data.get("sum", {})
+	return {"type": "summary",
+			"start": total.get("start"),
+			"end": total.get("end"),
+			"mbps": total.get("bits_per_second", 0) / 1e6,
+			"jitter_ms": total.get("jitter_ms"),
+			"lost_percent": total.get("lost_percent")}
+
+def pingRow(text):
+	"""
+	Table fields of a finished 'ping -q' run, None if the summary is not there yet
+	"""
+	loss = PING_LOSS.search(text)
+	if not loss:
+		return None
+	rtt = PING_RTT.search(text)
+	return {"type": "summary",
+			"lost_percent": float(loss.group(3)),
+			"rtt_ms": float(rtt.group(2)) if rtt else None}
+
+class _Flow(object):
+
+	def __init__(self, index, path, client, server, relation, kind):
+		self.index = index
+		self.path = path
+		self.client = client
+		self.server = server
+		self.relation = relation
+		self.kind = kind
+		self.offset = 0
+		self.partial = ""
+		self.document = False
+		self.done = False
+
+class FlowCollector(object):
+	"""
+	Collects the per-flow result files of one experiment into a single table
+	while the experiment is running
+	"""
+
+	def __init__(self, name, interval=0.5, directory=RESULTS_DIR):
+		"""
+		:param name: experiment name, e.g. ft_stp_k4_tcp_results_same_pod_100M
+		:param interval: polling interval of the per-flow files in seconds
+		:param directory: base results directory
+		"""
+		self.name = name
+		self.interval = interval
+		self.flowDir = os.path.join(directory, name)
+		self.tablePath = os.path.join(directory, "%s.tsv" % name)
+		self.flows = []
+		self.rows = 0
+		self.lock = threading.Lock()
+		self.stopped = threading.Event()
+		self.thread = None
+		self.table = None
+
+		if not os.path.isdir(self.flowDir):
+			os.makedirs(self.flowDir)
+
+	def flowPath(self, index, extension):
+		"""
+		Path of a file of a flow in the experiment directory
+		"""
+		return os.path.join(self.flowDir, "flow%03d.%s" % (index, extension))
+
+	def flowFile(self, index, client, server, relation="-", kind="iperf"):
+		"""
+		Register a flow and return the file its output must be written to
+		:param index: flow index within the experiment
+		:param client: client host
+		:param server: server host
+		:param relation: pod relation of the pair (same_pod, different_pod, ...)
+		:param kind: 'iperf' (JSON output) or 'ping' (text output)
+		"""
+		path = self.flowPath(index, "json" if kind == "iperf" else "ping")
+		if os.path.exists(path):
+			os.remove(path)
+		with self.lock:
+			self.flows.append(_Flow(index, path, str(client), str(server), relation, kind))
+		return path
+
+	def start(self):
+		health.mark(self.name)
+		self.table = open(self.tablePath, "w")
+		self.table.write("\t".join(TABLE_COLUMNS) + "\n")
+		self.thread = threading.Thread(target=self._run, name="collector-%s" % self.name)
+		self.thread.daemon = True
+		self.thread.start()
+		return self
+
+	def stop(self):
+		"""
+		Stop tailing, fold whatever is left in the flow files and close the table
+		:return: number of rows written
+		"""
+		self.stopped.set()
+		if self.thread:
+			self.thread.join()
+		self._poll(final=True)
+		self.table.close()
+		health.mark()
+		logger.debug("Collected %d rows from %d flows into %s" % (self.rows, len(self.flows), self.tablePath))
+		return self.rows
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def _run(self):
+		while not self.stopped.wait(self.interval):
+			self._poll()
+
+	def _poll(self, final=False):
+		with self.lock:
+			flows = [flow for flow in self.flows if not flow.done]
+		for flow in flows:
+			if flow.kind == "iperf":
+				self._readIperf(flow)
+			else:
+				self._readPing(flow, final)
+		self.table.flush()
+
+	def _readNew(self, flow):
+		try:
+			with open(flow.path) as f:
+				f.seek(flow.offset)
+				data = f.read()
+				flow.offset = f.tell()
+		except IOError:
+			return ""
+		return data
+
+	def _readIperf(self, flow):
+		data = flow.partial + self._readNew(flow)
+		if flow.document or data.split("\n", 1)[0].strip() == "{":
+			#Plain -J output: one pretty-printed document, complete when the flow exits
+			flow.document = True
+			flow.partial = data
+			self._readDocument(flow)
+			return
+		lines = data.split("\n")
+		flow.partial = lines.pop()
+		for line in lines:
+			try:
+				event = json.loads(line)
+			except ValueError:
+				continue
+			kind = event.get("event")
+			if kind == "interval":
+				self._write(flow, intervalRow(event.get("data", {})))
+			elif kind == "end":
+				self._write(flow, summaryRow(event.get("data", {})))
+				flow.done = True
+			elif kind == "error":
+				logger.debug("<%s>: %s" % (flow.client, event.get("data")))
+				flow.done = True
+
+	def _readDocument(self, flow):
+		try:
+			document = json.loads(flow.partial)
+		except ValueError:
+			return
+		flow.done = True
+		if document.get("error"):
+			logger.debug("<%s>: %s" % (flow.client, document.get("error")))
+			return
+		for interval in document.get("intervals", []):
+			self._write(flow, intervalRow(interval))
+		self._write(flow, summaryRow(document.get("end", {})))
+
+	def _readPing(self, flow, final):
+		flow.partial += self._readNew(flow)
+		row = pingRow(flow.partial)
+		if row or final:
+			self._write(flow, row or {"type": "summary", "lost_percent": 100.0})
+			flow.done = True
+
+	def _write(self, flow, row):
+		if row is None:
+			return
+		row.update({"flow": flow.index, "client": flow.client, "server": flow.server, "relation": flow.relation})
+		if DILATION != 1:
+			row["mbps"] = nominalMbps(row.get("mbps"))
+			for column in ("start", "end", "jitter_ms", "rtt_ms"):
+				row[column] = nominalTime(row.get(column))
+		self.table.write("\t".join(field(row.get(column)) for column in TABLE_COLUMNS) + "\n")
+		self.rows += 1
@@ -0,0 +1,176 @@
+"""
+scheduler.py: synchronized start of the test flows
+
+All the clients of a test are prepared first and every one of them waits in
+its own host namespace for a shared start time on the monotonic clock, so
+the flows start together (or according to a ramp pattern) no matter how
+long it takes to spawn them. Every flow runs for exactly the requested
+duration and the actual start offset of each flow is recorded.
+
+Ramp patterns:
+simultaneous: every flow starts at the shared start time
+staggered: flow i starts i * interval seconds after the shared start time
+poisson: flows start at Poisson arrivals with a mean gap of interval seconds
+
+The module is also the launcher run in the host namespaces:
+	python scheduler.py --at <clock> --stamp <file> -- <command>
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+try:
+	from shlex import quote
+except ImportError:
+	from pipes import quote
+
+logger = logging.getLogger( __name__ )
+
+RAMPS = ('simultaneous', 'staggered', 'poisson')
+
+#Clock shared by the scheduler and the launchers, all processes run the same interpreter
+clock = getattr(time, 'monotonic', time.time)
+
+LAUNCHER = os.path.abspath(__file__).replace('.pyc', '.py')
+
+def rampOffsets(count, ramp='simultaneous', interval=1.0, seed=None):
+	"""
+	Planned start offsets of count flows, in seconds
+	"""
+	if ramp == 'simultaneous':
+		return [0.0] * count
+	if ramp == 'staggered':
+		return [index * interval for index in range(0, count)]
+	if ramp == 'poisson':
+		rng = random.Random(seed)
+		offsets = [0.0]
+		while len(offsets) < count:
+			offsets.append(offsets[-1] + rng.expovariate(1.0 / interval))
+		return offsets[:count]
+	raise ValueError("Unknown ramp pattern %s" % ramp)
+
+class FlowScheduler(object):
+	"""
+	Starts a set of flows against a shared start time
+	"""
+
+	def __init__(self, ramp='simultaneous', interval=1.0, seed=None, lead=None):
+		"""
+		:param ramp: ramp pattern, one of RAMPS
+		:param interval: stagger interval or mean Poisson gap, in seconds
+		:param seed: random seed of the Poisson arrivals
+		:param lead: time between launching the flows and the shared start
+					 time; by default it grows with the number of flows
+		"""
+		self.ramp = ramp
+		self.interval = interval
+		self.seed = seed
+		self.lead = lead
+		self.flows = []
+		self.start = None
+		self.planned = {}
+
+	def add(self, index, host, command, stampFile):
+		"""
+		Prepare a flow
+		:param index: flow index
+		:param host: host the command runs on
+		:param command: shell command of the flow
+		:param stampFile: file the actual start time is written to
+		"""
+		self.flows.append((index, host, command, stampFile))
+
+	def launch(self):
+		"""
+		Spawn all the flows, each waiting for its own start time
+		:return: dict index -> popen
+		"""
+		offsets = rampOffsets(len(self.flows), self.ramp, self.interval, self.seed)
+		lead = self.lead if self.lead is not None else 1.0 + 0.01 * len(self.flows)
+		self.start = clock() + lead
+
+		popens = {}
+		for (index, host, command, stampFile), offset in zip(self.flows, offsets):
+			if os.path.exists(stampFile):
+				os.remove(stampFile)
+			self.planned[index] = offset
+			popens[index] = host.popen('%s %s --at %.6f --stamp %s -- sh -c %s' %
+									   (sys.executable, LAUNCHER, self.start + offset, stampFile, quote(command)), shell=True)
+
+		logger.debug("%d flows scheduled (%s), first start in %.2f seconds" % (len(popens), self.ramp, lead))
+		return popens
+
+	def deadlines(self, duration):
+		"""
+		Time from now until each flow should be done, for monitor.monitorFlows
+		:param duration: maximum runtime of a flow once started, in seconds
+		:return: dict index -> seconds
+		"""
+		now = clock()
+		return dict((index, self.start + offset - now + duration) for index, offset in self.planned.items())
+
+	def startOffsets(self):
+		"""
+		Actual start offsets of the flows relative to the shared start time
+		:return: dict index -> (planned offset, actual offset or None)
+		"""
+		offsets = {}
+		for index, host, command, stampFile in self.flows:
+			actual = None
+			try:
+				with open(stampFile) as f:
+					actual = float(f.read()) - self.start
+			except (IOError, ValueError):
+				pass
+			offsets[index] = (self.planned.get(index), actual)
+		return offsets
+
+	def writeOffsets(self, path):
+		"""
+		Write the planned and actual start offsets of every flow to a table
+		"""
+		offsets = self.startOffsets()
+		skews = []
+		with open(path, 'w') as f:
+			f.write("flow\tplanned\tactual\tskew\n")
+			for index in sorted(offsets):
+				planned, actual = offsets[index]
+				if actual is None:
+					f.write("%d\t%.6f\t-\t-\n" % (index, planned))
+				else:
+					skews.append(abs(actual - planned))
+					f.write("%d\t%.6f\t%.6f\t%.6f\n" % (index, planned, actual, actual - planned))
+		if skews:
+			logger.debug("Flow start skew: max %.1f ms, mean %.1f ms" % (1000 * max(skews), 1000 * sum(skews) / len(skews)))
+
+def waitAndExec(at, stampFile, command):
+	"""
+	Sleep until the clock reaches at, record the actual start and exec the command
+	"""
+	while True:
+		remaining = at - clock()
+		if remaining <= 0:
+			break
+		#Coarse sleep first, then short sleeps close to the start time
+		time.sleep(remaining - 0.005 if remaining > 0.01 else 0.0005)
+
+	with open(stampFile, 'w') as f:
+		f.write("%.6f" % clock())
+	os.execvp(command[0], command)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Start a command at a given monotonic clock time')
+	parser.add_argument('--at', type=float, required=True, help='Start time on the monotonic clock')
+	parser.add_argument('--stamp', type=str, required=True, help='File the actual start time is written to')
+	parser.add_argument('command', nargs=argparse.REMAINDER, help='Command to run')
+	args = parser.parse_args(argv)
+
+	command = args.command[1:] if args.command[:1] == ['--'] else args.command
+	waitAndExec(args.at, args.stamp, command)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,193 @@
+"""
+startup.py: fast network startup for the topology tests
+
+Mininet sets up every switch with its own ovs-vsctl calls and creates every
+link, interface and tc qdisc one after the other, which dominates the
+runtime of the larger topologies. Here the OVS settings of all the switches
+are merged into a few ovs-vsctl transactions, and the per-node work (links,
+tc, host configuration, ARP entries) runs on a thread pool. Mininet nodes
+run one command at a time, so the links are created in rounds in which
+every node appears at most once (a matching of the link graph).
+
+OVSBridgeSTP: STP-Enabled OVS switch class with batched startup
+FastMininet: Mininet with concurrent link and host setup and startup timings
+"""
+
+import time
+import logging
+from multiprocessing.pool import ThreadPool
+
+from mininet.net import Mininet
+from mininet.node import OVSKernelSwitch
+from mininet.link import TCIntf
+from mininet.util import errRun
+
+logger = logging.getLogger( __name__ )
+
+#Concurrent node commands during startup
+THREADS = 32
+
+def _reapplyTC( switch ):
+	#OVS overwrites the tc qdiscs of the ports it adds, restore ours
+	for intf in switch.intfList():
+		if isinstance( intf, TCIntf ):
+			intf.config( **intf.params )
+
+class OVSBridgeSTP( OVSKernelSwitch ):
+    """Open vSwitch Ethernet bridge with Spanning Tree Protocol
+       rooted at the first bridge that is created
+
+       With Mininet's batch startup, the STP settings of all the bridges
+       go into the same ovs-vsctl transactions as the bridges themselves"""
+    prio = 1000
+
+    def start( self, *args, **kwargs ):
+        OVSKernelSwitch.start( self, *args, **kwargs )
+        OVSBridgeSTP.prio += 1
+        self.prio = OVSBridgeSTP.prio
+        if getattr( self, 'batch', False ):
+            self.commands.append( self.stpCommands() )
+        else:
+            self.cmd( 'ovs-vsctl', self.stpCommands() )
+
+    def stpCommands( self ):
+        return ( '-- set-fail-mode %s standalone -- set-controller %s '
+                 '-- set Bridge %s stp_enable=true other_config:stp-priority=%d' %
+                 ( self, self, self, self.prio ) )
+
+    @classmethod
+    def batchStartup( cls, switches, run=errRun ):
+        """Run the queued commands of all the switches in as few ovs-vsctl
+           transactions as the argument size allows, then restore the tc
+           settings of every switch concurrently"""
+        start = time.time()
+        argmax = getattr( cls, 'argmax', 128000 )
+        commands = 'ovs-vsctl'
+        transactions = 0
+        for switch in switches:
+            if switch.isOldOVS():
+                # Old OVS cannot delete a stale bridge with --if-exists in the transaction
+                run( 'ovs-vsctl del-br %s' % switch )
+            for command in switch.commands:
+                command = command.strip()
+                if len( commands ) + len( command ) >= argmax:
+                    run( commands, shell=True )
+                    transactions += 1
+                    commands = 'ovs-vsctl'
+                commands += ' ' + command
+            switch.commands = []
+            switch.batch = False
+        if commands != 'ovs-vsctl':
+            run( commands, shell=True )
+            transactions += 1
+        logger.debug( "%d switches configured in %d ovs-vsctl transactions in %.1f seconds" %
+                      ( len( switches ), transactions, time.time() - start ) )
+
+        pool = ThreadPool( THREADS )
+        try:
+            pool.map( _reapplyTC, switches )
+        finally:
+            pool.close()
+        return switches
+
+def linkRounds( links ):
+	"""
+	Split links into rounds in which every node appears at most once; the
+	links of every node keep their order, so automatic port numbers do not change
+	:param links: list of (node1, node2, ...) tuples
+	:return: list of rounds, each a list of (position, link)
+	"""
+	last = {}
+	rounds = []
+	for position, link in enumerate( links ):
+		number = max( last.get( link[ 0 ], -1 ), last.get( link[ 1 ], -1 ) ) + 1
+		if number == len( rounds ):
+			rounds.append( [] )
+		rounds[ number ].append( ( position, link ) )
+		last[ link[ 0 ] ] = last[ link[ 1 ] ] = number
+	return rounds
+
+class _NodesOnly( object ):
+    #Topology view without links, so that Mininet only creates the nodes
+    def __init__( self, topo ):
+        self.topo = topo
+
+    def __getattr__( self, name ):
+        return getattr( self.topo, name )
+
+    def links( self, *args, **kwargs ):
+        return []
+
+class FastMininet( Mininet ):
+    """Mininet that sets up links, tc, hosts and ARP entries concurrently
+       and logs a timing breakdown of the startup phases"""
+
+    def __init__( self, *args, **kwargs ):
+        self.threads = kwargs.pop( 'threads', THREADS )
+        self.timings = []
+        self.phaseStart = time.time()
+        Mininet.__init__( self, *args, **kwargs )
+
+    def phase( self, name ):
+        now = time.time()
+        self.timings.append( ( name, now - self.phaseStart ) )
+        self.phaseStart = now
+
+    def concurrently( self, function, items ):
+        pool = ThreadPool( self.threads )
+        try:
+            return pool.map( function, items )
+        finally:
+            pool.close()
+
+    def buildFromTopo( self, topo=None ):
+        self.phaseStart = time.time()
+        Mininet.buildFromTopo( self, _NodesOnly( topo ) )
+        self.phase( 'nodes' )
+
+        links = [ params for _src, _dst, params in topo.links( sort=True, withInfo=True ) ]
+        created = [ None ] * len( links )
+        rounds = linkRounds( [ ( params[ 'node1' ], params[ 'node2' ], params ) for params in links ] )
+
+        def addLink( item ):
+            position, ( _node1, _node2, params ) = item
+            created[ position ] = self.addLink( **params )
+
+        for linkRound in rounds:
+            self.concurrently( addLink, linkRound )
+        self.links = created
+        self.phase( 'links (%d rounds)' % len( rounds ) )
+
+    def configHosts( self ):
+        def configHost( host ):
+            if host.defaultIntf():
+                host.configDefault()
+            else:
+                host.configDefault( ip=None, mac=None )
+
+        self.concurrently( configHost, self.hosts )
+        self.phase( 'hosts' )
+
+    def staticArp( self ):
+        """One command per host with all its ARP entries, hosts in parallel"""
+        self.phaseStart = time.time()
+        entries = [ ( host.IP(), host.MAC() ) for host in self.hosts ]
+
+        def setArp( host ):
+            host.cmd( '; '.join( 'arp -s %s %s' % ( ip, mac ) for ip, mac in entries if ip != host.IP() ) )
+
+        self.concurrently( setArp, self.hosts )
+        self.phase( 'arp' )
+        logger.debug( "ARP entries of %d hosts set in %.1f seconds" % ( len( self.hosts ), self.timings[ -1 ][ 1 ] ) )
+
+    def start( self ):
+        if not self.built:
+            self.build()
+        self.phaseStart = time.time()
+        Mininet.start( self )
+        self.phase( 'switches' )
+        self.logTimings()
+
+    def logTimings( self ):
+        logger.info( ">>> Startup: %s, total %.1f s" % ( ", ".join( "%s %.1f s" % timing for timing in self.timings ),
+                                                          sum( seconds for name, seconds in self.timings ) ) )
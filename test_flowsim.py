@@ -0,0 +1,48 @@
+"""
+test_flowsim.py: checks of the flow-level simulator against the Fat Tree TCP test
+
+Usage:
+	python -m unittest test_flowsim
+"""
+
+import unittest
+
+import numpy as np
+
+import layout
+import traffic
+import flowsim
+
+class FatTreeTestPassesTest(unittest.TestCase):
+
+	def setUp(self):
+		switchCount, links, hostSwitch = layout.fatTreeLinks(4)
+		self.network = flowsim.Network(switchCount, links, hostSwitch, 1000)
+
+	def testIntraPodAtLineRate(self):
+		servers, clients = traffic.TrafficMatrix(16, 4, 1).generate('intrapod')
+		throughput, utilization = flowsim.simulate(self.network, servers, clients, 'ecmp', seed=1)
+		self.assertTrue(np.allclose(throughput, 1000))
+
+	def testSamePodPassIsIntraPod(self):
+		#The same-pod pass runs alone, not together with the different-pod flows
+		passes = dict((name, (servers, clients, limit)) for name, servers, clients, relation, limit
+					  in flowsim.fatTreeTestPasses(4, 1))
+		servers, clients, limit = passes['tcp_results_same_pod_1000M']
+		throughput, utilization = flowsim.simulate(self.network, servers, clients, 'ecmp', seed=1, limit=limit)
+		self.assertTrue(np.allclose(throughput, 1000))
+
+	def testPassesAreCappedAtTheirLimit(self):
+		for name, servers, clients, relation, limit in flowsim.fatTreeTestPasses(4, 1):
+			throughput, utilization = flowsim.simulate(self.network, servers, clients, 'ecmp', seed=1, limit=limit)
+			self.assertTrue((throughput <= limit + 1e-6).all(), name)
+			if limit == 100:
+				self.assertTrue(np.allclose(throughput, 100), name)
+
+	def testPassNames(self):
+		names = [name for name, servers, clients, relation, limit in flowsim.fatTreeTestPasses(4, 1)]
+		self.assertEqual(names, ['tcp_results_same_pod_100M', 'tcp_results_same_pod_1000M',
+								 'tcp_results_different_pod_100M', 'tcp_results_different_pod_1000M'])
+
+if __name__ == '__main__':
+	unittest.main()
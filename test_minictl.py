@@ -0,0 +1,74 @@
+"""
+test_minictl.py: checks of the local OpenFlow controller against emulated switches
+
+Usage:
+	python -m unittest test_minictl
+"""
+
+import time
+import socket
+import struct
+import unittest
+
+import minictl
+
+PORT = 6679
+
+class LostSwitchTest(unittest.TestCase):
+	"""
+	Switch 1 (port 3) -- (port 3) switch 2, a host behind port 2 of each
+	"""
+
+	def setUp(self):
+		self.topology = minictl.Topology()
+		self.topology.addLink(1, 3, 2, 3)
+		self.controller = minictl.MiniController(PORT, 'l2', self.topology)
+		self.controller._listen()
+		self.switches = [self.connect(dpid) for dpid in (1, 2)]
+
+	def tearDown(self):
+		for connection in list(self.controller.connections.values()):
+			connection.sock.close()
+		self.controller.server.close()
+		for switch in self.switches:
+			switch.sock.close()
+
+	def poll(self, condition):
+		deadline = time.time() + 5
+		while not condition() and time.time() < deadline:
+			self.controller._poll(0.05)
+		self.assertTrue(condition())
+
+	def connect(self, dpid):
+		switch = minictl._EmulatedSwitch(dpid, "127.0.0.1", PORT)
+		self.controller._poll(1.0)
+		switch.handshake()
+		self.topology.addHost(switch.host(2), dpid, 2)
+		self.poll(lambda: dpid in self.controller.switches)
+		return switch
+
+	def packetIn(self, destination):
+		frame = destination + struct.pack("!HI", 0x0a00, 1) + struct.pack("!H", 0x88b5) + b"\0" * 46
+		return minictl.message(minictl.OFPT_PACKET_IN, minictl.PACKET_IN.pack(minictl.NO_BUFFER, len(frame), 1, 0) + frame)
+
+	def testPacketInTowardsResetSwitch(self):
+		first, second = self.switches
+		#Switch 2 resets its connection, then switch 1 asks for a path through it
+		second.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+		second.sock.close()
+		first.sock.sendall(self.packetIn(second.host(2)))
+		time.sleep(0.1)
+
+		self.controller._poll(1.0)
+		self.assertNotIn(2, self.controller.switches)
+		self.assertEqual(self.controller.dropped, 1)
+
+		#The controller keeps serving the remaining switch
+		first.sock.sendall(self.packetIn(first.host(2)))
+		self.poll(lambda: self.controller.flowMods > 0)
+		first.sock.settimeout(5)
+		while first.receive()[0] != minictl.OFPT_FLOW_MOD:
+			pass
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,254 @@
+"""
+traffic.py: seeded traffic matrices for the topology tests
+
+The generators work on host indices only and do not need a running network,
+so the same matrices can be used by the emulated tests, the offline analysis
+in pathstats.py, or printed standalone. Every generator runs in time linear
+in the number of pairs it returns and draws from its own seeded random
+generator, so a matrix can be reproduced exactly from its seed.
+
+Patterns (TrafficMatrix methods):
+pairs: random disjoint (server, client) pairs over all the hosts
+permutation: every host sends to exactly one other host and receives from one
+stride: host i sends to host (i + stride) mod n
+intrapod: random disjoint pairs within each pod
+interpod: random disjoint pairs between pods
+hotspot: all the other hosts send to a few hotspot servers
+alltoall: every host sends to every other host
+
+Usage:
+	python traffic.py fattree -k 4 --pattern stride --stride 2 --seed 1
+	python traffic.py jellyfish -H 16 --pattern permutation --seed 1
+"""
+
+import sys
+import random
+import logging
+import argparse
+
+logger = logging.getLogger( __name__ )
+
+PATTERNS = ('pairs', 'permutation', 'stride', 'intrapod', 'interpod', 'hotspot', 'alltoall')
+
+def newSeed():
+	"""
+	Random seed to log when none was given, so that the run can be reproduced
+	"""
+	return random.SystemRandom().randrange(2 ** 32)
+
+class TrafficMatrix(object):
+	"""
+	Traffic matrix generator over hostCount hosts; host i is in pod i // podSize
+	"""
+
+	def __init__(self, hostCount, podSize=None, seed=None):
+		"""
+		:param hostCount: number of hosts
+		:param podSize: hosts per pod, None when the topology has no pods
+		:param seed: random seed
+		"""
+		self.hostCount = hostCount
+		self.podSize = podSize
+		self.seed = seed
+		self.rng = random.Random(seed)
+
+	def pods(self):
+		if not self.podSize:
+			raise ValueError("The topology has no pods")
+		return [list(range(first, min(first + self.podSize, self.hostCount)))
+				for first in range(0, self.hostCount, self.podSize)]
+
+	def _pair(self, hosts):
+		#Shuffled copy split in consecutive (server, client) pairs
+		hosts = list(hosts)
+		self.rng.shuffle(hosts)
+		return hosts[0:len(hosts) - 1:2], hosts[1:len(hosts):2]
+
+	def pairs(self, numberOfPairs=None, hosts=None):
+		"""
+		Random disjoint pairs, each host is used at most once
+		:param numberOfPairs: number of pairs, all the hosts are paired by default
+		:param hosts: hosts to pair, all of them by default
+		"""
+		servers, clients = self._pair(range(0, self.hostCount) if hosts is None else hosts)
+		if numberOfPairs is not None:
+			if numberOfPairs > len(clients):
+				raise ValueError("Cannot make %d disjoint pairs out of %d hosts" % (numberOfPairs, 2 * len(clients)))
+			servers, clients = servers[:numberOfPairs], clients[:numberOfPairs]
+		return servers, clients
+
+	def permutation(self):
+		"""
+		Random permutation without fixed points (Sattolo's algorithm)
+		"""
+		servers = list(range(0, self.hostCount))
+		for i in range(self.hostCount - 1, 0, -1):
+			j = self.rng.randrange(0, i)
+			servers[i], servers[j] = servers[j], servers[i]
+		return servers, list(range(0, self.hostCount))
+
+	def stride(self, stride=1):
+		"""
+		Host i sends to host (i + stride) mod n
+		"""
+		if stride % self.hostCount == 0:
+			raise ValueError("A stride of %d maps every host onto itself" % stride)
+		return [(i + stride) % self.hostCount for i in range(0, self.hostCount)], list(range(0, self.hostCount))
+
+	def intraPod(self):
+		"""
+		Random disjoint pairs within each pod
+		"""
+		servers = []
+		clients = []
+		for pod in self.pods():
+			podServers, podClients = self._pair(pod)
+			servers.extend(podServers)
+			clients.extend(podClients)
+		return servers, clients
+
+	def interPod(self):
+		"""
+		Random disjoint pairs between pods: pods are matched two by two at
+		random and their hosts paired after a shuffle
+		"""
+		pods = self.pods()
+		if len(pods) < 2 or len(pods) % 2:
+			raise ValueError("Inter-pod pairs need an even number of pods, got %d" % len(pods))
+		self.rng.shuffle(pods)
+		servers = []
+		clients = []
+		for serverPod, clientPod in zip(pods[0::2], pods[1::2]):
+			self.rng.shuffle(serverPod)
+			self.rng.shuffle(clientPod)
+			servers.extend(serverPod)
+			clients.extend(clientPod)
+		return servers, clients
+
+	def hotspot(self, hotspots=1):
+		"""
+		All the other hosts send to hotspots random servers, spread round-robin
+		"""
+		if hotspots < 1:
+			raise ValueError("A hotspot pattern needs at least one hotspot, got %d" % hotspots)
+		if hotspots >= self.hostCount:
+			raise ValueError("%d hotspots leave no clients among %d hosts" % (hotspots, self.hostCount))
+		hosts = list(range(0, self.hostCount))
+		self.rng.shuffle(hosts)
+		hot, clients = hosts[:hotspots], hosts[hotspots:]
+		return [hot[i % hotspots] for i in range(0, len(clients))], clients
+
+	def allToAll(self):
+		"""
+		Every host sends to every other host
+		"""
+		servers = []
+		clients = []
+		for client in range(0, self.hostCount):
+			for server in range(0, self.hostCount):
+				if server != client:
+					servers.append(server)
+					clients.append(client)
+		return servers, clients
+
+	def generate(self, pattern, stride=1, hotspots=1, numberOfPairs=None):
+		"""
+		Generate the pairs of a pattern by name
+		:return: (servers, clients) lists of host indices
+		"""
+		if pattern == 'pairs':
+			servers, clients = self.pairs(numberOfPairs)
+		elif pattern == 'permutation':
+			servers, clients = self.permutation()
+		elif pattern == 'stride':
+			servers, clients = self.stride(stride)
+		elif pattern == 'intrapod':
+			servers, clients = self.intraPod()
+		elif pattern == 'interpod':
+			servers, clients = self.interPod()
+		elif pattern == 'hotspot':
+			servers, clients = self.hotspot(hotspots)
+		elif pattern == 'alltoall':
+			servers, clients = self.allToAll()
+		else:
+			raise ValueError("Unknown traffic pattern %s" % pattern)
+
+		logger.debug( "Traffic matrix %s (seed %s): %d pairs" % (pattern, self.seed, len(clients)) )
+		return servers, clients
+
+def uniformPairs(hostCount, numberOfPairs, seed=None):
+	"""
+	numberOfPairs random (server, client) pairs among all the hosts, each host
+	being used at most once
+	:return: (servers, clients) lists of host indices
+	"""
+	return TrafficMatrix(hostCount, seed=seed).pairs(numberOfPairs)
+
+def fatTreePairs(kNUMBER, seed=None):
+	"""
+	Pair every host of a Fat Tree with another random host of the same pod
+	:param kNUMBER: number of pods
+	:return: (servers, clients) lists of host indices
+	"""
+	podSize = (kNUMBER ** 2) // 4
+	servers, clients = TrafficMatrix(kNUMBER * podSize, podSize, seed).intraPod()
+
+	logger.debug( "Clients: " + " ".join(str(e) for e in clients) )
+	logger.debug( "Servers: " + " ".join(str(e) for e in servers) )
+
+	return servers, clients
+
+def randomPairs(hosts, seed=None):
+	"""
+	Split the hosts into random (server, client) pairs; the list is not modified
+	:param hosts: list of hosts (names or indices)
+	:return: (servers, clients) lists
+	"""
+	servers, clients = TrafficMatrix(len(hosts), seed=seed).pairs()
+	servers = [hosts[i] for i in servers]
+	clients = [hosts[i] for i in clients]
+
+	logger.debug( "Clients: " + " ".join(str(e) for e in clients) )
+	logger.debug( "Servers: " + " ".join(str(e) for e in servers) )
+
+	return servers, clients
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Generate a traffic matrix for the test topologies')
+	sub = parser.add_subparsers(dest='topology')
+	ft = sub.add_parser('fattree', help='Fat Tree topology')
+	ft.add_argument('-k', type=int, default=4, help='Number of PODs')
+	jf = sub.add_parser('jellyfish', help='Jellyfish topology')
+	jf.add_argument('-H', type=int, default=16, help='Number of servers (hosts)')
+	for p in (ft, jf):
+		p.add_argument('--pattern', type=str, default='pairs', choices=PATTERNS, help='Traffic pattern')
+		p.add_argument('--stride', type=int, default=1, help='Stride of the stride pattern')
+		p.add_argument('--hotspots', type=int, default=1, help='Number of hotspot servers')
+		p.add_argument('--pairs', type=int, default=None, help='Number of pairs of the pairs pattern')
+		p.add_argument('--seed', type=int, default=None, help='Random seed')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.INFO)
+	seed = args.seed if args.seed is not None else newSeed()
+
+	if args.topology == 'fattree':
+		podSize = (args.k ** 2) // 4
+		matrix = TrafficMatrix(args.k * podSize, podSize, seed)
+	else:
+		matrix = TrafficMatrix(args.H, seed=seed)
+
+	try:
+		servers, clients = matrix.generate(args.pattern, args.stride, args.hotspots, args.pairs)
+	except ValueError as e:
+		parser.error(str(e))
+
+	print("#pattern %s seed %d" % (args.pattern, seed))
+	print("client\tserver\tclient_pod\tserver_pod")
+	for client, server in zip(clients, servers):
+		if matrix.podSize:
+			print("%d\t%d\t%d\t%d" % (client, server, client // matrix.podSize, server // matrix.podSize))
+		else:
+			print("%d\t%d\t-\t-" % (client, server))
+
+if __name__ == '__main__':
+	sys.exit(main())
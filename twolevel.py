@@ -0,0 +1,74 @@
+"""
+twolevel.py: two-level routing tables of the Fat Tree (Al-Fares et al.)
+
+The tables are computed from the pod, position and port arithmetic of
+layout.FatTreeLayout, with the hosts addressed 10.pod.edge.id, and loaded
+into all the switches in one batch by proactive.installRules; no controller
+is involved.
+
+edge switch: the hosts of the switch by address (prefix level), everything
+			 else to an OpenFlow 1.3 select group over the k/2 uplinks
+aggregation switch: the /24 of every edge switch of the pod (prefix level),
+					everything else to a select group over the k/2 uplinks
+core switch: the /16 of every pod
+
+The select groups take the place of the suffix table of the paper: Open
+vSwitch hashes every flow onto one of the uplinks, so the flows of a pair of
+hosts are spread over all the core paths instead of one.
+"""
+
+import logging
+
+import layout
+import proactive
+
+logger = logging.getLogger( __name__ )
+
+PREFIX_PRIORITY = 200
+UPLINK_PRIORITY = 100
+
+UPLINK_GROUP = 1
+
+def tables(fatTree):
+	"""
+	Flow and group tables of every switch
+	:param fatTree: layout.FatTreeLayout
+	:return: (dict switch name -> flow lines, dict switch name -> group lines)
+	"""
+	half = fatTree.half
+	rules = {}
+	groups = {}
+	uplinks = 'group_id=%d,type=select,%s' % (UPLINK_GROUP, ','.join('bucket=output:%d' % port for port in range(1, half + 1)))
+	upward = 'priority=%d,ip,actions=group:%d' % (UPLINK_PRIORITY, UPLINK_GROUP)
+
+	for edge in range(0, fatTree.edgeNumber):
+		name = fatTree.name(layout.EDGE, edge)
+		rules[name] = ['priority=%d,ip,nw_dst=%s,actions=output:%d' % (PREFIX_PRIORITY, fatTree.hostAddress(host), fatTree.edgeDownPort(host))
+					   for host in range(edge * half, (edge + 1) * half)] + [upward]
+		groups[name] = [uplinks]
+
+	for agg in range(0, fatTree.aggNumber):
+		name = fatTree.name(layout.AGG, agg)
+		pod = fatTree.switchPod(agg)
+		rules[name] = ['priority=%d,ip,nw_dst=%s,actions=output:%d' % (PREFIX_PRIORITY, fatTree.edgePrefix(edge), fatTree.aggDownPort(edge))
+					   for edge in range(pod * half, (pod + 1) * half)] + [upward]
+		groups[name] = [uplinks]
+
+	for core in range(0, fatTree.coreNumber):
+		name = fatTree.name(layout.CORE, core)
+		#Any aggregation switch of the pod gives the port, they all sit at the same position
+		rules[name] = ['priority=%d,ip,nw_dst=%s,actions=output:%d' % (PREFIX_PRIORITY, fatTree.podPrefix(pod), fatTree.corePort(pod * half))
+					   for pod in range(0, fatTree.kNUMBER)]
+
+	return rules, groups
+
+def installTables(net, fatTree):
+	"""
+	Load the two-level tables into the switches of a started Fat Tree network
+	whose hosts use the two-level addresses
+	:param fatTree: layout.FatTreeLayout of the network
+	:return: True if every switch holds its rules
+	"""
+	net.staticArp()
+	rules, groups = tables(fatTree)
+	return proactive.installRules(net, rules, groups)